@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of PyWebHdfsClient and of the WebHDFS FUSE operations class
+against the local fake WebHDFS server
+
+    python3 benchmarks/bench_webhdfs.py --latency 0.002 --json before.json
+    ... change something ...
+    python3 benchmarks/bench_webhdfs.py --latency 0.002 --compare before.json
+
+The FUSE scenarios call the operations of mount-webhdfs.py directly, the
+way the kernel would, without mounting anything (fusepy must be importable).
+"""
+from __future__ import print_function, absolute_import, division
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.join(BASE_DIR, 'benchmarks'))
+
+from fake_webhdfs import FakeWebHdfs  # noqa: E402
+from pywebhdfs.auth import SessionCookieAuth  # noqa: E402
+from pywebhdfs.webhdfs import PyWebHdfsClient  # noqa: E402
+
+MB = 1024 * 1024
+
+
+class Scenario(object):
+    """
+    A benchmark scenario: setup() prepares the server, run() returns the
+    number of (operations, bytes) performed
+    """
+    name = None
+
+    def __init__(self, args, server):
+        self.args = args
+        self.server = server
+
+    def setup(self):
+        pass
+
+
+class SequentialRead(Scenario):
+    name = 'seq_read'
+
+    def setup(self):
+        self.path = '/bench/seq_read/file'
+        self.server.add_file(self.path, os.urandom(self.args.file_size))
+
+    def run(self, target):
+        block, done = self.args.block_size, 0
+        while done < self.args.file_size:
+            done += len(target.read(self.path, block, done))
+        return done // block, done
+
+
+class RandomRead(Scenario):
+    name = 'random_read'
+
+    def setup(self):
+        self.path = '/bench/random_read/file'
+        self.server.add_file(self.path, os.urandom(self.args.file_size))
+
+    def run(self, target):
+        rnd = random.Random(42)
+        size, total = 4096, 0
+        for _ in range(self.args.count):
+            offset = rnd.randrange(0, self.args.file_size - size)
+            total += len(target.read(self.path, size, offset))
+        return self.args.count, total
+
+
+class SmallFileCreate(Scenario):
+    name = 'small_create'
+
+    def run(self, target):
+        data = os.urandom(self.args.small_size)
+        target.mkdir('/bench/small_create')
+        for i in range(self.args.count):
+            target.write_file('/bench/small_create/f%06d' % i, data)
+        target.finish()
+        return self.args.count, self.args.count * len(data)
+
+
+class LargeAppend(Scenario):
+    name = 'large_append'
+
+    def run(self, target):
+        path = '/bench/large_append/file'
+        chunk = os.urandom(self.args.block_size)
+        target.mkdir('/bench/large_append')
+        target.create(path)
+        n = self.args.file_size // len(chunk)
+        for i in range(n):
+            target.append(path, chunk, i * len(chunk))
+        target.finish()
+        return n, n * len(chunk)
+
+
+class DeepWalk(Scenario):
+    name = 'deep_walk'
+
+    def setup(self):
+        self.tree = self.server.add_synthetic_tree(
+            '/bench/deep_walk', depth=self.args.depth, fanout=self.args.fanout,
+            files=self.args.files, file_size=self.args.small_size)
+
+    def run(self, target):
+        count, stack = 0, ['/bench/deep_walk']
+        while stack:
+            path = stack.pop()
+            for name, is_dir in target.list(path):
+                count += 1
+                if is_dir:
+                    stack.append(path + '/' + name)
+        return count, 0
+
+
+class LargeList(Scenario):
+    name = 'large_list'
+
+    def setup(self):
+        self.server.add_synthetic_tree('/bench/large_list', depth=0, fanout=0,
+                                       files=self.args.list_files,
+                                       file_size=self.args.small_size)
+
+    def run(self, target):
+        count = sum(1 for _ in target.list('/bench/large_list'))
+        return count, 0
+
+
+SCENARIOS = [SequentialRead, RandomRead, SmallFileCreate, LargeAppend,
+             DeepWalk, LargeList]
+
+
+class ClientTarget(object):
+    """
+    Drives PyWebHdfsClient directly
+    """
+    name = 'client'
+
+    def __init__(self, server):
+        self.client = PyWebHdfsClient(
+            base_uri_pattern=server.base_uri,
+            request_extra_opts={'auth': SessionCookieAuth('bench', 'bench')})
+
+    def read(self, path, size, offset):
+        return self.client.read_file(path, offset=offset, length=size)
+
+    def mkdir(self, path):
+        self.client.make_dir(path)
+
+    def create(self, path):
+        self.client.create_file(path, file_data=None, overwrite=True)
+
+    def append(self, path, data, offset):
+        self.client.append_file(path, file_data=data)
+
+    def write_file(self, path, data):
+        self.client.create_file(path, file_data=data, overwrite=True)
+
+    def list(self, path):
+        for s in self.client.stream_dir(path):
+            yield s['pathSuffix'], s['type'] == 'DIRECTORY'
+
+    def finish(self):
+        pass
+
+
+class FuseTarget(object):
+    """
+    Drives the operations of the WebHDFS FUSE class like the kernel would
+    """
+    name = 'fuse'
+
+    def __init__(self, server):
+        self.fs = load_mount(server).WebHDFS()
+
+    def read(self, path, size, offset):
+        return self.fs('read', path, size, offset, 0)
+
+    def mkdir(self, path):
+        self.fs('mkdir', path, 0o755)
+
+    def create(self, path):
+        self.fs('create', path, 0o644)
+        self.fs('getattr', path)
+
+    def append(self, path, data, offset):
+        self.fs('write', path, data, offset, 0)
+
+    def write_file(self, path, data):
+        self.create(path)
+        self.append(path, data, 0)
+        self.fs('flush', path, 0)
+        self.fs('release', path, 0)
+
+    def list(self, path):
+        for name in self.fs('readdir', path, 0)[2:]:
+            st = self.fs('getattr', path + '/' + name)
+            yield name, st['st_mode'] & 0o40000 != 0
+
+    def finish(self):
+        self.fs('destroy', '/')
+
+
+TARGETS = {'client': ClientTarget, 'fuse': FuseTarget}
+
+
+def load_mount(server, config=''):
+    """
+    Import mount-webhdfs.py with a webhdfs.ini pointing at the fake server,
+    followed by the config lines given
+    """
+    home = tempfile.mkdtemp(prefix='webhdfs-bench-')
+    os.makedirs(os.path.join(home, '.config'))
+    with open(os.path.join(home, '.config', 'webhdfs.ini'), 'w') as f:
+        f.write("[DEFAULT]\nhdfs_host = localhost\nhdfs_baseurl = {}\n"
+                "hdfs_username = bench\nhdfs_password = bench\n{}"
+                .format(server.base_uri, config))
+    os.environ['HOME'] = home
+    for name in ('webhdfs', 'mount_webhdfs'):
+        sys.modules.pop(name, None)
+    spec = importlib.util.spec_from_file_location(
+        'mount_webhdfs', os.path.join(BASE_DIR, 'mount-webhdfs.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['mount_webhdfs'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def run(args):
+    server = FakeWebHdfs(latency=args.latency, bandwidth=args.bandwidth,
+                         gzip=args.gzip, login_latency=args.login_latency,
+                         credentials=('bench', 'bench')
+                         if args.login_latency is not None else None).start()
+    results = []
+    try:
+        for scenario_cls in SCENARIOS:
+            if args.scenario and scenario_cls.name not in args.scenario:
+                continue
+            scenario = scenario_cls(args, server)
+            scenario.setup()
+            for target_name in args.target:
+                target = TARGETS[target_name](server)
+                requests_before = Counter(server.requests)
+                start = time.time()
+                ops, nbytes = scenario.run(target)
+                elapsed = time.time() - start
+                requests = sum((server.requests - requests_before).values())
+                results.append(dict(scenario=scenario.name, target=target_name,
+                                    ops=ops, bytes=nbytes, seconds=elapsed,
+                                    requests=requests))
+    finally:
+        server.stop()
+    return results
+
+
+def report(results, baseline=None, tolerance=0.2):
+    baseline = dict(((r['scenario'], r['target']), r) for r in baseline or [])
+    print("{:14} {:7} {:>9} {:>9} {:>10} {:>9} {:>10}".format(
+        'scenario', 'target', 'ops', 'seconds', 'ops/s', 'MB/s', 'requests'))
+    regressions = 0
+    for r in results:
+        line = "{:14} {:7} {:9d} {:9.3f} {:10.1f} {:9.1f} {:10d}".format(
+            r['scenario'], r['target'], r['ops'], r['seconds'],
+            r['ops'] / r['seconds'], r['bytes'] / MB / r['seconds'],
+            r['requests'])
+        before = baseline.get((r['scenario'], r['target']))
+        if before:
+            ratio = r['seconds'] / before['seconds']
+            line += "  {:5.2f}x time".format(ratio)
+            if ratio > 1 + tolerance:
+                line += "  REGRESSION"
+                regressions += 1
+        print(line)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--scenario', action='append',
+                        choices=[s.name for s in SCENARIOS],
+                        help='scenario to run (default: all)')
+    parser.add_argument('--target', action='append', choices=sorted(TARGETS),
+                        help='client and/or fuse (default: both)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every HTTP request')
+    parser.add_argument('--bandwidth', type=float, default=None,
+                        help='bytes per second of request/response bodies')
+    parser.add_argument('--gzip', action='store_true',
+                        help='gzip-compress the JSON responses')
+    parser.add_argument('--login-latency', type=float, default=None,
+                        help='require logging in, which takes this many seconds')
+    parser.add_argument('--file-size', type=int, default=64 * MB)
+    parser.add_argument('--block-size', type=int, default=128 * 1024,
+                        help='size of sequential reads and appends')
+    parser.add_argument('--small-size', type=int, default=2048)
+    parser.add_argument('--count', type=int, default=200,
+                        help='random reads and small files per run')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--fanout', type=int, default=6)
+    parser.add_argument('--files', type=int, default=20,
+                        help='files in each directory of the walked tree')
+    parser.add_argument('--list-files', type=int, default=100000,
+                        help='files in the directory of large_list')
+    parser.add_argument('--json', metavar='FILE',
+                        help='save the results for a later --compare')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare with the results saved in FILE')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='slowdown reported as a regression (def: 0.2)')
+    args = parser.parse_args()
+    args.target = args.target or sorted(TARGETS)
+
+    results = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    regressions = report(results, baseline, args.tolerance)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,708 @@
+#!/usr/bin/env python3
+"""
+A local stand-in for a WebHDFS endpoint, used by the benchmarks
+
+One HTTP server plays both the NameNode and the DataNode: OPEN, CREATE
+and APPEND sent to /webhdfs/v1/ are answered with a 307 redirect to
+/datanode/webhdfs/v1/ on the same server, like a real cluster does.
+Latency (per HTTP request) and bandwidth (per body byte) can be injected,
+and JSON responses gzip-compressed like a Knox gateway can be set up to.
+With credentials, requests must log in with HTTP Basic authentication (which
+takes login_latency, like a directory server lookup), a session cookie or a
+delegation token, the way they do through Knox.
+
+Files and directories live in memory. In addition, synthetic read-only
+trees of any size can be mounted: their entries and contents are computed
+from the path, so trees of millions of entries cost no memory.
+
+>>> server = FakeWebHdfs(latency=0.002).start()
+>>> server.add_synthetic_tree('/synthetic', depth=3, fanout=10, files=100)
+>>> client = PyWebHdfsClient(base_uri_pattern=server.base_uri)
+"""
+from __future__ import print_function, absolute_import, division
+
+import argparse
+import base64
+import gzip
+import json
+import os
+import posixpath
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+NAMENODE_PREFIX = '/webhdfs/v1'
+DATANODE_PREFIX = '/datanode/webhdfs/v1'
+BLOCK_SIZE = 128 * 1024 * 1024
+# 251 is prime, so synthetic contents do not line up with power of two reads
+PATTERN = bytes(range(251)) * 4096
+
+
+def synthetic_content(offset, length):
+    """
+    Return the bytes [offset, offset + length) of every synthetic file
+    """
+    chunks = []
+    while length > 0:
+        start = offset % 251
+        chunk = PATTERN[start:start + length]
+        chunks.append(chunk)
+        offset += len(chunk)
+        length -= len(chunk)
+    return b''.join(chunks)
+
+
+class _Node(object):
+    __slots__ = ('type', 'data', 'mtime', 'atime', 'permission', 'children',
+                 'xattrs')
+
+    def __init__(self, type, permission='755'):
+        self.type = type
+        self.data = bytearray() if type == 'FILE' else None
+        self.children = {} if type == 'DIRECTORY' else None
+        self.mtime = self.atime = int(time.time() * 1000)
+        self.permission = permission
+        self.xattrs = {}
+
+
+class SyntheticTree(object):
+    """
+    A read-only tree where every directory holds `fanout` subdirectories
+    (down to `depth` levels) named dNNNN and `files` files named fNNNNNN of
+    `file_size` bytes each
+    """
+
+    _name_re = re.compile(r'^([df])(\d+)$')
+
+    def __init__(self, depth=2, fanout=10, files=100, file_size=4096):
+        self.depth = depth
+        self.fanout = fanout
+        self.files = files
+        self.file_size = file_size
+        self.mtime = int(time.time() * 1000)
+
+    def entries(self):
+        """
+        Total number of files and directories in the tree
+        """
+        dirs = sum(self.fanout ** level for level in range(self.depth + 1))
+        return dirs + dirs * self.files - 1
+
+    def lookup(self, parts):
+        """
+        Return 'DIRECTORY', 'FILE' or None for the path components below
+        the root of the tree
+        """
+        for level, part in enumerate(parts):
+            m = self._name_re.match(part)
+            if not m:
+                return None
+            index = int(m.group(2))
+            if m.group(1) == 'd':
+                if level >= self.depth or index >= self.fanout:
+                    return None
+            else:
+                if level != len(parts) - 1 or index >= self.files:
+                    return None
+                return 'FILE'
+        return 'DIRECTORY'
+
+    def list(self, parts):
+        names = []
+        if len(parts) < self.depth:
+            names.extend('d%04d' % i for i in range(self.fanout))
+        names.extend('f%07d' % i for i in range(self.files))
+        return names
+
+
+class FakeWebHdfs(object):
+    """
+    In-process WebHDFS server
+
+    :param latency: seconds slept before answering every HTTP request
+    :param bandwidth: bytes per second of request and response bodies
+    :param host: address to listen on
+    :param port: port to listen on, 0 picks a free one
+    :param owner: owner and group reported for every entry
+    :param gzip: compress JSON responses for clients accepting gzip
+    :param credentials: (user, password) required from clients
+    :param login_latency: seconds added to requests authenticated with
+      the credentials
+    :param session_seconds: lifetime of the session cookies
+    """
+
+    def __init__(self, latency=0.0, bandwidth=None, host='127.0.0.1',
+                 port=0, owner='hdfs', gzip=False, credentials=None,
+                 login_latency=0.0, session_seconds=3600):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.gzip = gzip
+        self.credentials = credentials
+        self.login_latency = login_latency
+        self.session_seconds = session_seconds
+        # session cookie and delegation token -> expiry
+        self.sessions = {}
+        self.tokens = {}
+        self.logins = 0
+        self.owner = owner
+        self.root = _Node('DIRECTORY')
+        self.synthetic = {}
+        self.requests = Counter()
+        self.lock = threading.RLock()
+        fake = self
+
+        class Handler(_Handler):
+            server_state = fake
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def address(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    @property
+    def base_uri(self):
+        return self.address + NAMENODE_PREFIX + '/'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       name='fake-webhdfs', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def add_synthetic_tree(self, path, **kwargs):
+        """
+        Mount a SyntheticTree(**kwargs) at path, creating its parents
+        """
+        path = _normpath(path)
+        self.mkdirs(posixpath.dirname(path))
+        tree = SyntheticTree(**kwargs)
+        with self.lock:
+            self.synthetic[path] = tree
+            self._lookup(posixpath.dirname(path)).children[
+                posixpath.basename(path)] = None
+        return tree
+
+    def add_file(self, path, data=b''):
+        path = _normpath(path)
+        self.mkdirs(posixpath.dirname(path))
+        with self.lock:
+            parent = self._lookup(posixpath.dirname(path))
+            node = _Node('FILE', permission='644')
+            node.data.extend(data)
+            parent.children[posixpath.basename(path)] = node
+            parent.mtime = node.mtime
+        return node
+
+    def mkdirs(self, path):
+        node = self.root
+        with self.lock:
+            for part in _split(path):
+                if node.children.get(part) is None:
+                    node.children[part] = _Node('DIRECTORY')
+                    node.mtime = int(time.time() * 1000)
+                node = node.children[part]
+                if node.type != 'DIRECTORY':
+                    raise ValueError('Not a directory: ' + path)
+        return node
+
+    def _synthetic(self, path):
+        """
+        Return (tree, components below its root) when path is inside a
+        synthetic tree
+        """
+        for root, tree in self.synthetic.items():
+            if path == root or path.startswith(root + '/'):
+                return tree, _split(path[len(root):])
+        return None, None
+
+    def _lookup(self, path):
+        node = self.root
+        for part in _split(path):
+            if node.children is None:
+                return None
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def status(self, path, suffix=''):
+        """
+        Return the WebHDFS FileStatus JSON object of path, or None
+        """
+        path = _normpath(path)
+        tree, parts = self._synthetic(path)
+        if tree is not None:
+            type = tree.lookup(parts)
+            if type is None:
+                return None
+            length = tree.file_size if type == 'FILE' else 0
+            children = (len(tree.list(parts)) if type == 'DIRECTORY' else 0)
+            return self._file_status(suffix, type, length, tree.mtime,
+                                     tree.mtime, '555', children)
+        with self.lock:
+            node = self._lookup(path)
+            if node is None:
+                return None
+            length = len(node.data) if node.type == 'FILE' else 0
+            children = len(node.children) if node.type == 'DIRECTORY' else 0
+            return self._file_status(suffix, node.type, length, node.mtime,
+                                     node.atime, node.permission, children)
+
+    def _file_status(self, suffix, type, length, mtime, atime, permission,
+                     children):
+        return {
+            'accessTime': atime,
+            'blockSize': BLOCK_SIZE if type == 'FILE' else 0,
+            'childrenNum': children,
+            'fileId': 16386,
+            'group': self.owner,
+            'length': length,
+            'modificationTime': mtime,
+            'owner': self.owner,
+            'pathSuffix': suffix,
+            'permission': permission,
+            'replication': 3 if type == 'FILE' else 0,
+            'storagePolicy': 0,
+            'type': type,
+        }
+
+    def list_status(self, path):
+        path = _normpath(path)
+        tree, parts = self._synthetic(path)
+        if tree is not None:
+            if tree.lookup(parts) == 'DIRECTORY':
+                return [self.status(path + '/' + name, name)
+                        for name in tree.list(parts)]
+        with self.lock:
+            node = self._lookup(path)
+            if node is None and tree is None:
+                return None
+            if node is not None and node.type == 'DIRECTORY':
+                return [self.status(posixpath.join(path, name), name)
+                        for name in list(node.children)]
+        status = self.status(path)
+        return None if status is None else [status]
+
+    def read(self, path, offset, length):
+        path = _normpath(path)
+        tree, parts = self._synthetic(path)
+        if tree is not None:
+            if tree.lookup(parts) != 'FILE':
+                return None
+            size = tree.file_size
+            end = size if length is None else min(size, offset + length)
+            return synthetic_content(offset, max(0, end - offset))
+        with self.lock:
+            node = self._lookup(path)
+            if node is None or node.type != 'FILE':
+                return None
+            end = None if length is None else offset + length
+            return bytes(node.data[offset:end])
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and small bodies leave in one segment, without Nagle delays
+    disable_nagle_algorithm = True
+    wbufsize = 64 * 1024
+    server_state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _dispatch(self, method):
+        fake = self.server_state
+        url = urlsplit(self.path)
+        query = dict((k, v[-1]) for k, v in
+                     parse_qs(url.query, keep_blank_values=True).items())
+        op = query.get('op', '').upper()
+        if fake.latency:
+            time.sleep(fake.latency)
+        self._response_headers = []
+        if fake.credentials and not self._authenticate(query):
+            self._read_body()
+            return self._send(401, headers=[
+                ('WWW-Authenticate', 'BASIC realm="application"')])
+        if url.path.startswith(DATANODE_PREFIX):
+            path = unquote(url.path[len(DATANODE_PREFIX):])
+            fake.requests['datanode ' + op] += 1
+            handler = getattr(self, 'datanode_' + op, None)
+        elif url.path.startswith(NAMENODE_PREFIX):
+            path = unquote(url.path[len(NAMENODE_PREFIX):])
+            fake.requests[op] += 1
+            handler = getattr(self, 'namenode_' + op, None)
+        else:
+            handler = path = None
+        if handler is None:
+            self._read_body()
+            return self._error(400, 'IllegalArgumentException',
+                               'Invalid value for webhdfs parameter "op"')
+        try:
+            handler(method, _normpath(path), query)
+        except BrokenPipeError:
+            pass
+
+    # -- helpers ---------------------------------------------------------
+
+    def _authenticate(self, query):
+        fake = self.server_state
+        now = time.time()
+        if fake.tokens.get(query.get('delegation'), 0) > now:
+            return True
+        scheme, _, encoded = self.headers.get('authorization', '').partition(' ')
+        if scheme.lower() != 'basic':
+            # credentials are checked whenever they are sent, even along
+            # with a valid session cookie
+            for cookie in self.headers.get('cookie', '').split(';'):
+                name, _, value = cookie.strip().partition('=')
+                if name == 'KNOXSESSIONID' and fake.sessions.get(value, 0) > now:
+                    return True
+            return False
+        user, _, password = base64.b64decode(encoded).decode('utf8').partition(':')
+        if (user, password) != tuple(fake.credentials):
+            return False
+        if fake.login_latency:
+            time.sleep(fake.login_latency)
+        with fake.lock:
+            fake.logins += 1
+            session = base64.urlsafe_b64encode(os.urandom(12)).decode('ascii')
+            fake.sessions[session] = now + fake.session_seconds
+        self._response_headers.append(
+            ('Set-Cookie', 'KNOXSESSIONID={}; Path=/; HttpOnly'.format(session)))
+        return True
+
+    def _read_body(self):
+        if self.headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            data = b''.join(chunks)
+        else:
+            data = self.rfile.read(int(self.headers.get('content-length', 0)))
+        self._throttle(len(data))
+        return data
+
+    def _throttle(self, nbytes):
+        bandwidth = self.server_state.bandwidth
+        if bandwidth and nbytes:
+            time.sleep(nbytes / bandwidth)
+
+    def _send(self, code, body=b'', content_type='application/json',
+              headers=()):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in list(headers) + self._response_headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self._throttle(len(body))
+            self.wfile.write(body)
+
+    def _json(self, obj, code=200):
+        body = json.dumps(obj).encode('utf8')
+        if (self.server_state.gzip and
+                'gzip' in self.headers.get('accept-encoding', '')):
+            self._send(code, gzip.compress(body, 1),
+                       headers=[('Content-Encoding', 'gzip')])
+        else:
+            self._send(code, body)
+
+    def _error(self, code, exception, message):
+        self._json({'RemoteException': {
+            'exception': exception,
+            'javaClassName': 'org.apache.hadoop.' + exception,
+            'message': message}}, code)
+
+    def _not_found(self, path):
+        self._error(404, 'FileNotFoundException',
+                    'File does not exist: ' + path)
+
+    def _redirect(self, path, query):
+        location = '{}{}{}?{}'.format(
+            self.server_state.address, DATANODE_PREFIX,
+            self.path.split('?')[0][len(NAMENODE_PREFIX):],
+            self.path.split('?', 1)[1])
+        self._send(307, headers=[('Location', location)])
+
+    def _writable(self, path):
+        tree, parts = self.server_state._synthetic(path)
+        if tree is not None:
+            self._error(403, 'AccessControlException',
+                        'Permission denied: synthetic tree ' + path)
+            return False
+        return True
+
+    # -- NameNode --------------------------------------------------------
+
+    def namenode_GETFILESTATUS(self, method, path, query):
+        status = self.server_state.status(path)
+        if status is None:
+            return self._not_found(path)
+        self._json({'FileStatus': status})
+
+    def namenode_LISTSTATUS(self, method, path, query):
+        statuses = self.server_state.list_status(path)
+        if statuses is None:
+            return self._not_found(path)
+        self._json({'FileStatuses': {'FileStatus': statuses}})
+
+    def namenode_OPEN(self, method, path, query):
+        status = self.server_state.status(path)
+        if status is None:
+            return self._not_found(path)
+        self._redirect(path, query)
+
+    def namenode_CREATE(self, method, path, query):
+        self._read_body()
+        if not self._writable(path):
+            return
+        status = self.server_state.status(path)
+        if status is not None and query.get('overwrite') != 'true':
+            return self._error(403, 'FileAlreadyExistsException',
+                               path + ' already exists')
+        self._redirect(path, query)
+
+    def namenode_APPEND(self, method, path, query):
+        self._read_body()
+        status = self.server_state.status(path)
+        if status is None:
+            return self._not_found(path)
+        if self._writable(path):
+            self._redirect(path, query)
+
+    def namenode_MKDIRS(self, method, path, query):
+        if self._writable(path):
+            self.server_state.mkdirs(path)
+            self._json({'boolean': True})
+
+    def namenode_GETDELEGATIONTOKEN(self, method, path, query):
+        fake = self.server_state
+        token = base64.urlsafe_b64encode(os.urandom(24)).decode('ascii')
+        with fake.lock:
+            fake.tokens[token] = time.time() + fake.session_seconds
+        self._json({'Token': {'urlString': token}})
+
+    def namenode_RENEWDELEGATIONTOKEN(self, method, path, query):
+        fake = self.server_state
+        token = query.get('token')
+        with fake.lock:
+            if token not in fake.tokens:
+                return self._error(403, 'InvalidToken', 'token is expired or doesn\'t exist')
+            fake.tokens[token] = time.time() + fake.session_seconds
+        self._json({'long': int(fake.tokens[token] * 1000)})
+
+    def namenode_CANCELDELEGATIONTOKEN(self, method, path, query):
+        fake = self.server_state
+        with fake.lock:
+            fake.tokens.pop(query.get('token'), None)
+        self._json({})
+
+    def namenode_DELETE(self, method, path, query):
+        fake = self.server_state
+        if not self._writable(path):
+            return
+        with fake.lock:
+            parent = fake._lookup(posixpath.dirname(path))
+            name = posixpath.basename(path)
+            if parent is None or name not in parent.children:
+                return self._json({'boolean': False})
+            node = parent.children[name]
+            if (node is not None and node.type == 'DIRECTORY' and
+                    node.children and query.get('recursive') != 'true'):
+                return self._error(403, 'PathIsNotEmptyDirectoryException',
+                                   path + ' is non empty')
+            del parent.children[name]
+            parent.mtime = int(time.time() * 1000)
+            fake.synthetic.pop(path, None)
+        self._json({'boolean': True})
+
+    def namenode_RENAME(self, method, path, query):
+        fake = self.server_state
+        destination = _normpath(query.get('destination', ''))
+        if not (self._writable(path) and self._writable(destination)):
+            return
+        with fake.lock:
+            parent = fake._lookup(posixpath.dirname(path))
+            target = fake._lookup(posixpath.dirname(destination))
+            name = posixpath.basename(path)
+            if (parent is None or name not in parent.children or
+                    target is None or target.type != 'DIRECTORY' or
+                    posixpath.basename(destination) in target.children):
+                return self._json({'boolean': False})
+            target.children[posixpath.basename(destination)] = \
+                parent.children.pop(name)
+            parent.mtime = target.mtime = int(time.time() * 1000)
+        self._json({'boolean': True})
+
+    def namenode_GETXATTRS(self, method, path, query):
+        if self.server_state.status(path) is None:
+            return self._not_found(path)
+        node = self.server_state._lookup(path)
+        xattrs = node.xattrs if node is not None else {}
+        names = [query['xattr.name']] if 'xattr.name' in query else sorted(xattrs)
+        if any(name not in xattrs for name in names):
+            return self._error(403, 'IOException',
+                               'At least one of the attributes provided was not found.')
+        encoding = query.get('encoding', 'text').lower()
+        self._json({'XAttrs': [{'name': name, 'value': _encode_xattr(xattrs[name], encoding)}
+                               for name in names]})
+
+    def namenode_SETXATTR(self, method, path, query):
+        if not self._writable(path):
+            return
+        node = self.server_state._lookup(path)
+        if node is None:
+            return self._not_found(path)
+        name, flag = query.get('xattr.name', ''), query.get('flag', 'CREATE').upper()
+        if (name in node.xattrs) != (flag == 'REPLACE'):
+            return self._error(403, 'IOException',
+                               'XAttr: {} {} exist'.format(name, 'does not' if flag == 'REPLACE'
+                                                           else 'already'))
+        node.xattrs[name] = _decode_xattr(query.get('xattr.value', ''))
+        self._json({})
+
+    def namenode_REMOVEXATTR(self, method, path, query):
+        if not self._writable(path):
+            return
+        node = self.server_state._lookup(path)
+        if node is None:
+            return self._not_found(path)
+        if node.xattrs.pop(query.get('xattr.name', ''), None) is None:
+            return self._error(403, 'IOException', 'No matching attributes found for remove operation')
+        self._json({})
+
+    def namenode_CONCAT(self, method, path, query):
+        fake = self.server_state
+        sources = [_normpath(s) for s in query.get('sources', '').split(',') if s]
+        if not all(self._writable(p) for p in [path] + sources):
+            return
+        with fake.lock:
+            target = fake._lookup(path)
+            nodes = [fake._lookup(source) for source in sources]
+            if target is None or target.type != 'FILE':
+                return self._not_found(path)
+            for source, node in zip(sources, nodes):
+                if node is None or node.type != 'FILE':
+                    return self._not_found(source)
+                if posixpath.dirname(source) != posixpath.dirname(path):
+                    return self._error(400, 'HadoopIllegalArgumentException',
+                                       source + ' is not in the directory of ' + path)
+            parent = fake._lookup(posixpath.dirname(path))
+            for source, node in zip(sources, nodes):
+                target.data.extend(node.data)
+                del parent.children[posixpath.basename(source)]
+            target.mtime = parent.mtime = int(time.time() * 1000)
+        self._send(200)
+
+    # -- DataNode --------------------------------------------------------
+
+    def datanode_OPEN(self, method, path, query):
+        length = query.get('length')
+        data = self.server_state.read(path, int(query.get('offset', 0)),
+                                      None if length is None else int(length))
+        if data is None:
+            return self._not_found(path)
+        self._send(200, data, 'application/octet-stream')
+
+    def datanode_CREATE(self, method, path, query):
+        data = self._read_body()
+        node = self.server_state.add_file(path, data)
+        if 'permission' in query:
+            node.permission = query['permission']
+        self._send(201, headers=[('Location', 'hdfs://' + path)])
+
+    def datanode_APPEND(self, method, path, query):
+        data = self._read_body()
+        fake = self.server_state
+        with fake.lock:
+            node = fake._lookup(path)
+            if node is None or node.type != 'FILE':
+                return self._not_found(path)
+            node.data.extend(data)
+            node.mtime = int(time.time() * 1000)
+        self._send(200)
+
+
+def _encode_xattr(value, encoding):
+    if encoding == 'hex':
+        return '0x' + value.hex()
+    if encoding == 'base64':
+        return '0s' + base64.b64encode(value).decode('ascii')
+    return json.dumps(value.decode('utf8', 'replace'))
+
+
+def _decode_xattr(value):
+    if value.startswith(('0x', '0X')):
+        return bytes.fromhex(value[2:])
+    if value.startswith(('0s', '0S')):
+        return base64.b64decode(value[2:])
+    if value.startswith('"') and value.endswith('"') and len(value) > 1:
+        value = value[1:-1]
+    return value.encode('utf8')
+
+
+def _split(path):
+    return [part for part in path.split('/') if part]
+
+
+def _normpath(path):
+    return '/' + '/'.join(_split(path))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=50070)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every HTTP request')
+    parser.add_argument('--bandwidth', type=float, default=None,
+                        help='bytes per second of request/response bodies')
+    parser.add_argument('--gzip', action='store_true',
+                        help='compress JSON responses')
+    parser.add_argument('--synthetic', metavar='PATH:DEPTH:FANOUT:FILES:SIZE',
+                        action='append', default=[],
+                        help='mount a synthetic read-only tree')
+    args = parser.parse_args()
+
+    server = FakeWebHdfs(latency=args.latency, bandwidth=args.bandwidth,
+                         host=args.host, port=args.port, gzip=args.gzip)
+    for spec in args.synthetic:
+        path, depth, fanout, files, size = spec.split(':')
+        tree = server.add_synthetic_tree(path, depth=int(depth),
+                                         fanout=int(fanout), files=int(files),
+                                         file_size=int(size))
+        print("Synthetic tree {} with {} entries".format(path, tree.entries()))
+    print("Serving WebHDFS at {}".format(server.base_uri))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -2,62 +2,417 @@
 from __future__ import print_function, absolute_import, division
 
 import os
+import re
+import base64
 import sys
+import ctypes
+import time
 import logging
+import tempfile
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from errno import ENOENT, ENOSPC
-from stat import S_IFDIR, S_IFLNK, S_IFREG
-from fuse import FUSE, FuseOSError, Operations, LoggingMixIn
+from fnmatch import translate
+from errno import EACCES, EEXIST, EIO, ENODATA, ENOENT, ENOSPC, ENOTSUP, EROFS
+from stat import S_IFDIR, S_IFLNK, S_IFREG, S_ISREG
+from fuse import FUSE, FuseOSError, Operations, LoggingMixIn, fuse_get_context
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.SecurityWarning)
 
 sys.path.insert(0, ".")
 import pywebhdfs
 import webhdfs
+import webhdfs_columnar
+import webhdfs_memory
+import webhdfs_profile
+import webhdfs_stats
+import webhdfs_warmup
 
 logger = logging.getLogger('Webhdfs')
-CACHE_MAX_SECONDS = 30
+cfg = webhdfs.cfg['DEFAULT']
+CACHE_MAX_SECONDS = cfg.getfloat('CACHE_MAX_SECONDS', 30)
+# seconds the kernel may cache name lookups, attributes and failed lookups
+# without asking us again
+ENTRY_TIMEOUT = cfg.getfloat('ENTRY_TIMEOUT', CACHE_MAX_SECONDS)
+ATTR_TIMEOUT = cfg.getfloat('ATTR_TIMEOUT', CACHE_MAX_SECONDS)
+NEGATIVE_TIMEOUT = cfg.getfloat('NEGATIVE_TIMEOUT', CACHE_MAX_SECONDS)
+# keep the kernel page cache of a file when it is opened again:
+# 'auto' if its HDFS mtime did not change since the last open, 'always' or 'never'
+KERNEL_CACHE = cfg.get('KERNEL_CACHE', 'auto')
+# new files are kept in memory until closed, and then created with their
+# content in a single upload, as long as they stay below this size (0 disables)
+WRITE_BUFFER_BYTES = cfg.getint('WRITE_BUFFER_BYTES', 4 * 1024 * 1024)
+# number of closed files uploaded concurrently in the background
+UPLOAD_WORKERS = cfg.getint('UPLOAD_WORKERS', 8)
+# sequential reads fetch windows ahead of the kernel requests, doubling up to
+# this size (0 disables read-ahead)
+READ_AHEAD_BYTES = cfg.getint('READ_AHEAD_BYTES', 4 * 1024 * 1024)
+# files whose footer is fetched by the first read in their last
+# FOOTER_PREFETCH_BYTES, after which a read in one of the column chunks it
+# lists fetches the whole chunk if it is at most READ_AHEAD_BYTES long, or as
+# much of the rest of the chunk (empty disables)
+COLUMNAR_SUFFIXES = tuple(s.strip() for s in cfg.get('COLUMNAR_SUFFIXES', '.parquet, .orc').split(',')
+                          if s.strip())
+FOOTER_PREFETCH_BYTES = cfg.getint('FOOTER_PREFETCH_BYTES', 256 * 1024)
+# neighbouring column chunks are fetched together up to this size
+COLUMNAR_COALESCE_BYTES = cfg.getint('COLUMNAR_COALESCE_BYTES', 1024 * 1024)
+# files of at most this size are fetched whole by their first read, and then
+# served from memory as long as their mtime does not change (0 disables)
+SMALL_FILE_BYTES = cfg.getint('SMALL_FILE_BYTES', 256 * 1024)
+# memory of the small files kept, the ones fetched first being dropped first
+SMALL_FILE_CACHE_BYTES = cfg.getint('SMALL_FILE_CACHE_BYTES', 64 * 1024 * 1024)
+# number of the small files following the one read in the listing of its
+# directory that are fetched concurrently, ahead of their reads (0 disables)
+SMALL_FILE_PREFETCH = cfg.getint('SMALL_FILE_PREFETCH', 0)
+# names reported missing without asking HDFS, unless a cached listing of
+# their directory shows them, e.g. .git, __pycache__, *.so (comma separated)
+NEGATIVE_PATTERNS = [p.strip() for p in cfg.get('NEGATIVE_PATTERNS', '').split(',') if p.strip()]
+_negative_match = re.compile('|'.join(translate(p) for p in NEGATIVE_PATTERNS)).match \
+    if NEGATIVE_PATTERNS else None
+# an expired listing (not the statuses of its entries) is kept if the
+# modification time of its directory did not change, for up to this many
+# seconds since it was fetched (0 always lists directories again)
+LISTDIR_REVALIDATE_SECONDS = cfg.getfloat('LISTDIR_REVALIDATE_SECONDS', 300)
+# expired statuses and listings are still served for this many seconds while
+# they are fetched again in the background (0 fetches them before answering)
+STALE_GRACE_SECONDS = cfg.getfloat('STALE_GRACE_SECONDS', 0)
+# reject every change with EROFS, and mount read-only
+READ_ONLY = cfg.getboolean('READ_ONLY', False)
+# subtrees nothing ever changes (comma separated), e.g. partitions written
+# once: their metadata is cached without expiring, the kernel keeps their
+# pages and changes are rejected with EROFS. HDFS snapshots (.snapshot
+# directories) are always treated this way.
+IMMUTABLE_PATHS = tuple(p.strip().rstrip('/') for p in cfg.get('IMMUTABLE_PATHS', '').split(',')
+                        if p.strip())
+# operations changing HDFS
+_WRITE_OPS = frozenset(('create', 'write', 'truncate', 'mkdir', 'unlink', 'rmdir',
+                        'rename', 'chmod', 'chown', 'utimens', 'setxattr',
+                        'removexattr', 'symlink', 'link', 'mknod'))
+# extended attributes, read with one GETXATTRS per file and cached like its
+# status (false reports them unsupported, as before)
+XATTRS = cfg.getboolean('XATTRS', True)
+# the only attributes HDFS shows: its system namespace is not visible to
+# clients, and security holds only security.hdfs.unreadable.by.superuser, so
+# probes for security.selinux or system.posix_acl_access are answered at once
+_HDFS_XATTR_PREFIXES = ('user.', 'trusted.', 'raw.', 'security.hdfs.')
+# setxattr options
+XATTR_CREATE, XATTR_REPLACE = 1, 2
+# memory for cached metadata, read-ahead buffers and buffered writes together (0: no limit)
+MEMORY_BUDGET_BYTES = cfg.getint('MEMORY_BUDGET_BYTES', 0)
+# estimated memory of a cached status or xattrs, and of a name in a cached listing
+_STAT_ENTRY_BYTES, _LISTED_NAME_BYTES = 1024, 128
+# record the directories listed, paths looked up and ranges read to this file,
+# replaced on unmount (see webhdfs_warmup.py)
+ACCESS_TRACE_FILE = os.path.expanduser(cfg.get('ACCESS_TRACE_FILE', ''))
+# when mounting, replay the accesses recorded by the previous mount through the
+# mount point with this many threads, to warm up the caches (0 disables)
+WARMUP_WORKERS = cfg.getint('WARMUP_WORKERS', 0)
+# cache the ids of all the users and groups of the system at startup
+ID_PRELOAD = cfg.getboolean('ID_PRELOAD', False)
+# directory of the reports of the profiling toggled by SIGUSR1 (see webhdfs_profile.py)
+PROFILE_DIR = os.path.expanduser(cfg.get('PROFILE_DIR', tempfile.gettempdir()))
+# virtual file in the root of the mount serving the metrics
+STATS_FILE = '/.webhdfs-stats'
+# also serve the metrics over HTTP on this local port (0 disables)
+STATS_PORT = cfg.getint('STATS_PORT', 0)
 mountpoint = ""
 
+
+def _immutable(path):
+    """
+    Whether path is in a subtree that never changes
+    """
+    if '/.snapshot/' in path + '/':
+        return True
+    return any(path == prefix or path.startswith(prefix + '/') for prefix in IMMUTABLE_PATHS)
+
+
+def _xattr_errno(error):
+    """
+    The errno of a GETXATTRS refused by HDFS: EACCES when it is forbidden,
+    ENOTSUP otherwise, e.g. with dfs.namenode.xattrs.enabled = false
+    """
+    message = error.msg
+    if isinstance(message, bytes):
+        message = message.decode('utf8', 'replace')
+    if isinstance(error, pywebhdfs.errors.Unauthorized) or 'AccessControlException' in str(message):
+        return EACCES
+    return ENOTSUP
+
+
+class PendingFile(object):
+    """
+    A new file whose content is buffered until it is uploaded
+    """
+    __slots__ = ('data', 'permission', 'ctime', 'future', 'error')
+
+    def __init__(self, permission):
+        self.data = bytearray()
+        self.permission = permission
+        self.ctime = time.time()
+        # set once the file is closed and its upload is scheduled
+        self.future = None
+        # the exception the upload failed with
+        self.error = None
+
+
+class ReadBuffer(object):
+    """
+    The last range fetched from a file, in a buffer reused by every fetch
+    """
+    __slots__ = ('data', 'offset', 'length', 'end', 'window')
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offset = self.length = 0
+        # where the last read ended, to recognize sequential reads
+        self.end = None
+        self.window = 0
+
+    def covers(self, offset, end):
+        return self.offset <= offset and end <= self.offset + self.length
+
+    def fill(self, client, path, offset, length):
+        if len(self.data) < length:
+            self.data = bytearray(length)
+        self.offset = offset
+        self.length = client.read_file_into(
+            path, memoryview(self.data)[:length], offset=offset)
+
+    def slice(self, offset, size):
+        """
+        Return the buffered bytes [offset, offset + size) without copying them
+        """
+        start = offset - self.offset
+        view = memoryview(self.data)[start:min(start + size, self.length)]
+        # fusepy memmoves a ctypes array to the kernel buffer as is
+        return (ctypes.c_char * len(view)).from_buffer(view)
+
+
+class ColumnLayout(object):
+    """
+    The footer of a Parquet or ORC file, and the ranges of its column chunks
+    """
+    __slots__ = ('tail', 'starts', 'ends')
+
+    def __init__(self, tail, ranges):
+        self.tail = tail
+        self.starts = [start for start, end in ranges]
+        self.ends = [end for start, end in ranges]
+
+    def span(self, offset):
+        """
+        Return the (start, end) column chunk range containing offset, or None
+        """
+        i = bisect_right(self.starts, offset) - 1
+        if i >= 0 and offset < self.ends[i]:
+            return self.starts[i], self.ends[i]
+        return None
+
+
 class WebHDFS(LoggingMixIn, Operations):
     """
     A simple Webhdfs filesystem.
     """
 
     def __init__(self):
-        self.client = webhdfs.webhdfs_connect()
+        self.client = webhdfs.webhdfs_connect(pool_size=UPLOAD_WORKERS + SMALL_FILE_PREFETCH + 1)
         self._stats_cache = {}
         self._listdir_cache = {}
         self._enoent_cache = {}
+        # paths made through the mount whose names match NEGATIVE_PATTERNS
+        self._created_negatives = set()
+        self._open_mtimes = {}
+        self._pending = {}
+        # path: PendingFile whose upload failed, until the failure is reported
+        self._failed_uploads = {}
+        self._read_buffers = {}
+        self._layouts = {}
+        self._xattr_cache = {}
+        # path: (mtime, ReadBuffer) of the small files, and their total size
+        self._small_files = OrderedDict()
+        self._small_bytes = 0
+        self._small_lock = threading.Lock()
+        # path: future of the small files being prefetched
+        self._small_fetches = {}
+        # (directory, index in its listing) of the small file expected to be read next
+        self._prefetch_position = (None, 0)
+        self._prefetcher = ThreadPoolExecutor(max_workers=SMALL_FILE_PREFETCH) \
+            if SMALL_FILE_PREFETCH else None
+        self._uploader = ThreadPoolExecutor(max_workers=max(UPLOAD_WORKERS, 1))
+        self._refresher = ThreadPoolExecutor(max_workers=1)
+        # the thread calling the operations, the only one reclaiming memory (see init)
+        self._fuse_thread = threading.current_thread()
+        # (cache, path) of the entries the refresher is going to fetch
+        self._refreshing = set()
+        # changes made through the mount, counted to tell if a refresh raced one
+        self._changes = 0
+        self._stats_file = b''
+        self._trace = webhdfs_warmup.AccessTrace(ACCESS_TRACE_FILE) if ACCESS_TRACE_FILE else None
+        # set while the previous trace is replayed through the mount point
+        self._replaying = False
+        self.stats = webhdfs_stats.Stats()
+        self.client.request_hooks.append(self.stats.request_hook)
+        if self.client.scheduler is not None:
+            self.stats.scheduler_gauges(self.client.scheduler)
+        self.stats.gauge('webhdfs_stat_cache_entries',
+                         lambda: len(self._stats_cache))
+        self.stats.gauge('webhdfs_listdir_cache_entries',
+                         lambda: len(self._listdir_cache))
+        self.stats.gauge('webhdfs_enoent_cache_entries',
+                         lambda: len(self._enoent_cache))
+        self.stats.gauge('webhdfs_xattr_cache_entries',
+                         lambda: len(self._xattr_cache))
+        self.stats.gauge('webhdfs_pending_files',
+                         lambda: len(self._pending))
+        self.stats.gauge('webhdfs_small_file_cache_bytes',
+                         lambda: self._small_bytes)
+        self.stats.gauge('webhdfs_uid_cache_entries',
+                         lambda: len(webhdfs.owner_to_uid))
+        self.stats.gauge('webhdfs_gid_cache_entries',
+                         lambda: len(webhdfs.group_to_gid))
+        # the accesses the trace remembers are the cheapest to give back (they are at worst
+        # recorded twice), then cold metadata, and buffered writes the dearest
+        self.memory = webhdfs_memory.MemoryGovernor(MEMORY_BUDGET_BYTES, self.stats)
+        if self._trace is not None:
+            self.memory.register('trace', self._trace.memory, self._trace.reclaim)
+        self.memory.register('metadata', self._metadata_memory, self._reclaim_metadata)
+        self.memory.register('read', self._read_memory, self._reclaim_read)
+        self.memory.register('write', self._write_memory, self._reclaim_write)
+
+    def __call__(self, op, path, *args):
+        start = time.time()
+        try:
+            if op in _WRITE_OPS and (READ_ONLY or _immutable(path) or
+                                     op == 'rename' and _immutable(args[0])):
+                raise FuseOSError(EROFS)
+            return super(WebHDFS, self).__call__(op, path, *args)
+        except OSError:
+            self.stats.inc('webhdfs_fuse_errors_total', op=op)
+            raise
+        finally:
+            self.stats.inc('webhdfs_fuse_ops_total', op=op)
+            self.stats.observe('webhdfs_fuse_op_seconds', time.time() - start, op=op)
+
+    def init(self, path):
+        self._fuse_thread = threading.current_thread()
+        if STATS_PORT:
+            self.stats.serve(STATS_PORT)
+        # init runs in the FUSE thread, the one profiled
+        webhdfs_profile.Profiler(PROFILE_DIR, self.stats.render).install()
+        if ID_PRELOAD:
+            threading.Thread(target=webhdfs.preload_ids, name='webhdfs-ids',
+                             daemon=True).start()
+        if WARMUP_WORKERS and ACCESS_TRACE_FILE:
+            # loaded before this mount records anything
+            records = webhdfs_warmup.load(ACCESS_TRACE_FILE)
+            if records:
+                self._replaying = True
+                threading.Thread(target=self._warm_up, name='webhdfs-warmup',
+                                 args=(records,), daemon=True).start()
+
+    def _warm_up(self, records):
+        """
+        Replay the trace of the previous mount through the mount point, on
+        the warm-up thread, without recording the replay in the new trace
+        """
+        try:
+            webhdfs_warmup.replay(records, os.path.abspath(mountpoint), workers=WARMUP_WORKERS)
+        finally:
+            self._replaying = False
+
+    def _caller_trace(self):
+        """
+        Return the access trace recording the current operation, None if
+        there is none or the operation comes from the replay of this process
+        """
+        if not self._replaying or self._trace is None:
+            return self._trace
+        # FUSE reports the id of the calling thread, one of ours for the replay
+        if os.path.exists('/proc/self/task/{}'.format(fuse_get_context()[2])):
+            return None
+        return self._trace
 
     def _get_listdir(self, path):
         logger.info("List dir %s", path)
-        if path in self._listdir_cache:
-            ts_delta = datetime.now() - self._listdir_cache[path][0]
-            if ts_delta.total_seconds() < CACHE_MAX_SECONDS:
-                entries = self._listdir_cache[path][1]
+        listing = self._listdir_cache.get(path)
+        if listing is not None:
+            ts_delta = datetime.now() - listing[0]
+            if ts_delta.total_seconds() < CACHE_MAX_SECONDS or _immutable(path):
+                entries = listing[1]
                 logger.debug("_get_listdir %s: cached value %s", path, entries)
+                self.stats.inc('webhdfs_cache_hits_total', cache='listdir')
                 return entries
+            if self._serve_stale('listdir', path, ts_delta):
+                return listing[1]
+        entries = self._fetch_listdir(path)
+        self._reclaim_for_metadata()
+        return entries
+
+    def _fetch_listdir(self, path):
+        listing = self._listdir_cache.get(path)
+        if listing is not None and self._revalidate_listdir(path, listing):
+            self.stats.inc('webhdfs_cache_hits_total', cache='listdir_revalidated')
+            return listing[1]
+        self.stats.inc('webhdfs_cache_misses_total', cache='listdir')
+        # taken before listing, a change made meanwhile is seen by the next revalidation
+        mtime = self._get_status(path)['st_mtime'] if LISTDIR_REVALIDATE_SECONDS else None
+        listed = datetime.now()
         entries = []
         # logger.info("Listdir: %s", path)
-        for s in self.client.list_dir(path)["FileStatuses"]["FileStatus"]:
+        for s in self.client.stream_dir(path):
             sd = webhdfs.webhdfs_entry_to_dict(s)
             # logger.debug("webhdfs_entry_to_dict %s: %s --> %s", sd['name'], s, sd)
             logger.debug("Updating self._stats_cache[%s]", os.path.join(path, sd['name']))
-            self._stats_cache[path + '/' + sd['name']] = (datetime.now(), sd)
+            self._stats_cache[os.path.join(path, sd['name'])] = (datetime.now(), sd)
             entries.append(sd['name'])
-        self._listdir_cache[path] = (datetime.now(), entries)
+        # the names are also kept as a set, to tell quickly what is missing
+        self._listdir_cache[path] = (datetime.now(), entries, set(entries), mtime, listed)
         logger.debug("_get_listdir %s: new value %s", path, entries)
         return entries
 
+    def _revalidate_listdir(self, path, listing):
+        """
+        Extend an expired listing when the modification time of the directory
+        is still the one it was listed at
+
+        The mtime of a directory changes when entries are added, removed or
+        renamed, not when a file in it is appended to or has its permissions
+        changed, so the statuses of the entries are not extended: they expire
+        as usual. A listing is fetched again after LISTDIR_REVALIDATE_SECONDS
+        anyway.
+        """
+        now = datetime.now()
+        if listing[3] is None or (now - listing[4]).total_seconds() >= LISTDIR_REVALIDATE_SECONDS:
+            return False
+        try:
+            if self._fetch_status(path)['st_mtime'] != listing[3]:
+                return False
+        except pywebhdfs.errors.FileNotFound:
+            return False
+        self._listdir_cache[path] = (now,) + listing[1:]
+        return True
+
     def _get_status(self, path):
         logger.debug("_get_dir_status %s", path)
-        if path in self._stats_cache:
-            ts_delta = datetime.now() - self._stats_cache[path][0]
-            if ts_delta.total_seconds() < CACHE_MAX_SECONDS:
-                sd = self._stats_cache[path][1]
+        entry = self._stats_cache.get(path)
+        if entry is not None:
+            ts_delta = datetime.now() - entry[0]
+            if ts_delta.total_seconds() < CACHE_MAX_SECONDS or _immutable(path):
+                sd = entry[1]
                 logger.debug("_get_status: path %s --> cached status %s", path, sd)
+                self.stats.inc('webhdfs_cache_hits_total', cache='stat')
                 return sd
+            if self._serve_stale('stat', path, ts_delta):
+                return entry[1]
+        sd = self._fetch_status(path)
+        self._reclaim_for_metadata()
+        return sd
+
+    def _fetch_status(self, path):
+        self.stats.inc('webhdfs_cache_misses_total', cache='stat')
         # logger.info("get_file_dir_status: %s", path)
         s = self.client.get_file_dir_status(path)["FileStatus"]
         sd = webhdfs.webhdfs_entry_to_dict(s)
@@ -65,22 +420,276 @@ class WebHDFS(LoggingMixIn, Operations):
         self._stats_cache[path] = (datetime.now(), sd)
         return sd
 
+    def _serve_stale(self, cache, path, ts_delta):
+        """
+        Whether an expired entry can still be served, in which case it is
+        fetched again by the refresher thread unless that is already planned
+        """
+        if ts_delta.total_seconds() >= CACHE_MAX_SECONDS + STALE_GRACE_SECONDS:
+            return False
+        self.stats.inc('webhdfs_cache_hits_total', cache=cache + '_stale')
+        if (cache, path) not in self._refreshing:
+            self._refreshing.add((cache, path))
+            self._refresher.submit(self._refresh, cache, path)
+        return True
+
+    def _refresh(self, cache, path):
+        """
+        Fetch an entry served stale again, on the refresher thread
+        """
+        changes = self._changes
+        try:
+            if cache == 'listdir':
+                self._fetch_listdir(path)
+            else:
+                self._fetch_status(path)
+        except pywebhdfs.errors.FileNotFound:
+            self._flush_file_info(path)
+        except Exception as e:
+            logger.warning("Refreshing the %s of %s failed: %s", cache, path, e)
+        finally:
+            self._refreshing.discard((cache, path))
+        if self._changes != changes:
+            # what was fetched may predate a change made through the mount meanwhile
+            listing = self._listdir_cache.pop(path, None) if cache == 'listdir' else None
+            for name in listing[1] if listing is not None else ():
+                self._stats_cache.pop(os.path.join(path, name), None)
+            self._stats_cache.pop(path, None)
+
     def _flush_file_info(self, path):
-        if path in self._stats_cache:
-            del self._stats_cache[path]
-        if path in self._enoent_cache:
-            del self._enoent_cache[path]
-        dirname = os.path.dirname(path)
-        if dirname in self._listdir_cache:
-            del self._listdir_cache[dirname]
+        self._changes += 1
+        # popped, as the refresher thread may remove them too
+        self._stats_cache.pop(path, None)
+        self._xattr_cache.pop(path, None)
+        self._open_mtimes.pop(path, None)
+        self._failed_uploads.pop(path, None)
+        self._read_buffers.pop(path, None)
+        self._layouts.pop(path, None)
+        self._drop_small_file(path)
+        self._enoent_cache.pop(path, None)
+        self._created_negatives.discard(path)
+        self._listdir_cache.pop(os.path.dirname(path), None)
+
+    def _add_created(self, path):
+        """
+        Remember a path made through the mount, if NEGATIVE_PATTERNS would
+        report it missing without a listing of its directory
+        """
+        if _negative_match is not None and _negative_match(os.path.basename(path)) is not None:
+            self._created_negatives.add(path)
+
+    def _add_to_listdir(self, path):
+        """
+        Add a new file to the cached listing of its directory, instead of
+        dropping the listing
+        """
+        self._changes += 1
+        self._enoent_cache.pop(path, None)
+        dirname, name = os.path.split(path)
+        listing = self._listdir_cache.get(dirname)
+        if listing is not None and name not in listing[2]:
+            listing[1].append(name)
+            listing[2].add(name)
+
+    def _known_missing(self, path):
+        """
+        Whether path is missing from the fresh cached listing of its directory,
+        or, without such a listing, matches NEGATIVE_PATTERNS and was not made
+        through the mount
+        """
+        dirname, name = os.path.split(path)
+        if not name:
+            return False
+        listing = self._listdir_cache.get(dirname)
+        if listing is not None:
+            ts_delta = datetime.now() - listing[0]
+            if ts_delta.total_seconds() < CACHE_MAX_SECONDS or _immutable(dirname):
+                return name not in listing[2]
+        return _negative_match is not None and path not in self._created_negatives and \
+            _negative_match(name) is not None
+
+    def _pending_status(self, path, pending):
+        return dict(name=os.path.basename(path),
+                    st_mode=S_IFREG | int(pending.permission, 8),
+                    st_ctime=pending.ctime, st_mtime=pending.ctime,
+                    st_atime=pending.ctime, st_nlink=1,
+                    st_size=len(pending.data),
+                    st_uid=os.getuid(), st_gid=os.getgid(),
+                    st_blksize=1024 * 1024)
+
+    def _upload_pending(self, path, pending):
+        """
+        Create the file with its buffered content, on an uploader thread
+        once the file is closed
+        """
+        try:
+            self.client.create_file(path, file_data=bytes(pending.data),
+                                    overwrite=True, permission=pending.permission)
+            self.stats.inc('webhdfs_written_bytes_total', len(pending.data))
+        except Exception as e:
+            logger.exception("Upload of %s failed", path)
+            self.stats.inc('webhdfs_upload_errors_total')
+            pending.error = e
+            raise
+        finally:
+            if pending.error is not None:
+                # recorded before the file leaves _pending, so that no lookup misses both
+                self._failed_uploads[path] = pending
+                # the listing showed the file, which may now be missing
+                self._listdir_cache.pop(os.path.dirname(path), None)
+            if self._pending.get(path) is pending:
+                del self._pending[path]
+            self._changes += 1
+            self._stats_cache.pop(path, None)
+            self._open_mtimes.pop(path, None)
+            self._drop_small_file(path)
+
+    def _wait_pending(self, path):
+        """
+        Make sure a buffered file exists in HDFS: upload it now if it is still
+        open, or wait for its background upload; a failed upload is kept in
+        _failed_uploads, for _check_upload to report
+        """
+        pending = self._pending.get(path)
+        if pending is None:
+            return
+        try:
+            if pending.future is None:
+                self._upload_pending(path, pending)
+            else:
+                pending.future.result()
+        except Exception:
+            pass
+
+    def _check_upload(self, path):
+        """
+        Report the failed upload of a file closed earlier, once, as an I/O
+        error
+        """
+        pending = self._failed_uploads.pop(path, None)
+        if pending is not None:
+            logger.warning("Reporting the failed upload of %s: %s", path, pending.error)
+            raise FuseOSError(EIO)
+
+    def _reclaim_for_metadata(self):
+        """
+        Bring the metadata just cached within the memory budget; only from
+        the FUSE thread, which may be using the read buffers emptied and the
+        files uploaded to make room (what the refresher thread caches is
+        accounted for by the next fetch of the FUSE thread)
+        """
+        if threading.current_thread() is self._fuse_thread:
+            self.memory.reserve(0)
+
+    def _metadata_memory(self):
+        # values() is copied first, as the refresher thread may change the cache
+        listed = sum(len(listing[1]) for listing in list(self._listdir_cache.values()))
+        return (len(self._stats_cache) + len(self._xattr_cache)) * _STAT_ENTRY_BYTES + \
+            listed * _LISTED_NAME_BYTES
+
+    def _reclaim_metadata(self, nbytes):
+        """
+        Drop the statuses cached first, then the listings listed first; at
+        least an eighth of the cache, so that it is not scanned on every fetch
+        """
+        nbytes = max(nbytes, self._metadata_memory() // 8)
+        freed = 0
+        for path in list(self._stats_cache):
+            if freed >= nbytes:
+                return freed
+            if self._stats_cache.pop(path, None) is not None:
+                freed += _STAT_ENTRY_BYTES
+            if self._xattr_cache.pop(path, None) is not None:
+                freed += _STAT_ENTRY_BYTES
+        for path in list(self._listdir_cache):
+            if freed >= nbytes:
+                return freed
+            listing = self._listdir_cache.pop(path, None)
+            if listing is not None:
+                freed += len(listing[1]) * _LISTED_NAME_BYTES
+        return freed
+
+    def _read_memory(self):
+        return sum(len(buf.data) for buf in list(self._read_buffers.values())) + \
+            sum(len(layout.tail.data) for layout in list(self._layouts.values())) + \
+            self._small_bytes
+
+    def _reclaim_read(self, nbytes):
+        """
+        Drop the small files fetched first, then empty the read-ahead buffers
+        used least recently, halving their windows but still recognizing
+        sequential reads, then drop the footers
+        """
+        freed = 0
+        with self._small_lock:
+            while self._small_files and freed < nbytes:
+                size = len(self._small_files.popitem(last=False)[1][1].data)
+                self._small_bytes -= size
+                freed += size
+        for buf in list(self._read_buffers.values()):
+            if freed >= nbytes:
+                return freed
+            freed += len(buf.data)
+            buf.data = bytearray()
+            buf.length = 0
+            buf.window //= 2
+        for path in list(self._layouts):
+            if freed >= nbytes:
+                return freed
+            layout = self._layouts.pop(path, None)
+            if layout is not None:
+                freed += len(layout.tail.data)
+        return freed
+
+    def _write_memory(self):
+        return sum(len(pending.data) for pending in list(self._pending.values()))
+
+    def _reclaim_write(self, nbytes):
+        """
+        Upload the files still open for writing, the oldest first; they are
+        then appended to like files larger than WRITE_BUFFER_BYTES
+        """
+        freed = 0
+        for path, pending in list(self._pending.items()):
+            if freed >= nbytes:
+                break
+            if pending.future is None:
+                try:
+                    self._upload_pending(path, pending)
+                except Exception:
+                    # logged, and the next write of the file fails as the file is missing
+                    pass
+                freed += len(pending.data)
+        return freed
+
+    def _get_stats_file_status(self):
+        self._stats_file = self.stats.render().encode('utf8')
+        now = time.time()
+        return dict(st_mode=S_IFREG | 0o444, st_nlink=1,
+                    st_size=len(self._stats_file),
+                    st_ctime=now, st_mtime=now, st_atime=now,
+                    st_uid=os.getuid(), st_gid=os.getgid())
 
     def getattr(self, path, fh=None):
+        if path == STATS_FILE:
+            return self._get_stats_file_status()
+        self._check_upload(path)
+        pending = self._pending.get(path)
+        if pending is not None:
+            return self._pending_status(path, pending)
+        trace = self._caller_trace()
+        if trace is not None:
+            trace.stat(path)
         if path in self._enoent_cache:
             ts_delta = datetime.now() - self._enoent_cache[path]
-            if ts_delta.total_seconds() < CACHE_MAX_SECONDS:
+            if ts_delta.total_seconds() < CACHE_MAX_SECONDS or _immutable(path):
+                self.stats.inc('webhdfs_cache_hits_total', cache='enoent')
                 raise FuseOSError(ENOENT)
             else:
                 del self._enoent_cache[path]
+        if path not in self._stats_cache and self._known_missing(path):
+            self.stats.inc('webhdfs_cache_hits_total', cache='listdir_enoent')
+            raise FuseOSError(ENOENT)
         try:
             st = self._get_status(path)
             return st
@@ -89,33 +698,281 @@ class WebHDFS(LoggingMixIn, Operations):
             raise FuseOSError(ENOENT)
 
     def readdir(self, path, fh):
-        return [u'.', u'..'] + self._get_listdir(path)
+        trace = self._caller_trace()
+        if trace is not None:
+            trace.listdir(path)
+        entries = self._get_listdir(path)
+        pending = [os.path.basename(p) for p in list(self._pending)
+                   if os.path.dirname(p) == path]
+        return [u'.', u'..'] + entries + [name for name in pending if name not in entries]
+
+    def open(self, path, fi):
+        """
+        Let the kernel keep the cached pages of a file unchanged since the last open
+        """
+        self._check_upload(path)
+        if path == STATS_FILE:
+            fi.direct_io = 1
+        elif path in self._pending:
+            pass
+        elif KERNEL_CACHE == 'always' or _immutable(path):
+            fi.keep_cache = 1
+        elif KERNEL_CACHE == 'auto':
+            mtime = self._get_status(path)['st_mtime']
+            fi.keep_cache = int(self._open_mtimes.get(path) == mtime)
+            self._open_mtimes[path] = mtime
+        small = self._small_files.get(path)
+        if small is not None and not _immutable(path) and \
+                small[0] != self._get_status(path)['st_mtime']:
+            self._drop_small_file(path)
+        return 0
 
     def read(self, path, size, offset, fh):
-        logger.info("read: path %s size %d offset %d", path, size, offset)
-        if offset >= self._get_status(path)['st_size']:
+        logger.debug("read: path %s size %d offset %d", path, size, offset)
+        if path == STATS_FILE:
+            if offset == 0:
+                self._stats_file = self.stats.render().encode('utf8')
+            return self._stats_file[offset:offset + size]
+        pending = self._pending.get(path)
+        if pending is not None:
+            return bytes(pending.data[offset:offset + size])
+        # a small file cached is served without looking its status up, as open checked it
+        small = self._get_small_file(path)
+        if small is not None:
+            self.stats.inc('webhdfs_cache_hits_total', cache='small_file')
+            file_size = small.length
+        else:
+            st = self._get_status(path)
+            file_size = st['st_size']
+            if offset < file_size <= SMALL_FILE_BYTES:
+                small = self._fetch_small_file(path, st)
+        if offset == 0 and small is not None and self._prefetcher is not None:
+            self._prefetch_siblings(path)
+        trace = self._caller_trace()
+        if trace is not None and offset < file_size:
+            trace.read(path, offset, min(size, file_size - offset))
+        if offset >= file_size:
             data = b''
+        elif small is not None:
+            data = small.slice(offset, size)
+        elif path.endswith(COLUMNAR_SUFFIXES):
+            data = self._read_columnar(path, size, offset, file_size)
         else:
-            data = self.client.read_file(path, length=size, offset=offset)[:size]
-        logger.info("read: path %s result size %d", path, len(data))
+            data = self._read_ahead(path, size, offset, file_size)
+        logger.debug("read: path %s result size %d", path, len(data))
+        self.stats.inc('webhdfs_read_bytes_total', len(data))
+        return data
+
+    def _get_small_file(self, path):
+        """
+        Return the ReadBuffer of a cached small file, waiting for its
+        prefetch if it is under way, or None
+        """
+        entry = self._small_files.get(path)
+        if entry is None:
+            future = self._small_fetches.get(path)
+            if future is None:
+                return None
+            try:
+                future.result()
+            except Exception:
+                pass
+            entry = self._small_files.get(path)
+        return entry[1] if entry is not None else None
+
+    def _fetch_small_file(self, path, st):
+        """
+        Fetch a small file whole with one request, and cache it if it fits in
+        the memory budget; return its ReadBuffer, or None if it does not fit
+        """
+        if not self.memory.reserve(st['st_size'], 'read'):
+            return None
+        self.stats.inc('webhdfs_cache_misses_total', cache='small_file')
+        buf = ReadBuffer()
+        buf.fill(self.client, path, 0, st['st_size'])
+        self._cache_small_file(path, st['st_mtime'], buf)
+        return buf
+
+    def _prefetch_small_file(self, path, st, changes):
+        """
+        Fetch a small file ahead of its reads, on a prefetcher thread
+        """
+        try:
+            buf = ReadBuffer()
+            buf.fill(self.client, path, 0, st['st_size'])
+            # what was fetched may predate a change made through the mount meanwhile
+            if self._changes == changes:
+                self._cache_small_file(path, st['st_mtime'], buf)
+        except Exception as e:
+            logger.debug("Prefetching %s failed: %s", path, e)
+
+    def _prefetch_siblings(self, path):
+        """
+        Prefetch the small files following path in the cached listing of its
+        directory, known from the statuses the listing cached
+        """
+        dirname, name = os.path.split(path)
+        listing = self._listdir_cache.get(dirname)
+        if listing is None:
+            return
+        entries = listing[1]
+        position = self._prefetch_position[1]
+        if self._prefetch_position[0] != dirname or position >= len(entries) or \
+                entries[position] != name:
+            try:
+                position = entries.index(name)
+            except ValueError:
+                return
+        self._prefetch_position = (dirname, position + 1)
+        for sibling in entries[position + 1:position + 1 + SMALL_FILE_PREFETCH]:
+            key = os.path.join(dirname, sibling)
+            entry = self._stats_cache.get(key)
+            if key in self._small_files or key in self._small_fetches or entry is None:
+                continue
+            st = entry[1]
+            if not S_ISREG(st['st_mode']) or not 0 < st['st_size'] <= SMALL_FILE_BYTES:
+                continue
+            if not self.memory.fits(st['st_size']):
+                break
+            future = self._small_fetches[key] = self._prefetcher.submit(
+                self._prefetch_small_file, key, st, self._changes)
+            # called once registered, even if the prefetch is already done
+            future.add_done_callback(lambda future, key=key: self._small_fetches.pop(key, None))
+
+    def _cache_small_file(self, path, mtime, buf):
+        with self._small_lock:
+            old = self._small_files.pop(path, None)
+            if old is not None:
+                self._small_bytes -= len(old[1].data)
+            self._small_files[path] = (mtime, buf)
+            self._small_bytes += len(buf.data)
+            while self._small_bytes > SMALL_FILE_CACHE_BYTES:
+                self._small_bytes -= len(self._small_files.popitem(last=False)[1][1].data)
+
+    def _drop_small_file(self, path):
+        with self._small_lock:
+            entry = self._small_files.pop(path, None)
+            if entry is not None:
+                self._small_bytes -= len(entry[1].data)
+
+    def _read_columnar(self, path, size, offset, file_size):
+        """
+        Serve a read of a Parquet or ORC file: the first read of its tail
+        fetches the footer, and the first read in a column chunk the whole
+        chunk, or what follows the read in larger chunks
+        """
+        layout = self._layouts.get(path)
+        if layout is None and offset >= file_size - FOOTER_PREFETCH_BYTES:
+            layout = self._load_layout(path, file_size)
+            if layout is not None:
+                self._layouts[path] = layout
+        if layout is None:
+            return self._read_ahead(path, size, offset, file_size)
+        if layout.tail.covers(offset, min(offset + size, file_size)):
+            self.stats.inc('webhdfs_cache_hits_total', cache='footer')
+            return layout.tail.slice(offset, size)
+        return self._read_ahead(path, size, offset, file_size,
+                                span=layout.span(offset))
+
+    def _load_layout(self, path, file_size):
+        """
+        Fetch the tail of a file and the column chunk ranges of its footer;
+        return None if the tail does not fit in the memory budget, and no
+        ranges if the whole footer does not
+        """
+        tail = ReadBuffer()
+        start = max(0, file_size - FOOTER_PREFETCH_BYTES)
+        if not self.memory.reserve(file_size - start, 'read'):
+            return None
+        tail.fill(self.client, path, start, file_size - start)
+        needed = webhdfs_columnar.footer_length(memoryview(tail.data)[:tail.length])
+        if needed is None:
+            return ColumnLayout(tail, [])
+        if tail.length < needed <= file_size:
+            if not self.memory.reserve(needed - len(tail.data), 'read'):
+                return ColumnLayout(tail, [])
+            tail.fill(self.client, path, file_size - needed, needed)
+        ranges = webhdfs_columnar.column_ranges(memoryview(tail.data)[:tail.length])
+        logger.debug("read: path %s has %d column chunks", path, len(ranges))
+        return ColumnLayout(tail, webhdfs_columnar.coalesce(ranges, max_size=COLUMNAR_COALESCE_BYTES))
+
+    def _read_ahead(self, path, size, offset, file_size, span=None):
+        """
+        Serve a read from the buffer of the file, refilled with a window
+        growing as long as the reads are sequential, or with the (start, end)
+        span of the file the read belongs to
+        """
+        buf = self._read_buffers.get(path)
+        if buf is None:
+            buf = self._read_buffers[path] = ReadBuffer()
+        if not buf.covers(offset, min(offset + size, file_size)):
+            if offset == buf.end:
+                buf.window = min(max(2 * buf.window, size), READ_AHEAD_BYTES)
+            else:
+                buf.window = 0
+            start, end = offset, offset + max(size, buf.window)
+            if span is not None and span[1] - span[0] <= READ_AHEAD_BYTES:
+                start, end = span[0], max(end, span[1])
+            elif span is not None:
+                end = max(end, min(span[1], offset + READ_AHEAD_BYTES))
+            end = min(end, file_size)
+            # moved to the end of the buffers, which are reclaimed from the start
+            self._read_buffers.pop(path, None)
+            if end - start > len(buf.data) and \
+                    not self.memory.reserve(end - start - len(buf.data), 'read'):
+                # out of memory budget: read ahead only as far as the buffer allows
+                buf.window = 0
+                start, end = offset, min(offset + max(size, len(buf.data)), file_size)
+            self._read_buffers[path] = buf
+            buf.fill(self.client, path, start, end - start)
+        data = buf.slice(offset, size)
+        buf.end = offset + len(data)
         return data
 
     def mkdir(self, path, mode):
         logger.info("mkdir %s", path)
         self.client.make_dir(path, permission=oct(mode & 0o777).replace('0o', ''))
         self._flush_file_info(path)
+        self._add_created(path)
         return 0
 
-    def create(self, path, mode=int('755', 8)):
+    def create(self, path, mode=int('755', 8), fi=None):
         perm = oct(int(mode) & 0o777).replace('0o', '')
         logger.info("Create %s perm %s", path, perm)
+        self._wait_pending(path)
+        # the file replaces the one whose upload failed
+        self._failed_uploads.pop(path, None)
+        if WRITE_BUFFER_BYTES:
+            # nothing is sent before the file is closed, or grows too large
+            self._pending[path] = PendingFile(perm)
+            self._stats_cache.pop(path, None)
+            self._drop_small_file(path)
+            self._add_to_listdir(path)
+            self._add_created(path)
+            return 0
         self.client.create_file(path, file_data=None, overwrite=True, permission=perm)
         self._flush_file_info(path)
+        self._add_created(path)
         return 0
 
     def write(self, path, data, offset, fh):
+        pending = self._pending.get(path)
+        if pending is not None:
+            growth = offset + len(data) - len(pending.data)
+            # reserving may upload the file early, when it no longer fits in the budget
+            if pending.future is None and offset + len(data) <= WRITE_BUFFER_BYTES and \
+                    (growth <= 0 or self.memory.reserve(growth, 'write')) and \
+                    self._pending.get(path) is pending:
+                if offset > len(pending.data):
+                    pending.data.extend(bytes(offset - len(pending.data)))
+                pending.data[offset:offset + len(data)] = data
+                return len(data)
+            # too large to buffer, out of memory budget, or reopened while being uploaded
+            self._wait_pending(path)
+        # uploaded early to make room, or just now, and failed
+        self._check_upload(path)
         st = self._get_status(path)
-        logger.info("Writing to %s size %d at offset %d (file size %d)", path, len(data), offset, st['st_size'])
+        logger.debug("Writing to %s size %d at offset %d (file size %d)", path, len(data), offset, st['st_size'])
         if offset + len(data) < st['st_size']:
             logger.warning("Can't write in the middle of the file %s. "
                            "Tried to write %d bytes at offset %d < file size %d",
@@ -129,15 +986,130 @@ class WebHDFS(LoggingMixIn, Operations):
         #             path, len(data_sub), st['st_size'], st['st_size']+len(data_sub))
         self.client.append_file(path, file_data=data_sub, overwrite=True)
         self._flush_file_info(path)
+        self.stats.inc('webhdfs_written_bytes_total', len(data))
         return len(data)
 
+    def truncate(self, path, length, fh=None):
+        pending = self._pending.get(path)
+        if pending is None or pending.future is not None or length > WRITE_BUFFER_BYTES:
+            return super(WebHDFS, self).truncate(path, length, fh)
+        if length > len(pending.data):
+            pending.data.extend(bytes(length - len(pending.data)))
+        del pending.data[length:]
+        return 0
+
+    def fsync(self, path, datasync, fh):
+        self._wait_pending(path)
+        self._check_upload(path)
+        return 0
+
+    def release(self, path, fh):
+        self._read_buffers.pop(path, None)
+        self._layouts.pop(path, None)
+        trace = self._caller_trace()
+        if trace is not None:
+            trace.release(path)
+        pending = self._pending.get(path)
+        if pending is not None and pending.future is None:
+            pending.future = self._uploader.submit(self._upload_pending, path, pending)
+        return 0
+
     def unlink(self, path):
         logger.info("Unlink %s", path)
+        self._wait_pending(path)
         self.client.delete_file_dir(path)
         self._flush_file_info(path)
         return 0
 
     def destroy(self, path):
+        for pending_path in list(self._pending):
+            self._wait_pending(pending_path)
+        self._uploader.shutdown(wait=True)
+        self._refresher.shutdown(wait=False)
+        if self._prefetcher is not None:
+            self._prefetcher.shutdown(wait=False)
+        if self._trace is not None:
+            self._trace.close()
+        if self.client.delegation_token is not None:
+            try:
+                self.client.cancel_delegation_token(self.client.delegation_token)
+            except pywebhdfs.errors.PyWebHdfsException as e:
+                logger.warning("Could not cancel the delegation token: %s", e)
+        return 0
+
+    def _get_xattrs(self, path):
+        """
+        Return the {name: value} extended attributes of a file, empty ones
+        being cached as well, as are the refusals of HDFS to list them
+        """
+        entry = self._xattr_cache.get(path)
+        if entry is not None:
+            ts_delta = datetime.now() - entry[0]
+            if ts_delta.total_seconds() < CACHE_MAX_SECONDS or _immutable(path):
+                self.stats.inc('webhdfs_cache_hits_total', cache='xattr')
+                if entry[2] is not None:
+                    raise FuseOSError(entry[2])
+                return entry[1]
+        self.stats.inc('webhdfs_cache_misses_total', cache='xattr')
+        try:
+            response = self.client.get_xattr(path, encoding='base64')
+        except pywebhdfs.errors.FileNotFound:
+            raise FuseOSError(ENOENT)
+        except (pywebhdfs.errors.ActiveHostNotFound, pywebhdfs.errors.CorrespondHostsNotFound):
+            raise
+        except pywebhdfs.errors.PyWebHdfsException as e:
+            # xattrs disabled on the NameNode, or forbidden: asked again only
+            # once expired, like a file without any
+            errno = _xattr_errno(e)
+            logger.debug("getxattr: %s: %s", path, e)
+            self._xattr_cache[path] = (datetime.now(), {}, errno)
+            raise FuseOSError(errno)
+        xattrs = {}
+        for xattr in response['XAttrs']:
+            value = xattr.get('value') or ''
+            xattrs[xattr['name']] = base64.b64decode(value[2:]) if value[:2] in ('0s', '0S') \
+                else value.encode('utf8')
+        self._xattr_cache[path] = (datetime.now(), xattrs, None)
+        return xattrs
+
+    def getxattr(self, path, name, position=0):
+        if not XATTRS:
+            raise FuseOSError(ENOTSUP)
+        if not name.startswith(_HDFS_XATTR_PREFIXES) or path == STATS_FILE or \
+                path in self._pending:
+            raise FuseOSError(ENODATA)
+        value = self._get_xattrs(path).get(name)
+        if value is None:
+            raise FuseOSError(ENODATA)
+        return value
+
+    def listxattr(self, path):
+        if not XATTRS or path == STATS_FILE or path in self._pending:
+            return []
+        return list(self._get_xattrs(path))
+
+    def setxattr(self, path, name, value, options, position=0):
+        if not XATTRS or not name.startswith(_HDFS_XATTR_PREFIXES):
+            raise FuseOSError(ENOTSUP)
+        self._wait_pending(path)
+        exists = name in self._get_xattrs(path)
+        if options & XATTR_CREATE and exists:
+            raise FuseOSError(EEXIST)
+        if options & XATTR_REPLACE and not exists:
+            raise FuseOSError(ENODATA)
+        self.client.set_xattr(path, name, '0s' + base64.b64encode(value).decode('ascii'),
+                              replace=exists)
+        self._xattr_cache.pop(path, None)
+        return 0
+
+    def removexattr(self, path, name):
+        if not XATTRS:
+            raise FuseOSError(ENOTSUP)
+        self._wait_pending(path)
+        if name not in self._get_xattrs(path):
+            raise FuseOSError(ENODATA)
+        self.client.delete_xattr(path, name)
+        self._xattr_cache.pop(path, None)
         return 0
 
     def chmod(self, path, mode):
@@ -170,11 +1142,14 @@ class WebHDFS(LoggingMixIn, Operations):
         hdfs_path_old = old # [len(mountpoint):]
         hdfs_path_new = os.path.join(os.path.dirname(hdfs_path_old), new)
         logger.info("Rename '%s' --> '%s'", hdfs_path_old, hdfs_path_new)
+        self._wait_pending(old)
+        self._wait_pending(new)
         res = self.client.rename_file_dir(hdfs_path_old, hdfs_path_new)
         if res.get('boolean', None):
             logger.info("Rename success")
             self._flush_file_info(old)
             self._flush_file_info(new)
+            self._add_created(new)
             return 0
         raise FuseOSError(ENOSPC)
 
@@ -207,4 +1182,7 @@ if __name__ == '__main__':
 
     print("Mounting {} at {}".format(webhdfs.cfg['DEFAULT']['HDFS_BASEURL'], sys.argv[1]))
     mountpoint = sys.argv[1]
-    fuse = FUSE(operations=WebHDFS(), mountpoint=sys.argv[1], foreground=True, nothreads=True, big_writes=True, max_read=1024*1024, max_write=1024*1024)
+    fuse = FUSE(operations=WebHDFS(), mountpoint=sys.argv[1], foreground=True, nothreads=True, raw_fi=True,
+                big_writes=True, max_read=1024*1024, max_write=1024*1024,
+                entry_timeout=ENTRY_TIMEOUT, attr_timeout=ATTR_TIMEOUT, negative_timeout=NEGATIVE_TIMEOUT,
+                ro=READ_ONLY)
@@ -0,0 +1,70 @@
+"""
+HTTP authentication reusing the session cookie of a Knox gateway or of the
+Hadoop authentication filter
+"""
+from requests.auth import HTTPBasicAuth
+from requests.cookies import extract_cookies_to_jar
+
+# cookies proving an authenticated session
+AUTH_COOKIES = ('hadoop.auth', 'KNOXSESSIONID', 'JSESSIONID')
+
+
+class SessionCookieAuth(HTTPBasicAuth):
+    """
+    HTTP Basic authentication sent only when there is no session cookie
+
+    Knox (and the Hadoop authentication filter) answer a successful login
+    with a session cookie, which requests keeps in the cookie jar of the
+    session. Sending the Basic credentials as well would make Knox check
+    them against its directory server again on every request, so they are
+    left out while a session cookie is sent. When the session has expired
+    and the server answers 401, the request is sent once more with the
+    credentials, and the new session cookie is stored.
+
+    Requests whose body is an iterator cannot be sent twice, they always
+    carry the credentials.
+
+    >>> hdfs = PyWebHdfsClient(base_uri_pattern=...,
+    >>>     request_extra_opts={'auth': SessionCookieAuth('user', 'password')})
+    """
+
+    def __init__(self, username, password, cookie_names=AUTH_COOKIES):
+        super(SessionCookieAuth, self).__init__(username, password)
+        self.cookie_names = tuple(cookie_names)
+
+    def __call__(self, r):
+        if not self._has_session_cookie(r) or not _resendable(r.body):
+            return super(SessionCookieAuth, self).__call__(r)
+        r.register_hook('response', self.handle_401)
+        return r
+
+    def handle_401(self, r, **kwargs):
+        """
+        Send the request again with the credentials if the session cookie
+        was refused
+        """
+        if r.status_code != 401 or 'Authorization' in r.request.headers:
+            return r
+        # release the connection to reuse it for the new request
+        r.content
+        r.close()
+        prep = r.request.copy()
+        prep.headers.pop('Cookie', None)
+        extract_cookies_to_jar(prep._cookies, r.request, r.raw)
+        prep.prepare_cookies(prep._cookies)
+        super(SessionCookieAuth, self).__call__(prep)
+        _r = r.connection.send(prep, **kwargs)
+        _r.history.append(r)
+        _r.request = prep
+        return _r
+
+    def _has_session_cookie(self, r):
+        for cookie in r.headers.get('Cookie', '').split(';'):
+            name, _, value = cookie.strip().partition('=')
+            if name in self.cookie_names and value.strip('"'):
+                return True
+        return False
+
+
+def _resendable(body):
+    return body is None or isinstance(body, (bytes, str, bytearray))
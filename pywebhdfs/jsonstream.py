@@ -0,0 +1,88 @@
+"""
+JSON decoding of WebHDFS responses
+
+loads uses orjson or ujson when one of them is installed, and the json
+module otherwise. iter_array decodes the items of a JSON array while the
+document is still being received, so that a LISTSTATUS of a large directory
+never has to be held in memory as a whole, neither as text nor as objects.
+"""
+import codecs
+import json
+import re
+
+try:
+    import orjson as _backend
+    BACKEND = 'orjson'
+except ImportError:
+    try:
+        import ujson as _backend
+        BACKEND = 'ujson'
+    except ImportError:
+        _backend = json
+        BACKEND = 'json'
+
+# text kept in front of the next item is dropped once it is this long
+_COMPACT_SIZE = 64 * 1024
+_SKIP = re.compile(r'[ \t\r\n,]*').match
+
+
+def loads(data):
+    """
+    Decode a JSON document given as bytes or str
+    """
+    return _backend.loads(data)
+
+
+def iter_array(chunks, key):
+    """
+    Yield the items of the array value of key in the JSON document made of
+    the byte chunks, each one as soon as it has been received
+
+    The items must be objects or arrays, like the FileStatus objects of a
+    LISTSTATUS response:
+
+    >>> for status in iter_array(response.iter_content(65536), 'FileStatus'):
+    >>>     print(status['pathSuffix'])
+    """
+    chunks = iter(chunks)
+    decode = codecs.getincrementaldecoder('utf-8')().decode
+    scan = json.JSONDecoder().raw_decode
+    start = re.compile(r'"{}"\s*:\s*\['.format(re.escape(key)))
+    text, pos, eof = '', 0, False
+
+    def more():
+        for chunk in chunks:
+            if chunk:
+                return decode(chunk), False
+        return decode(b'', True), True
+
+    match = None
+    while match is None:
+        match = start.search(text)
+        if match is None:
+            if eof:
+                raise ValueError('No "{}" array in the JSON document'.format(key))
+            data, eof = more()
+            text += data
+    pos = match.end()
+
+    while True:
+        pos = _SKIP(text, pos).end()
+        if pos < len(text):
+            if text[pos] == ']':
+                return
+            try:
+                item, pos = scan(text, pos)
+            except ValueError:
+                # the item is incomplete, unless the document ended
+                if eof:
+                    raise
+            else:
+                yield item
+                if pos > _COMPACT_SIZE:
+                    text, pos = text[pos:], 0
+                continue
+        elif eof:
+            raise ValueError('Unterminated "{}" array'.format(key))
+        data, eof = more()
+        text, pos = text[pos:] + data, 0
@@ -1,5 +1,6 @@
 CREATE = 'CREATE'
 APPEND = 'APPEND'
+CONCAT = 'CONCAT'
 OPEN = 'OPEN'
 MKDIRS = 'MKDIRS'
 RENAME = 'RENAME'
@@ -14,3 +15,6 @@ REMOVEXATTR = 'REMOVEXATTR'
 SETXATTR = 'SETXATTR'
 SETPERMISSION = 'SETPERMISSION'
 SETOWNER = 'SETOWNER'
+GETDELEGATIONTOKEN = 'GETDELEGATIONTOKEN'
+RENEWDELEGATIONTOKEN = 'RENEWDELEGATIONTOKEN'
+CANCELDELEGATIONTOKEN = 'CANCELDELEGATIONTOKEN'
@@ -0,0 +1,152 @@
+"""
+Scheduling of the requests of PyWebHdfsClient
+
+Requests are split into two kinds: data requests (OPEN, CREATE, APPEND),
+which can keep a connection busy for seconds, and metadata requests
+(everything else, e.g. GETFILESTATUS or LISTSTATUS), which should answer an
+interactive ls or stat right away. A RequestScheduler limits how many
+requests run at once, in all and of each kind, and hands the slots freed to
+the waiting kinds in proportion to their weights, so that a bulk copy does
+not starve metadata requests of connections. It also caps the rate of the
+requests sent to the NameNode (or Knox gateway).
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from pywebhdfs import operations
+
+METADATA = 'metadata'
+DATA = 'data'
+
+_DATA_OPERATIONS = frozenset((operations.OPEN, operations.CREATE,
+                              operations.APPEND))
+
+
+def request_kind(operation):
+    """
+    Return DATA or METADATA for a WebHDFS operation
+    """
+    return DATA if operation in _DATA_OPERATIONS else METADATA
+
+
+class RequestScheduler(object):
+    """
+    Weighted fair sharing of request slots, and NameNode rate limiting
+
+    :param slots: requests running at once in all (0: no limit)
+    :param limits: {kind: requests of this kind running at once (0: no
+      limit)}
+    :param weights: {kind: share of the slots when both kinds wait}
+    :param namenode_qps: requests sent to the NameNode per second (0: no
+      limit), in bursts of up to namenode_burst
+
+    >>> scheduler = RequestScheduler(slots=16, limits={DATA: 12},
+    >>>                              weights={METADATA: 4, DATA: 1},
+    >>>                              namenode_qps=200)
+    >>> hdfs = PyWebHdfsClient(host='host', port='50070', scheduler=scheduler)
+    """
+
+    def __init__(self, slots=0, limits=None, weights=None, namenode_qps=0,
+                 namenode_burst=None):
+        self.slots = slots
+        self.limits = dict(limits or {})
+        self.weights = {METADATA: 1, DATA: 1}
+        self.weights.update(weights or {})
+        self.namenode_qps = namenode_qps
+        self.namenode_burst = namenode_burst or max(1, int(namenode_qps))
+        self._cond = threading.Condition()
+        self._queues = {METADATA: deque(), DATA: deque()}
+        self._running = {METADATA: 0, DATA: 0}
+        # virtual time of the next slot of each kind, advanced by 1 / weight
+        # per slot: the waiting kind with the lowest one goes first
+        self._tags = {METADATA: 0.0, DATA: 0.0}
+        self._clock = 0.0
+        # {thread ident: kind of the slot the thread holds}
+        self._holders = {}
+        self._rate_lock = threading.Lock()
+        self._next_request = 0.0
+
+    @contextmanager
+    def slot(self, operation):
+        """
+        Hold a slot for a request of operation, waiting for one if needed
+
+        A thread already holding a slot, e.g. for the NameNode step of a
+        request whose DataNode step follows, does not take another one. This
+        includes a thread that suspended a generator holding a slot, such as
+        PyWebHdfsClient.stream_file: its other requests run under that slot
+        until the generator is exhausted or closed, e.g. the CREATE of
+        copy_file, which would otherwise wait for a second slot. A generator
+        closed by another thread releases the slot of the thread that took
+        it.
+        """
+        ident = threading.get_ident()
+        if ident in self._holders:
+            yield
+            return
+        kind = request_kind(operation)
+        self._acquire(kind)
+        self._holders[ident] = kind
+        try:
+            yield
+        finally:
+            del self._holders[ident]
+            self._release(kind)
+
+    def throttle_namenode(self):
+        """
+        Wait until a request can be sent to the NameNode within namenode_qps
+        """
+        if not self.namenode_qps:
+            return
+        interval = 1.0 / self.namenode_qps
+        with self._rate_lock:
+            now = time.monotonic()
+            # unused time is saved up for a burst of namenode_burst requests
+            self._next_request = max(self._next_request,
+                                     now - (self.namenode_burst - 1) * interval)
+            wait = self._next_request - now
+            self._next_request += interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def waiting(self, kind):
+        return len(self._queues[kind])
+
+    def running(self, kind):
+        return self._running[kind]
+
+    def _acquire(self, kind):
+        ticket = object()
+        with self._cond:
+            queue = self._queues[kind]
+            if not queue:
+                # an idle kind does not save up slots for later
+                self._tags[kind] = max(self._tags[kind], self._clock)
+            queue.append(ticket)
+            while self._next_ticket() is not ticket:
+                self._cond.wait()
+            queue.popleft()
+            self._running[kind] += 1
+            self._clock = self._tags[kind]
+            self._tags[kind] += 1.0 / self.weights[kind]
+            # the next ticket may be startable as well
+            self._cond.notify_all()
+
+    def _release(self, kind):
+        with self._cond:
+            self._running[kind] -= 1
+            self._cond.notify_all()
+
+    def _next_ticket(self):
+        if self.slots and sum(self._running.values()) >= self.slots:
+            return None
+        best = None
+        for kind, queue in self._queues.items():
+            if not queue or self._running[kind] >= (self.limits.get(kind) or float('inf')):
+                continue
+            if best is None or self._tags[kind] < self._tags[best]:
+                best = kind
+        return self._queues[best][0] if best is not None else None
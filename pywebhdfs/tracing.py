@@ -0,0 +1,207 @@
+"""
+Request tracing for PyWebHdfsClient
+
+Every WebHDFS request is reported to the request_hooks of the client as a
+dict (a "trace") with the following keys:
+
+  operation       WebHDFS operation, e.g. OPEN or LISTSTATUS
+  path            HDFS path of the request
+  host            host the request was sent to
+  phase           'namenode' for the request sent to the configured host,
+                  'datanode' for the second step of CREATE and APPEND
+  status          HTTP status code, or 'error' if no response was received
+  redirect        Location the request was (or would have been) redirected to
+  bytes_sent      request body size, None when streamed from an iterator
+  bytes_received  response body size, None when the body was not read, e.g.
+                  that of a standby NameNode answering a streamed request
+  elapsed         total seconds spent in the request
+  timings         dict splitting elapsed into seconds spent in
+                    dns, connect, tls  setting up new connections, when
+                                       the client times them (see
+                                       time_connections), 0 otherwise
+                    redirect           responses that were redirected,
+                                       e.g. the NameNode step of OPEN
+                    ttfb               until the headers of the final
+                                       response arrived
+                    transfer           reading the final response body;
+                                       a streamed body is traced once read
+                                       or closed, including the time the
+                                       caller took between chunks
+
+Connection setup happens before the first byte of its response, so dns,
+connect and tls are included in redirect or ttfb.
+"""
+import json
+import random
+import socket
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import HTTPError
+
+_connection_timings = threading.local()
+
+
+def reset_connection_timings():
+    """
+    Start recording the setup of new connections made by this thread
+    """
+    _connection_timings.value = dict(dns=0.0, connect=0.0, tls=0.0)
+
+
+def get_connection_timings():
+    """
+    Return the dns, connect and tls seconds recorded since the last reset
+    """
+    return dict(getattr(_connection_timings, 'value', None) or
+                dict(dns=0.0, connect=0.0, tls=0.0))
+
+
+def _record(name, seconds):
+    timings = getattr(_connection_timings, 'value', None)
+    if timings is not None:
+        timings[name] += seconds
+
+
+class _TimedConnectionMixin(object):
+    """
+    Times name resolution and the TCP connection separately: addresses are
+    resolved first and then tried in order, like urllib3 itself does
+    """
+
+    def _new_conn(self):
+        start = time.time()
+        try:
+            addresses = socket.getaddrinfo(self._dns_host, self.port, 0,
+                                           socket.SOCK_STREAM)
+        except socket.gaierror:
+            addresses = []
+        _record('dns', time.time() - start)
+        if not addresses:
+            return super(_TimedConnectionMixin, self)._new_conn()
+
+        dns_host = self._dns_host
+        start = time.time()
+        try:
+            for i, address in enumerate(addresses):
+                self._dns_host = address[4][0]
+                try:
+                    return super(_TimedConnectionMixin, self)._new_conn()
+                except (OSError, HTTPError):
+                    if i == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = dns_host
+            _record('connect', time.time() - start)
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+
+    def connect(self):
+        start = time.time()
+        before = get_connection_timings()
+        super(_TimedHTTPSConnection, self).connect()
+        after = get_connection_timings()
+        setup = (after['dns'] - before['dns'] +
+                 after['connect'] - before['connect'])
+        _record('tls', max(0.0, time.time() - start - setup))
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimingAdapter(HTTPAdapter):
+    """
+    requests transport adapter recording the DNS, TCP connect and TLS
+    handshake time of every new connection
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(TimingAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+def make_trace(operation, path, host, phase, start, response=None,
+               data=None, bytes_received=None, connections=None):
+    """
+    Build the trace of a request started at start, see the module doc;
+    connections are the dns, connect and tls timings, by default those
+    recorded by this thread since the last reset
+    """
+    elapsed = time.time() - start
+    timings = dict(connections or get_connection_timings())
+    timings.update(redirect=0.0, ttfb=0.0, transfer=0.0)
+    status = 'error'
+    redirect = None
+    if response is not None:
+        status = response.status_code
+        timings['redirect'] = sum((r.elapsed.total_seconds()
+                                   for r in response.history), 0.0)
+        timings['ttfb'] = response.elapsed.total_seconds()
+        if response.history:
+            redirect = response.history[0].headers.get('location')
+        elif response.is_redirect:
+            redirect = response.headers.get('location')
+        if bytes_received is not None:
+            timings['transfer'] = max(
+                0.0, elapsed - timings['redirect'] - timings['ttfb'])
+    bytes_sent = None
+    if data is None:
+        bytes_sent = 0
+    elif isinstance(data, (bytes, bytearray, memoryview)):
+        bytes_sent = len(data)
+    return dict(operation=operation, path=path, host=host, phase=phase,
+                status=status, redirect=redirect, bytes_sent=bytes_sent,
+                bytes_received=bytes_received, elapsed=elapsed,
+                timings=timings)
+
+
+class JsonLinesSampler(object):
+    """
+    Request hook writing a sample of the traces to a file, one JSON object
+    per line
+
+    :param path: file the traces are appended to
+    :param rate: fraction of the requests written (def: all of them)
+    :param slow: requests taking at least this many seconds, and failed
+      requests (no response, or a status of 400 or more), are always
+      written
+
+    >>> client.request_hooks.append(
+    >>>     JsonLinesSampler('/tmp/webhdfs-trace.jsonl', rate=0.01, slow=1))
+    """
+
+    def __init__(self, path, rate=1.0, slow=None):
+        self.rate = rate
+        self.slow = slow
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', buffering=1)
+
+    def __call__(self, trace):
+        status = trace['status']
+        failed = status == 'error' or (isinstance(status, int) and status >= 400)
+        if not (random.random() < self.rate or failed or
+                (self.slow is not None and trace['elapsed'] >= self.slow)):
+            return
+        line = json.dumps(dict(trace, time=time.time()), sort_keys=True)
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def close(self):
+        with self._lock:
+            self._file.close()
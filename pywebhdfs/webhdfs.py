@@ -1,13 +1,39 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain
 from six.moves import http_client
+import os
+import posixpath
 import re
+import stat
+import threading
+import time
+import uuid
 
 import requests
+import urllib3
+from requests.adapters import HTTPAdapter
 try:
     from urllib.parse import quote, quote_plus
 except ImportError:
     from urllib import quote, quote_plus
 
-from pywebhdfs import errors, operations
+from pywebhdfs import errors, jsonstream, operations, tracing
+
+# number of path -> hosts federation decisions remembered by each client
+FEDERATION_CACHE_SIZE = 4096
+# lifetime assumed for a delegation token whose expiry cannot be read
+DELEGATION_TOKEN_SECONDS = 3600
+# size of the parts of create_file_multipart, the HDFS default block size
+MULTIPART_PART_SIZE = 128 * 1024 * 1024
+# size of the reads of the parts uploaded from a file
+MULTIPART_CHUNK_SIZE = 1024 * 1024
+
+# operations authenticated by the user, even when a delegation token is used
+_TOKEN_OPERATIONS = (operations.GETDELEGATIONTOKEN,
+                     operations.RENEWDELEGATIONTOKEN,
+                     operations.CANCELDELEGATIONTOKEN)
 
 
 class PyWebHdfsClient(object):
@@ -22,7 +48,8 @@ class PyWebHdfsClient(object):
     def __init__(self, host='localhost', port='50070', user_name=None,
                  path_to_hosts=None, timeout=120,
                  base_uri_pattern="http://{host}:{port}/webhdfs/v1/",
-                 request_extra_opts={}):
+                 request_extra_opts={}, request_hooks=None, scheduler=None,
+                 time_connections=None):
         """
         Create a new client for interacting with WebHDFS
 
@@ -34,6 +61,14 @@ class PyWebHdfsClient(object):
         :param base_uri_pattern: format string for base URI
         :param request_extra_opts: dictionary of extra options to pass
           to the requests library (e.g., SSL, HTTP authentication, etc.)
+        :param request_hooks: callables invoked after every HTTP request
+          with a trace dict of the operation, path, host, status, redirect,
+          bytes and timings (see pywebhdfs.tracing)
+        :param scheduler: optional pywebhdfs.scheduling.RequestScheduler
+          limiting concurrent requests and the NameNode request rate
+        :param time_connections: whether the traces split the setup of new
+          connections into dns, connect and tls times, with a transport
+          adapter replacing internals of urllib3 (def: with request_hooks)
 
         >>> hdfs = PyWebHdfsClient(host='host',port='50070', user_name='hdfs')
 
@@ -50,13 +85,41 @@ class PyWebHdfsClient(object):
         self.user_name = user_name
         self.timeout = timeout
         self.session = requests.Session()
+        self.time_connections = bool(request_hooks) if time_connections is None \
+            else time_connections
+        if self.time_connections:
+            self.mount_adapter()
+        self._stream_get = partial(self.session.get, stream=True)
         self.path_to_hosts = path_to_hosts
         if self.path_to_hosts is None:
             self.path_to_hosts = [('.*', [self.host])]
+        self._routes = [(re.compile(path_regexp), hosts)
+                        for path_regexp, hosts in self.path_to_hosts]
+        self._route_cache = OrderedDict()
+        self._route_lock = threading.Lock()
 
         self.base_uri_pattern = base_uri_pattern.format(
             host="{host}", port=port)
+        self._host_prefixes = {}
         self.request_extra_opts = request_extra_opts
+        self.request_hooks = list(request_hooks or [])
+        self.scheduler = scheduler
+        self.delegation_token = None
+        self._token_renewer = None
+        self._token_renew_before = 0
+        self._token_expiry = None
+        self._token_lock = threading.Lock()
+
+    def mount_adapter(self, **kwargs):
+        """
+        Send the requests through a new transport adapter made with kwargs,
+        e.g. pool_maxsize: a tracing.TimingAdapter when time_connections is
+        set, the default adapter of requests otherwise
+        """
+        adapter_class = tracing.TimingAdapter if self.time_connections else HTTPAdapter
+        adapter = adapter_class(**kwargs)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
     def create_file(self, path, file_data, **kwargs):
         """
@@ -110,10 +173,15 @@ class PyWebHdfsClient(object):
         # initial response from the namenode and make the CREATE request
         # to the datanode
         uri = init_response.headers['location']
-        response = self.session.put(
-            uri, data=file_data,
-            headers={'content-type': 'application/octet-stream'},
-            **self.request_extra_opts)
+        with self._slot(operations.CREATE):
+            start = self._start_request()
+            response = self.session.put(
+                uri, data=file_data,
+                headers={'content-type': 'application/octet-stream'},
+                **self.request_extra_opts)
+        self._run_request_hooks(operations.CREATE, path, _netloc(uri),
+                                'datanode', start, response, file_data,
+                                len(response.content or b''))
 
         if not response.status_code == http_client.CREATED:
             _raise_pywebhdfs_exception(response.status_code, response.content)
@@ -167,17 +235,132 @@ class PyWebHdfsClient(object):
         # initial response from the namenode and make the APPEND request
         # to the datanode
         uri = init_response.headers['location']
-        response = self.session.post(
-            uri, data=file_data,
-            headers={'content-type': 'application/octet-stream'},
-            **self.request_extra_opts
-        )
+        with self._slot(operations.APPEND):
+            start = self._start_request()
+            response = self.session.post(
+                uri, data=file_data,
+                headers={'content-type': 'application/octet-stream'},
+                **self.request_extra_opts
+            )
+        self._run_request_hooks(operations.APPEND, path, _netloc(uri),
+                                'datanode', start, response, file_data,
+                                len(response.content or b''))
+
+        if not response.status_code == http_client.OK:
+            _raise_pywebhdfs_exception(response.status_code, response.content)
+
+        return True
+
+    def concat_files(self, path, sources):
+        """
+        Concatenates files to the end of an existing file on HDFS, removing
+        them
+
+        :param path: the HDFS file path
+        :param sources: the HDFS paths of the files to append
+
+        The function wraps the WebHDFS REST call:
+
+        POST http://<HOST>:<PORT>/webhdfs/v1/<PATH>?op=CONCAT&sources=<PATHS>
+
+        HDFS requires the files to be in the same directory and all but the
+        last one to be made of full blocks of the same size.
+
+        Example:
+
+        >>> hdfs = PyWebHdfsClient(host='host',port='50070', user_name='hdfs')
+        >>> hdfs.concat_files('user/hdfs/data/part0',
+        >>>                   ['user/hdfs/data/part1', 'user/hdfs/data/part2'])
+        """
 
+        sources = ','.join('/' + source.lstrip('/') for source in sources)
+        response = self._resolve_host(self.session.post, True,
+                                      path, operations.CONCAT,
+                                      sources=sources)
         if not response.status_code == http_client.OK:
             _raise_pywebhdfs_exception(response.status_code, response.content)
 
         return True
 
+    def create_file_multipart(self, path, file_data, part_size=MULTIPART_PART_SIZE,
+                              workers=4, overwrite=False, **kwargs):
+        """
+        Creates a file on HDFS by uploading parts of it concurrently, each
+        one to its own DataNode pipeline, and concatenating them
+
+        :param path: the HDFS file path
+        :param file_data: bytes, a file object or an iterator of bytes
+        :param part_size: the size of the parts, a multiple of the block
+          size, which defaults to part_size
+        :param workers: the number of parts uploaded at the same time
+        :param overwrite: replace an existing file at path
+
+        The function accepts the optional arguments of create_file. Without
+        overwrite, an existing path fails the upload before any part is
+        sent. The parts are created next to path as hidden files,
+        concatenated into the first one with CONCAT, which is then renamed
+        to path; they are deleted if the upload fails.
+
+        Parts of regular files are read by every worker from its own range
+        of the file; those of other streams are read one after the other and
+        held in memory until uploaded, at most workers + 1 at a time.
+
+        Example:
+
+        >>> hdfs = PyWebHdfsClient(host='host',port='50070', user_name='hdfs')
+        >>> with open('dataset.tar', 'rb') as f:
+        >>>     hdfs.create_file_multipart('user/hdfs/dataset.tar', f,
+        >>>                                workers=8, overwrite=True)
+        """
+
+        blocksize = int(kwargs.setdefault('blocksize', part_size))
+        if part_size % blocksize:
+            raise ValueError("part_size {} is not a multiple of the block size {}"
+                             .format(part_size, blocksize))
+        if not overwrite and self.exists_file_dir(path):
+            raise errors.PyWebHdfsException(msg="{} already exists".format(path))
+        directory, name = posixpath.split('/' + path.lstrip('/'))
+        prefix = posixpath.join(directory, '.{}.{}.part'.format(name, uuid.uuid4().hex[:12]))
+        parts = []
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                slots = threading.Semaphore(workers)
+                futures = []
+                for data in _multipart_bodies(file_data, part_size):
+                    slots.acquire()
+                    if any(f.done() and f.exception() for f in futures):
+                        break
+                    parts.append('{}{:05d}'.format(prefix, len(parts)))
+                    future = pool.submit(self.create_file, parts[-1], data, **kwargs)
+                    future.add_done_callback(lambda f: slots.release())
+                    futures.append(future)
+            for future in futures:
+                future.result()
+            if not parts:
+                parts.append(prefix + '00000')
+                self.create_file(parts[0], b'', **kwargs)
+            if len(parts) > 1:
+                self.concat_files(parts[0], parts[1:])
+                # the other parts were removed by CONCAT
+                parts = parts[:1]
+            if overwrite and self.exists_file_dir(path):
+                self.delete_file_dir(path)
+            if not self.rename_file_dir(parts[0], path)['boolean']:
+                if self.exists_file_dir(path):
+                    # created meanwhile by another client
+                    raise errors.PyWebHdfsException(msg="{} already exists".format(path))
+                raise errors.PyWebHdfsException(
+                    msg="{} could not be renamed to {}".format(parts[0], path))
+            parts = []
+        finally:
+            for part in parts:
+                try:
+                    self.delete_file_dir(part)
+                except errors.PyWebHdfsException:
+                    pass
+
+        return True
+
     def read_file(self, path, **kwargs):
         """
         Reads from a file on HDFS  and returns the content
@@ -225,7 +408,9 @@ class PyWebHdfsClient(object):
 
         [&offset=<LONG>][&length=<LONG>][&buffersize=<INT>]
 
-        Note: this function follows automatic redirects
+        Note: this function follows automatic redirects. With a scheduler,
+        the request keeps its slot until the file has been read or the
+        generator closed.
 
         Example:
 
@@ -240,15 +425,118 @@ class PyWebHdfsClient(object):
 
         optional_args = kwargs
 
-        response = self._resolve_host(self.session.get, True,
-                                      path, operations.OPEN, stream=True,
-                                      **optional_args)
-        if not response.status_code == http_client.OK:
-            _raise_pywebhdfs_exception(response.status_code, response.content)
+        self._throttle()
+        with self._slot(operations.OPEN):
+            reader = self._open_body(path, operations.OPEN, throttled=True,
+                                     **optional_args)
+            try:
+                for chunk in reader.chunks(chunk_size):
+                    yield chunk
+            finally:
+                reader.close()
+
+    def read_file_into(self, path, buffer, offset=0, **kwargs):
+        """
+        Reads len(buffer) bytes of a file on HDFS, starting at offset, into
+        buffer and returns the number of bytes read, which is smaller at the
+        end of the file
+
+        :param path: the HDFS file path
+        :param buffer: a writable bytes-like object, e.g. a bytearray or a
+          memoryview slice of one, filled straight from the socket
+        :param offset: the position in the file to read from
+
+        Unlike read_file, no bytes object is created for the content: a
+        buffer allocated once can be reused for every read.
+
+        Example:
+
+        >>> hdfs = PyWebHdfsClient(host='host',port='50070', user_name='hdfs')
+        >>> buf = bytearray(1024 * 1024)
+        >>> n = hdfs.read_file_into('user/hdfs/data/myfile.txt', buf)
+        >>> memoryview(buf)[:n]
+        """
+
+        view = memoryview(buffer).cast('B')
+        # the slot is held until the body is read, not only for the headers,
+        # and not while waiting for the NameNode rate limit
+        self._throttle()
+        with self._slot(operations.OPEN):
+            reader = self._open_body(path, operations.OPEN, throttled=True,
+                                     offset=offset, length=len(view),
+                                     **kwargs)
+            try:
+                return reader.readinto(view)
+            finally:
+                reader.close()
 
-        for chunk in response.iter_content(chunk_size):
-            if chunk:
-                yield chunk
+    def stream_file_into(self, path, buffer, **kwargs):
+        """
+        Reads a file on HDFS into buffer chunk by chunk, and yields for
+        every chunk a memoryview of the part of buffer it was read into
+
+        :param path: the HDFS file path
+        :param buffer: a writable bytes-like object, its size is the chunk
+          size
+
+        The content of a chunk is only valid until the next one is read. With
+        a scheduler, the request keeps its slot until the file has been read
+        or the generator closed.
+
+        Example:
+
+        >>> hdfs = PyWebHdfsClient(host='host',port='50070', user_name='hdfs')
+        >>> with open('myfile.txt', 'wb') as f:
+        >>>     for chunk in hdfs.stream_file_into('user/hdfs/data/myfile.txt',
+        >>>                                        bytearray(1024 * 1024)):
+        >>>         f.write(chunk)
+        """
+
+        view = memoryview(buffer).cast('B')
+        self._throttle()
+        with self._slot(operations.OPEN):
+            reader = self._open_body(path, operations.OPEN, throttled=True,
+                                     **kwargs)
+            try:
+                while True:
+                    nbytes = reader.readinto(view)
+                    if not nbytes:
+                        break
+                    yield view[:nbytes]
+            finally:
+                reader.close()
+
+    def copy_file(self, path, destination_path, chunk_size=1024 * 1024,
+                  **kwargs):
+        """
+        Copies a file on HDFS to another path, streaming the body of the
+        OPEN response into the body of the CREATE request
+
+        :param path: the HDFS file path
+        :param destination_path: the HDFS path of the copy
+        :param chunk_size: the size of the only buffer the data goes through
+
+        The function accepts the optional arguments of create_file. The
+        source is opened before the copy is created, so a missing source
+        raises FileNotFound without touching destination_path.
+
+        Example:
+
+        >>> hdfs = PyWebHdfsClient(host='host',port='50070', user_name='hdfs')
+        >>> hdfs.copy_file('user/hdfs/data/myfile.txt',
+        >>>                'user/hdfs/backup/myfile.txt', overwrite=True)
+        """
+
+        chunks = self.stream_file_into(path, bytearray(chunk_size))
+        try:
+            first = next(chunks, None)
+            if first is None:
+                return self.create_file(destination_path, b'', **kwargs)
+            # every chunk is sent before the next one is read into the buffer
+            return self.create_file(destination_path, chain([first], chunks),
+                                    **kwargs)
+        finally:
+            chunks.close()
 
     def make_dir(self, path, **kwargs):
         """
@@ -310,7 +598,7 @@ class PyWebHdfsClient(object):
         if not response.status_code == http_client.OK:
             _raise_pywebhdfs_exception(response.status_code, response.content)
 
-        return response.json()
+        return jsonstream.loads(response.content)
 
     def delete_file_dir(self, path, recursive=False):
         """
@@ -398,7 +686,7 @@ class PyWebHdfsClient(object):
         if not response.status_code == http_client.OK:
             _raise_pywebhdfs_exception(response.status_code, response.content)
 
-        return response.json()
+        return jsonstream.loads(response.content)
 
     def get_content_summary(self, path):
         """
@@ -433,7 +721,7 @@ class PyWebHdfsClient(object):
         if not response.status_code == http_client.OK:
             _raise_pywebhdfs_exception(response.status_code, response.content)
 
-        return response.json()
+        return jsonstream.loads(response.content)
 
     def get_file_checksum(self, path):
         """
@@ -464,7 +752,7 @@ class PyWebHdfsClient(object):
         if not response.status_code == http_client.OK:
             _raise_pywebhdfs_exception(response.status_code, response.content)
 
-        return response.json()
+        return jsonstream.loads(response.content)
 
     def list_dir(self, path):
         """
@@ -519,7 +807,44 @@ class PyWebHdfsClient(object):
         if not response.status_code == http_client.OK:
             _raise_pywebhdfs_exception(response.status_code, response.content)
 
-        return response.json()
+        return jsonstream.loads(response.content)
+
+    def stream_dir(self, path, chunk_size=64 * 1024):
+        """
+        Yields the file_status of all files and directories inside an HDFS
+        directory, each one as soon as it has been received
+
+        :param path: the HDFS file path
+        :param chunk_size: bytes of the response decoded at a time
+
+        The function wraps the same WebHDFS REST call as list_dir, without
+        holding the whole response in memory: large directories can be
+        processed while they are being listed. With a scheduler, the request
+        keeps its slot until the listing has been read or the generator
+        closed.
+
+        Example for listing a directory:
+
+        >>> hdfs = PyWebHdfsClient(host='host',port='50070', user_name='hdfs')
+        >>> for status in hdfs.stream_dir('user/hdfs'):
+        >>>     print(status['pathSuffix'], status['length'])
+        example3.txt 90
+        example2.txt 1057
+        """
+
+        self._throttle()
+        with self._slot(operations.LISTSTATUS):
+            reader = self._open_body(path, operations.LISTSTATUS,
+                                     throttled=True)
+            chunks = reader.chunks(chunk_size)
+            try:
+                for status in jsonstream.iter_array(chunks, 'FileStatus'):
+                    yield status
+                # reads the end of the document, so the connection is reused
+                for _ in chunks:
+                    pass
+            finally:
+                reader.close()
 
     def exists_file_dir(self, path):
         """
@@ -605,18 +930,20 @@ class PyWebHdfsClient(object):
 
         return True
 
-    def get_xattr(self, path, xattr=None):
+    def get_xattr(self, path, xattr=None, encoding=None):
         """
         Get extended attributes set on an HDFS path
 
         :param path: the HDFS file path without a leading '/'
         :param xattr: the extended attribute to get
+        :param encoding: the encoding of the values, text, hex ('0x' prefix)
+          or base64 ('0s' prefix)
 
         This function wraps the WebHDFS REST call:
 
         GET http://<HOST>:<PORT>/webhdfs/v1/<PATH>?op=GETXATTRS
 
-        [&xattr.name=<string>]
+        [&xattr.name=<string>][&encoding=<text|hex|base64>]
 
         Example for getting an extended attribute:
 
@@ -634,6 +961,8 @@ class PyWebHdfsClient(object):
         kwd_params = {}
         if xattr:
             kwd_params['xattr.name'] = xattr
+        if encoding:
+            kwd_params['encoding'] = encoding
 
         response = self._resolve_host(self.session.get, True,
                                       path, operations.GETXATTRS,
@@ -641,7 +970,7 @@ class PyWebHdfsClient(object):
 
         if not response.status_code == http_client.OK:
             _raise_pywebhdfs_exception(response.status_code, response.content)
-        return response.json()
+        return jsonstream.loads(response.content)
 
     def set_xattr(self, path, xattr, value, replace=False):
         """
@@ -703,7 +1032,7 @@ class PyWebHdfsClient(object):
 
         if not response.status_code == http_client.OK:
             _raise_pywebhdfs_exception(response.status_code, response.content)
-        return response.json()
+        return jsonstream.loads(response.content)
 
     def delete_xattr(self, path, xattr):
         """
@@ -735,76 +1064,458 @@ class PyWebHdfsClient(object):
             _raise_pywebhdfs_exception(response.status_code, response.content)
         return True
 
+    def get_delegation_token(self, renewer=None):
+        """
+        Get a delegation token, to authenticate requests without the
+        credentials of the user
+
+        :param renewer: the user allowed to renew the token
+
+        The function wraps the WebHDFS REST call:
+
+        GET http://<HOST>:<PORT>/webhdfs/v1/?op=GETDELEGATIONTOKEN
+
+        [&renewer=<USER>]
+
+        Example:
+
+        >>> hdfs = PyWebHdfsClient(host='host',port='50070', user_name='hdfs')
+        >>> hdfs.get_delegation_token(renewer='hdfs')
+        'JQAIaGRmcy11c2VyAAAAAAAAAAAAAAABXg...'
+        """
+
+        kwd_params = {} if renewer is None else {'renewer': renewer}
+        response = self._resolve_host(self.session.get, True,
+                                      '/', operations.GETDELEGATIONTOKEN,
+                                      **kwd_params)
+        if not response.status_code == http_client.OK:
+            _raise_pywebhdfs_exception(response.status_code, response.content)
+
+        return jsonstream.loads(response.content)['Token']['urlString']
+
+    def renew_delegation_token(self, token):
+        """
+        Renew a delegation token and return its new expiration time, in
+        milliseconds since the epoch
+
+        :param token: the delegation token
+
+        The function wraps the WebHDFS REST call:
+
+        PUT http://<HOST>:<PORT>/webhdfs/v1/?op=RENEWDELEGATIONTOKEN
+
+        &token=<TOKEN>
+
+        Example:
+
+        >>> hdfs = PyWebHdfsClient(host='host',port='50070', user_name='hdfs')
+        >>> hdfs.renew_delegation_token(token)
+        1320962673997
+        """
+
+        response = self._resolve_host(self.session.put, True,
+                                      '/', operations.RENEWDELEGATIONTOKEN,
+                                      token=token)
+        if not response.status_code == http_client.OK:
+            _raise_pywebhdfs_exception(response.status_code, response.content)
+
+        return jsonstream.loads(response.content)['long']
+
+    def cancel_delegation_token(self, token):
+        """
+        Cancel a delegation token
+
+        :param token: the delegation token
+
+        The function wraps the WebHDFS REST call:
+
+        PUT http://<HOST>:<PORT>/webhdfs/v1/?op=CANCELDELEGATIONTOKEN
+
+        &token=<TOKEN>
+
+        Example:
+
+        >>> hdfs = PyWebHdfsClient(host='host',port='50070', user_name='hdfs')
+        >>> hdfs.cancel_delegation_token(token)
+        """
+
+        response = self._resolve_host(self.session.put, True,
+                                      '/', operations.CANCELDELEGATIONTOKEN,
+                                      token=token)
+        if not response.status_code == http_client.OK:
+            _raise_pywebhdfs_exception(response.status_code, response.content)
+
+        if self.delegation_token == token:
+            self.delegation_token = self._token_expiry = None
+        return True
+
+    def use_delegation_token(self, renewer=None, renew_before=300):
+        """
+        Authenticate all the following requests with a delegation token
+        instead of user.name
+
+        :param renewer: the user allowed to renew the token
+        :param renew_before: seconds before its expiry the token is renewed
+
+        The token is obtained now, renewed by the first request sent less
+        than renew_before seconds before it expires, and replaced by a new
+        token once it cannot be renewed any more.
+
+        Example:
+
+        >>> hdfs = PyWebHdfsClient(host='host',port='50070', user_name='hdfs')
+        >>> hdfs.use_delegation_token()
+        """
+
+        self._token_renewer = renewer
+        self._token_renew_before = renew_before
+        self._refresh_delegation_token(force=True)
+
+    def _refresh_delegation_token(self, force=False):
+        """
+        internal function renewing the delegation token in use, or getting
+        a new one when it cannot be renewed
+        """
+        with self._token_lock:
+            if not force and not self._token_expiring():
+                # renewed by another thread meanwhile
+                return
+            if self.delegation_token is not None:
+                try:
+                    self._token_expiry = self.renew_delegation_token(
+                        self.delegation_token) / 1000.0
+                    return
+                except errors.PyWebHdfsException:
+                    pass
+            token = self.get_delegation_token(self._token_renewer)
+            try:
+                expiry = self.renew_delegation_token(token) / 1000.0
+            except errors.PyWebHdfsException:
+                # only the renewer may renew it
+                expiry = time.time() + DELEGATION_TOKEN_SECONDS
+            self.delegation_token, self._token_expiry = token, expiry
+
+    def _token_expiring(self):
+        """
+        internal function telling whether the delegation token is due for
+        renewal
+        """
+        return (self._token_expiry is not None and
+                time.time() > self._token_expiry - self._token_renew_before)
+
     def _create_uri(self, path, operation, **kwargs):
         """
         internal function used to construct the WebHDFS request uri based on
         the <PATH>, <OPERATION>, and any provided optional arguments
         """
 
-        no_root_path = (path[1:] if path[0] == '/' else path)
-        path_param = quote(no_root_path.encode('utf8'))
+        return self.base_uri_pattern + self._create_query(
+            path, operation, **kwargs)
 
-        # setup the parameter represent the WebHDFS operation
-        operation_param = '?op={operation}'.format(operation=operation)
+    def _create_query(self, path, operation, **kwargs):
+        """
+        internal function used to construct the host independent part of
+        the WebHDFS request uri: the quoted <PATH>, the <OPERATION> and
+        any provided optional arguments
+        """
 
-        # configure authorization based on provided credentials
-        auth_param = str()
-        if self.user_name:
-            auth_param = '&user.name={user_name}'.format(
-                user_name=self.user_name)
+        no_root_path = (path[1:] if path[:1] == '/' else path)
+        parts = [quote(no_root_path.encode('utf8')), '?op=', operation]
 
         # setup any optional parameters
-        keyword_params = str()
         for key in kwargs:
             try:
                 value = quote_plus(kwargs[key].encode('utf8'))
-            except:
+            except AttributeError:
                 value = str(kwargs[key]).lower()
-            keyword_params = '{params}&{key}={value}'.format(
-                params=keyword_params, key=key, value=value)
+            parts.append('&{key}={value}'.format(key=key, value=value))
 
-        base_uri = self.base_uri_pattern.format(host="{host}")
+        # configure authorization based on provided credentials
+        token = self.delegation_token
+        if token is not None and operation not in _TOKEN_OPERATIONS:
+            parts.append('&delegation=' + quote_plus(token))
+        elif self.user_name:
+            parts.append('&user.name=' + self.user_name)
 
-        # build the complete uri from the base uri and all configured params
-        uri = '{base_uri}{path}{operation}{keyword_args}{auth}'.format(
-            base_uri=base_uri, path=path_param,
-            operation=operation_param, keyword_args=keyword_params,
-            auth=auth_param)
+        return ''.join(parts)
 
-        return uri
+    def _host_prefix(self, host):
+        """
+        internal function returning the base uri for a host, formatted
+        only once per host
+        """
+        prefix = self._host_prefixes.get(host)
+        if prefix is None:
+            prefix = self.base_uri_pattern.format(host=host)
+            self._host_prefixes[host] = prefix
+        return prefix
 
     def _resolve_federation(self, path):
         """
         internal function used to resolve federation
+
+        The patterns of path_to_hosts are compiled once, and the
+        most recent FEDERATION_CACHE_SIZE decisions are remembered, so a
+        path seen before costs a single dictionary lookup.
         """
-        for path_regexp, hosts in self.path_to_hosts:
-            if re.match(path_regexp, path):
+        with self._route_lock:
+            hosts = self._route_cache.get(path)
+            if hosts is not None:
+                self._route_cache.move_to_end(path)
+                return hosts
+        for path_regexp, hosts in self._routes:
+            if path_regexp.match(path):
+                with self._route_lock:
+                    self._route_cache[path] = hosts
+                    if len(self._route_cache) > FEDERATION_CACHE_SIZE:
+                        self._route_cache.popitem(last=False)
                 return hosts
         raise errors.CorrespondHostsNotFound(
             msg="Could not find hosts corresponds to /{0}".format(path))
 
     def _resolve_host(self, req_func, allow_redirect,
-                      path, operation, **kwargs):
+                      path, operation, throttled=False, body=False, **kwargs):
         """
         internal function used to resolve federation and HA and
-        return response of resolved host.
+        return response of resolved host; throttled when the caller already
+        waited for the NameNode rate limit of the first host tried
+
+        With body, req_func streams the response, and a _BodyReader of it is
+        returned instead, which passes the trace of the request to
+        request_hooks once closed.
         """
-        uri_without_host = self._create_uri(path, operation, **kwargs)
+        if self._token_expiring() and operation not in _TOKEN_OPERATIONS:
+            self._refresh_delegation_token()
+        query = self._create_query(path, operation, **kwargs)
         hosts = self._resolve_federation(path)
         for host in hosts:
-            uri = uri_without_host.format(host=host)
+            uri = self._host_prefix(host) + query
+            if not throttled:
+                self._throttle()
+            throttled = False
+            start = self._start_request()
             try:
-                response = req_func(uri, allow_redirects=allow_redirect,
-                                    timeout=self.timeout,
-                                    **self.request_extra_opts)
+                with self._slot(operation):
+                    response = req_func(uri, allow_redirects=allow_redirect,
+                                        timeout=self.timeout,
+                                        **self.request_extra_opts)
+
+                if body and not _is_standby_exception(response):
+                    _move_active_host_to_head(hosts, host)
+                    done = None
+                    if self.request_hooks:
+                        # traced once the body has been read, possibly by
+                        # another thread, with the connections set up so far
+                        done = partial(
+                            self._run_request_hooks, operation, path, host,
+                            'namenode', start, response, None,
+                            connections=tracing.get_connection_timings())
+                    return _BodyReader(response, done)
+                self._run_request_hooks(operation, path, host, 'namenode',
+                                        start, response, None,
+                                        None if body else
+                                        len(response.content or b''))
 
                 if not _is_standby_exception(response):
                     _move_active_host_to_head(hosts, host)
                     return response
             except requests.exceptions.RequestException:
+                self._run_request_hooks(operation, path, host, 'namenode',
+                                        start)
                 continue
         raise errors.ActiveHostNotFound(msg="Could not find active host")
 
+    def _open_body(self, path, operation, **kwargs):
+        """
+        internal function sending a streamed GET request and returning a
+        _BodyReader of its response, raising the error of any other status
+        than OK; the trace of the request is sent when the reader is closed
+        """
+        reader = self._resolve_host(self._stream_get, True,
+                                    path, operation, body=True, **kwargs)
+        if not reader.response.status_code == http_client.OK:
+            try:
+                content = b''.join(reader.chunks(64 * 1024))
+            finally:
+                reader.close()
+            _raise_pywebhdfs_exception(reader.response.status_code, content)
+        return reader
+
+    def _slot(self, operation):
+        """
+        internal function returning the context holding a scheduler slot
+        for a request of operation
+        """
+        if self.scheduler is None:
+            return _NO_SLOT
+        return self.scheduler.slot(operation)
+
+    def _throttle(self):
+        """
+        internal function waiting until a request can be sent to the
+        NameNode within the rate limit of the scheduler
+        """
+        if self.scheduler is not None:
+            self.scheduler.throttle_namenode()
+
+    def _start_request(self):
+        """
+        internal function returning the start time of a request
+        """
+        if self.request_hooks:
+            tracing.reset_connection_timings()
+        return time.time()
+
+    def _run_request_hooks(self, operation, path, host, phase, start,
+                           response=None, data=None, bytes_received=None,
+                           connections=None):
+        """
+        internal function passing the trace of a request to request_hooks
+        """
+        if not self.request_hooks:
+            return
+        trace = tracing.make_trace(operation, path, host, phase, start,
+                                   response, data, bytes_received,
+                                   connections)
+        for hook in self.request_hooks:
+            hook(trace)
+
+
+class _NoSlot(object):
+    """
+    internal context of the requests of a client without scheduler
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SLOT = _NoSlot()
+
+
+class _BodyReader(object):
+    """
+    internal reader of the body of a streamed response, decoded and checked
+    against its content-length by urllib3, calling done with the number of
+    bytes read once closed
+    """
+
+    def __init__(self, response, done=None):
+        self.response = response
+        self.nbytes = 0
+        self._done = done
+        self._read = partial(response.raw.read, decode_content=True)
+
+    def read(self, amt):
+        """
+        read up to amt bytes, none only at the end of the body; errors are
+        raised as the requests exceptions iter_content would raise
+        """
+        try:
+            data = self._read(amt)
+        except urllib3.exceptions.ProtocolError as e:
+            raise requests.exceptions.ChunkedEncodingError(e)
+        except urllib3.exceptions.DecodeError as e:
+            raise requests.exceptions.ContentDecodingError(e)
+        except urllib3.exceptions.ReadTimeoutError as e:
+            raise requests.exceptions.ConnectionError(e)
+        self.nbytes += len(data)
+        return data
+
+    def readinto(self, view):
+        """
+        fill view, short only at the end of the body
+        """
+        nbytes = 0
+        while nbytes < len(view):
+            data = self.read(len(view) - nbytes)
+            if not data:
+                break
+            view[nbytes:nbytes + len(data)] = data
+            nbytes += len(data)
+        return nbytes
+
+    def chunks(self, chunk_size):
+        """
+        yield the rest of the body in bytes of up to chunk_size
+        """
+        while True:
+            data = self.read(chunk_size)
+            if not data:
+                return
+            yield data
+
+    def close(self):
+        """
+        return the connection to the pool once the body has been read to
+        its end, close it otherwise
+        """
+        raw = self.response.raw
+        try:
+            # reading past the end consumes the last chunk of a chunked body
+            at_end = raw.closed or not self.read(1)
+        except (OSError, urllib3.exceptions.HTTPError,
+                requests.exceptions.RequestException):
+            at_end = False
+        if at_end:
+            raw.release_conn()
+        else:
+            self.response.close()
+        done, self._done = self._done, None
+        if done is not None:
+            done(self.nbytes)
+
+
+def _multipart_bodies(file_data, part_size):
+    """
+    internal generator of the request bodies of the parts of file_data
+    """
+    if isinstance(file_data, (bytes, bytearray, memoryview)):
+        view = memoryview(file_data).cast('B')
+        for start in range(0, len(view), part_size):
+            yield view[start:start + part_size]
+        return
+    try:
+        fd = file_data.fileno()
+        st = os.fstat(fd)
+        position = file_data.tell()
+        size = st.st_size - position
+    except (AttributeError, OSError, ValueError):
+        fd = None
+    else:
+        if not stat.S_ISREG(st.st_mode):
+            fd = None
+    if fd is not None:
+        for start in range(position, position + size, part_size):
+            yield _pread_chunks(fd, start, min(part_size, position + size - start))
+        return
+    if hasattr(file_data, 'read'):
+        file_data = iter(partial(file_data.read, MULTIPART_CHUNK_SIZE), b'')
+    part = bytearray()
+    for chunk in file_data:
+        part += chunk
+        while len(part) >= part_size:
+            yield bytes(part[:part_size])
+            del part[:part_size]
+    if part:
+        yield bytes(part)
+
+
+def _pread_chunks(fd, offset, length):
+    """
+    internal generator reading length bytes of a file from offset
+    """
+    end = offset + length
+    while offset < end:
+        data = os.pread(fd, min(MULTIPART_CHUNK_SIZE, end - offset), offset)
+        if not data:
+            break
+        offset += len(data)
+        yield data
+
 
 def _raise_pywebhdfs_exception(resp_code, message=None):
 
@@ -820,13 +1531,20 @@ def _raise_pywebhdfs_exception(resp_code, message=None):
         raise errors.PyWebHdfsException(msg=message)
 
 
+def _netloc(uri):
+    """
+    return the host:port part of an uri
+    """
+    return uri.split('/', 3)[2] if '://' in uri else uri
+
+
 def _is_standby_exception(response):
     """
     check whether response is StandbyException or not.
     """
     if response.status_code == http_client.FORBIDDEN:
         try:
-            body = response.json()
+            body = jsonstream.loads(response.content)
             exception = body["RemoteException"]["exception"]
             if exception == "StandbyException":
                 return True
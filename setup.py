@@ -144,6 +144,7 @@ setup(
     # projects.
     extras_require={  # Optional
         'dev': ['check-manifest'],
+        'json': ['orjson'],
         'test': ['coverage'],
     },
 
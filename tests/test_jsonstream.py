@@ -0,0 +1,83 @@
+"""
+Tests of the incremental decoding of WebHDFS listings
+"""
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pywebhdfs import jsonstream  # noqa: E402
+
+
+def listing(count):
+    statuses = [{'pathSuffix': 'fé{}'.format(i), 'length': i, 'type': 'FILE',
+                 'aclBit': False, 'blocks': [i, [i]]} for i in range(count)]
+    document = {'FileStatuses': {'FileStatus': statuses}}
+    return statuses, json.dumps(document, ensure_ascii=False, indent=1).encode('utf8')
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class IterArrayTest(unittest.TestCase):
+
+    def test_every_chunk_size(self):
+        statuses, data = listing(5)
+        for size in range(1, len(data) + 1):
+            self.assertEqual(list(jsonstream.iter_array(chunked(data, size), 'FileStatus')),
+                             statuses, size)
+
+    def test_empty_chunks(self):
+        statuses, data = listing(3)
+        chunks = [b''] + [chunk for piece in chunked(data, 7) for chunk in (piece, b'')]
+        self.assertEqual(list(jsonstream.iter_array(chunks, 'FileStatus')), statuses)
+
+    def test_multibyte_character_split(self):
+        data = '{"FileStatus": [{"pathSuffix": "é€"}]}'.encode('utf8')
+        split = data.index('€'.encode('utf8')) + 1
+        self.assertEqual(list(jsonstream.iter_array([data[:split], data[split:]], 'FileStatus')),
+                         [{'pathSuffix': 'é€'}])
+
+    def test_empty_array(self):
+        self.assertEqual(list(jsonstream.iter_array([b'{"FileStatuses": {"FileStatus": [ ]}}'],
+                                                    'FileStatus')), [])
+
+    def test_items_yielded_before_end(self):
+        statuses, data = listing(3)
+        end = data.index(b'"f\xc3\xa91"')
+
+        def chunks():
+            yield data[:end]
+            self.fail("read past the first item")
+        items = jsonstream.iter_array(chunks(), 'FileStatus')
+        self.assertEqual(next(items), statuses[0])
+
+    def test_compacts_long_documents(self):
+        statuses, data = listing(3000)
+        self.assertGreater(len(data), 2 * jsonstream._COMPACT_SIZE)
+        self.assertEqual(list(jsonstream.iter_array(chunked(data, 65536), 'FileStatus')),
+                         statuses)
+
+    def test_missing_key(self):
+        with self.assertRaises(ValueError):
+            list(jsonstream.iter_array([b'{"RemoteException": {}}'], 'FileStatus'))
+
+    def test_truncated(self):
+        statuses, data = listing(3)
+        for end in (len(data) // 2, data.rindex(b']')):
+            with self.assertRaises(ValueError):
+                list(jsonstream.iter_array(chunked(data[:end], 16), 'FileStatus'))
+
+
+class LoadsTest(unittest.TestCase):
+
+    def test_bytes_and_str(self):
+        self.assertEqual(jsonstream.loads(b'{"boolean": true}'), {'boolean': True})
+        self.assertEqual(jsonstream.loads('{"boolean": true}'), {'boolean': True})
+
+
+if __name__ == '__main__':
+    unittest.main()
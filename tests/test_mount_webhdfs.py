@@ -0,0 +1,305 @@
+"""
+Tests of the FUSE operations of mount-webhdfs.py against the fake WebHDFS
+server of the benchmarks, called the way the kernel would (fusepy must be
+importable, libfuse included)
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from errno import EACCES, EIO, ENODATA, ENOENT, ENOTSUP
+from stat import S_ISDIR
+from types import SimpleNamespace
+from unittest import mock
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'benchmarks'))
+
+import bench_webhdfs  # noqa: E402
+import pywebhdfs.errors  # noqa: E402
+from fake_webhdfs import FakeWebHdfs  # noqa: E402
+
+
+class MountTestCase(unittest.TestCase):
+    """
+    A mount of a fresh fake server, with the config lines of config
+    """
+    config = ''
+
+    def setUp(self):
+        self.server = FakeWebHdfs().start()
+        self.addCleanup(self.server.stop)
+        try:
+            self.module = bench_webhdfs.load_mount(self.server, self.config)
+        except (ImportError, OSError) as e:
+            raise unittest.SkipTest("fusepy cannot be used: {}".format(e))
+        self.fs = self.module.WebHDFS()
+        self.addCleanup(self.fs, 'destroy', '/')
+
+    def assertErrno(self, errno, op, *args):
+        with self.assertRaises(OSError) as cm:
+            self.fs(op, *args)
+        self.assertEqual(cm.exception.errno, errno)
+
+    def write_file(self, path, data):
+        """
+        Write a new file and wait for its background upload
+        """
+        self.fs('create', path, 0o644)
+        self.fs('write', path, data, 0, 0)
+        pending = self.fs._pending.get(path)
+        self.fs('release', path, 0)
+        if pending is not None:
+            pending.future.exception()
+
+
+class FailedUploadTest(MountTestCase):
+
+    def setUp(self):
+        super(FailedUploadTest, self).setUp()
+        self.fs('mkdir', '/d', 0o755)
+        self.assertEqual(self.fs('readdir', '/d', 0), ['.', '..'])
+
+    def fail_uploads(self):
+        return mock.patch.object(self.fs.client, 'create_file',
+                                 side_effect=pywebhdfs.errors.PyWebHdfsException('down'))
+
+    def test_fsync_reports_failed_upload(self):
+        with self.fail_uploads():
+            self.fs('create', '/d/f', 0o644)
+            self.fs('write', '/d/f', b'data', 0, 0)
+            self.assertErrno(EIO, 'fsync', '/d/f', 0, 0)
+        self.assertEqual(self.fs('readdir', '/d', 0), ['.', '..'])
+        self.assertErrno(ENOENT, 'getattr', '/d/f')
+
+    def test_next_lookup_reports_failed_background_upload(self):
+        with self.fail_uploads():
+            self.write_file('/d/f', b'data')
+        self.assertNotIn('f', self.fs('readdir', '/d', 0))
+        # reported once, after which the file is missing
+        self.assertErrno(EIO, 'getattr', '/d/f')
+        self.assertErrno(ENOENT, 'getattr', '/d/f')
+
+    def test_open_reports_failed_background_upload(self):
+        with self.fail_uploads():
+            self.write_file('/d/f', b'data')
+        self.assertErrno(EIO, 'open', '/d/f', SimpleNamespace())
+
+    def test_create_again_after_failed_upload(self):
+        with self.fail_uploads():
+            self.write_file('/d/f', b'data')
+        self.write_file('/d/f', b'again')
+        self.fs('fsync', '/d/f', 0, 0)
+        self.assertEqual(self.fs('getattr', '/d/f')['st_size'], 5)
+
+
+class NegativePatternsTest(MountTestCase):
+    config = 'negative_patterns = .git, __pycache__, *.so, *.pyc\nwrite_buffer_bytes = 0\n'
+
+    def setUp(self):
+        super(NegativePatternsTest, self).setUp()
+        self.fs('mkdir', '/d', 0o755)
+
+    def test_missing_without_request(self):
+        self.server.requests.clear()
+        self.assertErrno(ENOENT, 'getattr', '/d/.git')
+        self.assertErrno(ENOENT, 'getattr', '/d/mod.so')
+        self.assertEqual(sum(self.server.requests.values()), 0)
+
+    def test_listing_wins(self):
+        self.server.add_file('/d/mod.so', b'elf')
+        self.fs('readdir', '/d', 0)
+        self.assertEqual(self.fs('getattr', '/d/mod.so')['st_size'], 3)
+
+    def test_mkdir(self):
+        self.fs('mkdir', '/d/.git', 0o755)
+        self.assertTrue(S_ISDIR(self.fs('getattr', '/d/.git')['st_mode']))
+
+    def test_create(self):
+        self.fs('create', '/d/mod.so', 0o644)
+        self.assertEqual(self.fs('getattr', '/d/mod.so')['st_size'], 0)
+
+    def test_rename(self):
+        self.fs('create', '/d/mod.tmp', 0o644)
+        self.fs('rename', '/d/mod.tmp', '/d/mod.pyc')
+        self.assertEqual(self.fs('getattr', '/d/mod.pyc')['st_size'], 0)
+        self.assertErrno(ENOENT, 'getattr', '/d/mod.tmp')
+
+    def test_missing_again_once_removed(self):
+        self.fs('mkdir', '/d/__pycache__', 0o755)
+        self.fs('rmdir', '/d/__pycache__')
+        self.server.requests.clear()
+        self.assertErrno(ENOENT, 'getattr', '/d/__pycache__')
+        self.assertEqual(sum(self.server.requests.values()), 0)
+
+
+class ListdirRevalidationTest(MountTestCase):
+    config = 'cache_max_seconds = 0.2\nlistdir_revalidate_seconds = 300\nsmall_file_bytes = 0\n'
+
+    def test_appends_seen_once_statuses_expire(self):
+        node = self.server.add_file('/d/f', b'a')
+        self.assertEqual(self.fs('readdir', '/d', 0), ['.', '..', 'f'])
+        self.assertEqual(self.fs('getattr', '/d/f')['st_size'], 1)
+        # appended by another client, which does not change the directory
+        node.data.extend(b'bc')
+        time.sleep(0.3)
+        self.server.requests.clear()
+        self.assertEqual(self.fs('readdir', '/d', 0), ['.', '..', 'f'])
+        self.assertEqual(self.server.requests['LISTSTATUS'], 0)
+        self.assertEqual(self.fs('getattr', '/d/f')['st_size'], 3)
+
+
+class XattrTest(MountTestCase):
+
+    def setUp(self):
+        super(XattrTest, self).setUp()
+        self.node = self.server.add_file('/f', b'data')
+        self.node.xattrs['user.tag'] = b'gold'
+
+    def test_cached(self):
+        self.assertEqual(self.fs('getxattr', '/f', 'user.tag'), b'gold')
+        self.assertEqual(self.fs('listxattr', '/f'), ['user.tag'])
+        self.assertErrno(ENODATA, 'getxattr', '/f', 'user.other')
+        # never sent to HDFS
+        self.assertErrno(ENODATA, 'getxattr', '/f', 'security.selinux')
+        self.assertEqual(self.server.requests['GETXATTRS'], 1)
+
+    def test_set_and_remove(self):
+        self.fs('setxattr', '/f', 'user.owner', b'etl', 0)
+        self.assertEqual(self.node.xattrs['user.owner'], b'etl')
+        self.assertEqual(self.fs('getxattr', '/f', 'user.owner'), b'etl')
+        self.fs('removexattr', '/f', 'user.tag')
+        self.assertEqual(self.fs('listxattr', '/f'), ['user.owner'])
+
+    def test_missing_file(self):
+        self.assertErrno(ENOENT, 'getxattr', '/missing', 'user.tag')
+
+    def refuse(self, exception, message):
+        body = '{{"RemoteException": {{"exception": "{}", "message": "{}"}}}}'.format(
+            exception, message).encode()
+        return mock.patch.object(self.fs.client, 'get_xattr',
+                                 side_effect=pywebhdfs.errors.PyWebHdfsException(msg=body))
+
+    def test_disabled_cached(self):
+        with self.refuse('IOException', 'The XAttr operation has been rejected. Support for XAttrs '
+                         'has been disabled by setting dfs.namenode.xattrs.enabled to false.') \
+                as get_xattr:
+            self.assertErrno(ENOTSUP, 'listxattr', '/f')
+            self.assertErrno(ENOTSUP, 'getxattr', '/f', 'user.tag')
+            self.assertEqual(get_xattr.call_count, 1)
+
+    def test_forbidden_cached(self):
+        with self.refuse('AccessControlException', 'Permission denied: user=etl') as get_xattr:
+            self.assertErrno(EACCES, 'getxattr', '/f', 'user.tag')
+            self.assertErrno(EACCES, 'listxattr', '/f')
+            self.assertEqual(get_xattr.call_count, 1)
+
+
+class InlineExecutor(object):
+    """
+    An executor running its tasks as they are submitted
+    """
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class SmallFilePrefetchTest(MountTestCase):
+    config = 'small_file_prefetch = 4\n'
+
+    def test_fetches_done_before_registered_forgotten(self):
+        for name in 'abc':
+            self.server.add_file('/d/' + name, name.encode())
+        self.assertEqual(self.fs('readdir', '/d', 0), ['.', '..', 'a', 'b', 'c'])
+        with mock.patch.object(self.fs, '_prefetcher', InlineExecutor()):
+            self.fs._prefetch_siblings('/d/a')
+        self.assertEqual(self.fs._small_fetches, {})
+        self.assertEqual(bytes(self.fs('read', '/d/c', 1, 0, 0)), b'c')
+
+
+class MemoryBudgetTest(MountTestCase):
+    config = 'memory_budget_bytes = 65536\nsmall_file_bytes = 0\n'
+
+    def test_only_fuse_thread_reclaims(self):
+        self.server.add_file('/f', b'data')
+        self.server.add_file('/g', b'data')
+        with mock.patch.object(self.fs.memory, 'reserve') as reserve:
+            # as the refresher thread does
+            thread = threading.Thread(target=self.fs._get_status, args=('/f',))
+            thread.start()
+            thread.join()
+            self.assertIn('/f', self.fs._stats_cache)
+            reserve.assert_not_called()
+            self.fs('getattr', '/g')
+            reserve.assert_called_once_with(0)
+
+    def test_read_buffer_kept_by_other_threads(self):
+        self.server.add_file('/big', bytes(32768))
+        self.assertEqual(len(self.fs('read', '/big', 32768, 0, 0)), 32768)
+        for i in range(40):
+            self.server.add_file('/f{}'.format(i), b'data')
+            thread = threading.Thread(target=self.fs._get_status, args=('/f{}'.format(i),))
+            thread.start()
+            thread.join()
+        self.assertGreater(self.fs.memory.used(), 65536)
+        self.assertEqual(self.fs._read_buffers['/big'].length, 32768)
+        self.server.add_file('/g', b'data')
+        self.fs('getattr', '/g')
+        self.assertLessEqual(self.fs.memory.used(), 65536)
+
+    def test_footer_skipped_out_of_budget(self):
+        data = bytes(range(256)) * 1024
+        self.server.add_file('/t.parquet', data)
+        self.assertEqual(bytes(self.fs('read', '/t.parquet', 100, len(data) - 100, 0)), data[-100:])
+        self.assertNotIn('/t.parquet', self.fs._layouts)
+        self.assertLessEqual(self.fs.memory.used(), 65536)
+
+
+class AccessTraceTest(MountTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='webhdfs-test-')
+        self.addCleanup(shutil.rmtree, directory)
+        self.trace_file = os.path.join(directory, 'trace.jsonl')
+        self.config = 'access_trace_file = {}\nmemory_budget_bytes = 1048576\n'.format(self.trace_file)
+        super(AccessTraceTest, self).setUp()
+
+    def test_trace_in_memory_budget(self):
+        self.server.add_file('/f', b'data')
+        self.fs('getattr', '/f')
+        self.assertEqual(self.fs.memory.usage()['trace'], self.fs._trace.memory())
+        self.assertGreater(self.fs._trace.memory(), 0)
+
+    def test_replay_not_recorded(self):
+        self.server.add_file('/f', b'data')
+        self.server.add_file('/g', b'data')
+
+        def replay(records, root, workers):
+            # as a thread of the replay through the mount point would
+            with mock.patch.object(self.module, 'fuse_get_context',
+                                   return_value=(0, 0, threading.get_native_id())):
+                self.fs('getattr', '/f')
+            # as a job started meanwhile would
+            with mock.patch.object(self.module, 'fuse_get_context',
+                                   return_value=(0, 0, os.getppid())):
+                self.fs('getattr', '/g')
+        self.fs._replaying = True
+        with mock.patch.object(self.module.webhdfs_warmup, 'replay', side_effect=replay), \
+                mock.patch.object(self.module, 'mountpoint', '/mnt', create=True):
+            self.fs._warm_up([['S', '/f']])
+        self.fs('getattr', '/f')
+        self.fs._trace.close()
+        self.assertEqual(self.module.webhdfs_warmup.load(self.trace_file), [['S', '/g'], ['S', '/f']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+"""
+Tests of the request slots and NameNode rate limit of PyWebHdfsClient
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pywebhdfs import operations  # noqa: E402
+from pywebhdfs.scheduling import DATA, METADATA, RequestScheduler, request_kind  # noqa: E402
+
+OPERATION = {DATA: operations.OPEN, METADATA: operations.GETFILESTATUS}
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.001)
+
+
+class RequestSchedulerTest(unittest.TestCase):
+
+    def start(self, scheduler, kind, order=None, hold=None):
+        """
+        Start a thread taking a slot of kind, recording kind in order once it
+        has it, and holding it until hold is set
+        """
+        def request():
+            with scheduler.slot(OPERATION[kind]):
+                if order is not None:
+                    order.append(kind)
+                if hold is not None:
+                    hold.wait()
+        thread = threading.Thread(target=request)
+        thread.start()
+        self.addCleanup(thread.join)
+        return thread
+
+    def test_request_kind(self):
+        self.assertEqual(request_kind(operations.OPEN), DATA)
+        self.assertEqual(request_kind(operations.CREATE), DATA)
+        self.assertEqual(request_kind(operations.APPEND), DATA)
+        self.assertEqual(request_kind(operations.LISTSTATUS), METADATA)
+        self.assertEqual(request_kind(operations.GETFILESTATUS), METADATA)
+
+    def test_reentrant_slot(self):
+        scheduler = RequestScheduler(slots=1)
+        with scheduler.slot(operations.CREATE):
+            # the DataNode step of a request holding a slot for its NameNode step
+            with scheduler.slot(operations.CREATE):
+                self.assertEqual(scheduler.running(DATA), 1)
+            self.assertEqual(scheduler.running(DATA), 1)
+        self.assertEqual(scheduler.running(DATA), 0)
+        with scheduler.slot(operations.LISTSTATUS):
+            self.assertEqual(scheduler.running(METADATA), 1)
+
+    def test_generator_closed_by_another_thread(self):
+        scheduler = RequestScheduler(slots=2)
+
+        def stream():
+            with scheduler.slot(operations.OPEN):
+                yield
+
+        chunks = stream()
+        next(chunks)
+        thread = threading.Thread(target=chunks.close)
+        thread.start()
+        thread.join()
+        self.assertEqual(scheduler.running(DATA), 0)
+        # this thread no longer holds a slot
+        with scheduler.slot(operations.GETFILESTATUS):
+            self.assertEqual(scheduler.running(METADATA), 1)
+
+    def test_slot_released_on_error(self):
+        scheduler = RequestScheduler(slots=1)
+        with self.assertRaises(ValueError):
+            with scheduler.slot(operations.OPEN):
+                raise ValueError()
+        self.assertEqual(scheduler.running(DATA), 0)
+        with scheduler.slot(operations.OPEN):
+            pass
+
+    def test_slots(self):
+        scheduler = RequestScheduler(slots=2)
+        hold = threading.Event()
+        for kind in (DATA, METADATA, METADATA):
+            self.start(scheduler, kind, hold=hold)
+        wait_until(lambda: scheduler.waiting(METADATA) + scheduler.waiting(DATA) == 1)
+        self.assertEqual(scheduler.running(DATA) + scheduler.running(METADATA), 2)
+        hold.set()
+        wait_until(lambda: scheduler.running(DATA) + scheduler.running(METADATA) == 0)
+
+    def test_kind_limit(self):
+        scheduler = RequestScheduler(slots=4, limits={DATA: 1})
+        hold = threading.Event()
+        order = []
+        self.start(scheduler, DATA, order, hold)
+        self.start(scheduler, DATA, order, hold)
+        wait_until(lambda: scheduler.waiting(DATA) == 1)
+        # metadata requests still get the slots data requests may not use
+        self.start(scheduler, METADATA, order, hold)
+        self.start(scheduler, METADATA, order, hold)
+        wait_until(lambda: scheduler.running(METADATA) == 2)
+        self.assertEqual(scheduler.running(DATA), 1)
+        self.assertEqual(scheduler.waiting(DATA), 1)
+        hold.set()
+        wait_until(lambda: len(order) == 4)
+        self.assertEqual(order, [DATA, METADATA, METADATA, DATA])
+
+    def queued_order(self, weights):
+        """
+        Return the kinds of 8 data and 8 metadata requests in the order they
+        got the only slot, all of them waiting when it was freed
+        """
+        scheduler = RequestScheduler(slots=1, weights=weights)
+        hold = threading.Event()
+        order = []
+        self.start(scheduler, DATA, hold=hold)
+        wait_until(lambda: scheduler.running(DATA) == 1)
+        for i in range(8):
+            self.start(scheduler, DATA, order)
+            self.start(scheduler, METADATA, order)
+        wait_until(lambda: scheduler.waiting(DATA) == scheduler.waiting(METADATA) == 8)
+        hold.set()
+        wait_until(lambda: len(order) == 16)
+        return order
+
+    def test_weights(self):
+        order = self.queued_order({METADATA: 4, DATA: 1})
+        self.assertGreaterEqual(order[:10].count(METADATA), 8)
+        order = self.queued_order({METADATA: 1, DATA: 1})
+        self.assertIn(order[:8].count(METADATA), (4, 5))
+
+    def test_idle_kind_does_not_save_up_slots(self):
+        scheduler = RequestScheduler(slots=1, weights={METADATA: 1, DATA: 1})
+        for i in range(20):
+            with scheduler.slot(operations.GETFILESTATUS):
+                pass
+        hold = threading.Event()
+        order = []
+        self.start(scheduler, METADATA, hold=hold)
+        wait_until(lambda: scheduler.running(METADATA) == 1)
+        for i in range(4):
+            self.start(scheduler, METADATA, order)
+            self.start(scheduler, DATA, order)
+        wait_until(lambda: scheduler.waiting(DATA) == scheduler.waiting(METADATA) == 4)
+        hold.set()
+        wait_until(lambda: len(order) == 8)
+        # data requests, idle so far, are not owed 20 slots in a row
+        self.assertLessEqual(order[:4].count(DATA), 3)
+        self.assertGreaterEqual(order[:4].count(DATA), 2)
+
+    def test_namenode_qps(self):
+        scheduler = RequestScheduler(namenode_qps=50, namenode_burst=5)
+        start = time.monotonic()
+        for i in range(5):
+            scheduler.throttle_namenode()
+        self.assertLess(time.monotonic() - start, 0.05)
+        for i in range(10):
+            scheduler.throttle_namenode()
+        self.assertGreaterEqual(time.monotonic() - start, 10 / 50.0 - 0.02)
+
+    def test_namenode_burst_saved_up(self):
+        scheduler = RequestScheduler(namenode_qps=50, namenode_burst=3)
+        for i in range(3):
+            scheduler.throttle_namenode()
+        time.sleep(3 / 50.0)
+        start = time.monotonic()
+        for i in range(3):
+            scheduler.throttle_namenode()
+        self.assertLess(time.monotonic() - start, 0.015)
+
+    def test_no_namenode_limit(self):
+        scheduler = RequestScheduler()
+        start = time.monotonic()
+        for i in range(1000):
+            scheduler.throttle_namenode()
+        self.assertLess(time.monotonic() - start, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+Tests of the request traces of PyWebHdfsClient, against the fake WebHDFS
+server of the benchmarks
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.join(BASE_DIR, 'benchmarks'))
+
+from fake_webhdfs import FakeWebHdfs  # noqa: E402
+import pywebhdfs.errors  # noqa: E402
+from pywebhdfs import tracing  # noqa: E402
+from pywebhdfs.webhdfs import PyWebHdfsClient  # noqa: E402
+
+
+class ConnectionTimingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeWebHdfs().start()
+        self.addCleanup(self.server.stop)
+        self.server.add_file('/f', b'data')
+
+    def adapters(self, client):
+        return [type(client.session.get_adapter(scheme + '://host/'))
+                for scheme in ('http', 'https')]
+
+    def test_default_adapter_without_hooks(self):
+        client = PyWebHdfsClient(base_uri_pattern=self.server.base_uri)
+        self.assertFalse(client.time_connections)
+        self.assertNotIn(tracing.TimingAdapter, self.adapters(client))
+        client.mount_adapter(pool_maxsize=4)
+        self.assertNotIn(tracing.TimingAdapter, self.adapters(client))
+        self.assertEqual(client.read_file('/f'), b'data')
+
+    def test_timed_with_hooks(self):
+        traces = []
+        client = PyWebHdfsClient(base_uri_pattern=self.server.base_uri,
+                                 request_hooks=[traces.append])
+        self.assertEqual(self.adapters(client), [tracing.TimingAdapter] * 2)
+        self.assertEqual(client.read_file('/f'), b'data')
+        self.assertEqual(len(traces), 1)
+        self.assertGreater(traces[0]['timings']['connect'], 0)
+
+    def test_hooks_without_timing(self):
+        traces = []
+        client = PyWebHdfsClient(base_uri_pattern=self.server.base_uri,
+                                 request_hooks=[traces.append], time_connections=False)
+        self.assertNotIn(tracing.TimingAdapter, self.adapters(client))
+        client.get_file_dir_status('/f')
+        self.assertEqual(traces[0]['status'], 200)
+        self.assertEqual(traces[0]['timings']['connect'], 0)
+
+    def test_timed_adapter_of_pool(self):
+        client = PyWebHdfsClient(base_uri_pattern=self.server.base_uri, time_connections=True)
+        client.mount_adapter(pool_maxsize=4)
+        self.assertEqual(self.adapters(client), [tracing.TimingAdapter] * 2)
+
+
+class StreamedTraceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeWebHdfs().start()
+        self.addCleanup(self.server.stop)
+        self.data = bytes(range(256)) * 1024
+        self.server.add_file('/f', self.data)
+        self.traces = []
+        self.client = PyWebHdfsClient(base_uri_pattern=self.server.base_uri,
+                                      request_hooks=[self.traces.append])
+
+    def test_read_file_into(self):
+        self.assertEqual(self.client.read_file_into('/f', bytearray(1000), offset=10), 1000)
+        self.assertEqual(len(self.traces), 1)
+        self.assertEqual(self.traces[0]['operation'], 'OPEN')
+        self.assertEqual(self.traces[0]['bytes_received'], 1000)
+
+    def test_stream_file_into_traced_once_read(self):
+        chunks = self.client.stream_file_into('/f', bytearray(65536))
+        next(chunks)
+        self.assertEqual(self.traces, [])
+        self.assertEqual(sum(len(chunk) for chunk in chunks), len(self.data) - 65536)
+        self.assertEqual(len(self.traces), 1)
+        self.assertEqual(self.traces[0]['bytes_received'], len(self.data))
+        self.assertGreater(self.traces[0]['timings']['transfer'], 0)
+        self.assertGreater(self.traces[0]['timings']['connect'], 0)
+
+    def test_stream_file_closed(self):
+        chunks = self.client.stream_file('/f', chunk_size=1024)
+        next(chunks)
+        chunks.close()
+        self.assertEqual(len(self.traces), 1)
+        self.assertLess(self.traces[0]['bytes_received'], len(self.data))
+
+    def test_stream_dir(self):
+        self.assertEqual([status['pathSuffix'] for status in self.client.stream_dir('/')], ['f'])
+        self.assertEqual(self.traces[0]['operation'], 'LISTSTATUS')
+        self.assertGreater(self.traces[0]['bytes_received'], 0)
+
+    def test_error_traced(self):
+        with self.assertRaises(pywebhdfs.errors.FileNotFound):
+            self.client.read_file_into('/missing', bytearray(10))
+        self.assertEqual(self.traces[0]['status'], 404)
+        self.assertGreater(self.traces[0]['bytes_received'], 0)
+
+    def test_not_streamed(self):
+        self.assertEqual(self.client.read_file('/f'), self.data)
+        self.assertEqual(self.traces[0]['bytes_received'], len(self.data))
+
+
+class JsonLinesSamplerTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='webhdfs-trace-')
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'trace.jsonl')
+
+    def test_failed_requests_always_written(self):
+        sampler = tracing.JsonLinesSampler(self.path, rate=0, slow=10)
+        for status in (200, 307, 'error', 401, 403, 404, 500, 503):
+            sampler(dict(status=status, elapsed=0.1))
+        sampler(dict(status=200, elapsed=11))
+        sampler.close()
+        with open(self.path) as f:
+            written = [json.loads(line) for line in f]
+        self.assertEqual([(trace['status'], trace['elapsed']) for trace in written],
+                         [('error', 0.1), (401, 0.1), (403, 0.1), (404, 0.1),
+                          (500, 0.1), (503, 0.1), (200, 11)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,235 @@
+"""
+Tests of PyWebHdfsClient against the fake WebHDFS server of the benchmarks
+"""
+import gzip
+import io
+import os
+import sys
+import unittest
+from unittest import mock
+
+import requests
+import urllib3
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.join(BASE_DIR, 'benchmarks'))
+
+from fake_webhdfs import FakeWebHdfs  # noqa: E402
+import pywebhdfs.errors  # noqa: E402
+from pywebhdfs.scheduling import DATA, METADATA, RequestScheduler  # noqa: E402
+from pywebhdfs.webhdfs import PyWebHdfsClient, _BodyReader  # noqa: E402
+
+CONTENT = bytes(range(256)) * 4096
+
+
+def streamed_response(body, **headers):
+    """
+    Return a response whose body is read from body like requests streams it
+    """
+    raw = urllib3.HTTPResponse(body=io.BytesIO(body), headers=headers, status=200,
+                               preload_content=False, decode_content=False)
+    response = requests.Response()
+    response.raw = raw
+    response.status_code = 200
+    response.headers = requests.structures.CaseInsensitiveDict(headers)
+    return response
+
+
+class BodyReaderTest(unittest.TestCase):
+
+    def test_fills_view(self):
+        reader = _BodyReader(streamed_response(CONTENT, **{'content-length': str(len(CONTENT))}))
+        buf = bytearray(len(CONTENT) // 3 + 1)
+        chunks = []
+        while True:
+            nbytes = reader.readinto(memoryview(buf))
+            if not nbytes:
+                break
+            chunks.append(bytes(buf[:nbytes]))
+        reader.close()
+        self.assertEqual(b''.join(chunks), CONTENT)
+        self.assertEqual([len(chunk) for chunk in chunks[:-1]], [len(buf)] * 2)
+
+    def test_decodes_content(self):
+        body = gzip.compress(CONTENT)
+        reader = _BodyReader(streamed_response(body, **{'content-encoding': 'gzip',
+                                                        'content-length': str(len(body))}))
+        buf = bytearray(len(CONTENT) + 10)
+        self.assertEqual(reader.readinto(memoryview(buf)), len(CONTENT))
+        self.assertEqual(bytes(buf[:len(CONTENT)]), CONTENT)
+
+    def test_short_body(self):
+        reader = _BodyReader(streamed_response(CONTENT[:100], **{'content-length': '1000'}))
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            reader.readinto(memoryview(bytearray(1000)))
+
+
+class ReadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeWebHdfs().start()
+        self.addCleanup(self.server.stop)
+        self.server.add_file('/f', CONTENT)
+        self.client = PyWebHdfsClient(base_uri_pattern=self.server.base_uri)
+
+    def test_read_file_into(self):
+        buf = bytearray(1000)
+        self.assertEqual(self.client.read_file_into('/f', buf, offset=5000), 1000)
+        self.assertEqual(bytes(buf), CONTENT[5000:6000])
+        self.assertEqual(self.client.read_file_into('/f', buf, offset=len(CONTENT) - 10), 10)
+        self.assertEqual(bytes(buf[:10]), CONTENT[-10:])
+
+    def test_stream_file_into(self):
+        chunks = [bytes(chunk) for chunk in self.client.stream_file_into('/f', bytearray(300000))]
+        self.assertEqual(b''.join(chunks), CONTENT)
+
+    def test_connections_reused(self):
+        buf = bytearray(1000)
+        for offset in range(0, 20000, 1000):
+            self.client.read_file_into('/f', buf, offset=offset)
+        pool = self.client.session.get_adapter(self.server.base_uri).poolmanager \
+            .connection_from_url(self.server.base_uri)
+        self.assertLessEqual(pool.num_connections, 2)
+
+
+class MultipartTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeWebHdfs().start()
+        self.addCleanup(self.server.stop)
+        self.server.mkdirs('/d')
+        self.client = PyWebHdfsClient(base_uri_pattern=self.server.base_uri)
+        self.data = CONTENT[:10 * 1024 + 512]
+
+    def names(self):
+        statuses = self.client.list_dir('/d')['FileStatuses']['FileStatus']
+        return sorted(status['pathSuffix'] for status in statuses)
+
+    def test_parts_concatenated(self):
+        self.client.create_file_multipart('/d/f', io.BytesIO(self.data), part_size=1024, workers=3)
+        self.assertEqual(self.client.read_file('/d/f'), self.data)
+        self.assertEqual(self.names(), ['f'])
+        self.assertEqual(self.server.requests['CREATE'], 11)
+        self.assertEqual(self.server.requests['CONCAT'], 1)
+        self.assertEqual(self.server.requests['DELETE'], 0)
+
+    def test_iterator_and_empty(self):
+        self.client.create_file_multipart('/d/f', iter([self.data[:3000], self.data[3000:]]),
+                                          part_size=1024)
+        self.assertEqual(self.client.read_file('/d/f'), self.data)
+        self.client.create_file_multipart('/d/e', b'')
+        self.assertEqual(self.client.read_file('/d/e'), b'')
+
+    def test_existing_fails_before_upload(self):
+        self.server.add_file('/d/f', b'old')
+        self.server.requests.clear()
+        with self.assertRaises(pywebhdfs.errors.PyWebHdfsException) as cm:
+            self.client.create_file_multipart('/d/f', self.data, part_size=1024)
+        self.assertIn('already exists', str(cm.exception))
+        self.assertEqual(self.server.requests['CREATE'], 0)
+        self.assertEqual(self.client.read_file('/d/f'), b'old')
+
+    def test_overwrite(self):
+        self.server.add_file('/d/f', b'old')
+        self.client.create_file_multipart('/d/f', self.data, part_size=1024, overwrite=True)
+        self.assertEqual(self.client.read_file('/d/f'), self.data)
+        self.assertEqual(self.names(), ['f'])
+
+    def test_failed_rename_deletes_concatenated_part(self):
+        with mock.patch.object(self.client, 'rename_file_dir', return_value={'boolean': False}):
+            with self.assertRaises(pywebhdfs.errors.PyWebHdfsException) as cm:
+                self.client.create_file_multipart('/d/f', self.data, part_size=1024)
+        self.assertIn('could not be renamed', str(cm.exception))
+        self.assertEqual(self.server.requests['DELETE'], 1)
+        self.assertEqual(self.names(), [])
+
+    def test_failed_part_deletes_parts(self):
+        create_file = self.client.create_file
+
+        def fail_third(path, data, **kwargs):
+            if path.endswith('00002'):
+                raise pywebhdfs.errors.PyWebHdfsException(msg='DataNode down')
+            return create_file(path, data, **kwargs)
+        with mock.patch.object(self.client, 'create_file', side_effect=fail_third):
+            with self.assertRaises(pywebhdfs.errors.PyWebHdfsException):
+                self.client.create_file_multipart('/d/f', self.data, part_size=1024, workers=1)
+        self.assertEqual(self.names(), [])
+        self.assertEqual(self.server.requests['CONCAT'], 0)
+
+    def test_part_size_multiple_of_block_size(self):
+        with self.assertRaises(ValueError):
+            self.client.create_file_multipart('/d/f', self.data, part_size=1024, blocksize=1000)
+
+
+class CopyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeWebHdfs().start()
+        self.addCleanup(self.server.stop)
+        self.server.add_file('/src', CONTENT)
+        self.client = PyWebHdfsClient(base_uri_pattern=self.server.base_uri)
+
+    def test_copy(self):
+        self.client.copy_file('/src', '/dst', chunk_size=100000, permission='600')
+        self.assertEqual(self.client.read_file('/dst'), CONTENT)
+        self.assertEqual(self.client.get_file_dir_status('/dst')['FileStatus']['permission'], '600')
+
+    def test_copy_empty(self):
+        self.server.add_file('/empty', b'')
+        self.client.copy_file('/empty', '/dst')
+        self.assertEqual(self.client.read_file('/dst'), b'')
+
+    def test_missing_source(self):
+        with self.assertRaises(pywebhdfs.errors.FileNotFound):
+            self.client.copy_file('/missing', '/dst')
+        self.assertFalse(self.client.exists_file_dir('/dst'))
+        self.assertEqual(self.server.requests['CREATE'], 0)
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeWebHdfs().start()
+        self.addCleanup(self.server.stop)
+        self.server.add_file('/d/f', CONTENT)
+        self.server.add_file('/d/g', CONTENT)
+        self.scheduler = RequestScheduler(slots=2)
+        self.client = PyWebHdfsClient(base_uri_pattern=self.server.base_uri,
+                                      scheduler=self.scheduler)
+
+    def test_slot_held_until_body_read(self):
+        chunks = self.client.stream_file_into('/d/f', bytearray(100000))
+        next(chunks)
+        self.assertEqual(self.scheduler.running(DATA), 1)
+        self.assertEqual(sum(len(chunk) for chunk in chunks), len(CONTENT) - 100000)
+        self.assertEqual(self.scheduler.running(DATA), 0)
+
+        chunks = self.client.stream_file('/d/f', chunk_size=100000)
+        next(chunks)
+        self.assertEqual(self.scheduler.running(DATA), 1)
+        self.assertEqual(sum(len(chunk) for chunk in chunks), len(CONTENT) - 100000)
+        self.assertEqual(self.scheduler.running(DATA), 0)
+
+        statuses = self.client.stream_dir('/d')
+        next(statuses)
+        self.assertEqual(self.scheduler.running(METADATA), 1)
+        statuses.close()
+        self.assertEqual(self.scheduler.running(METADATA), 0)
+
+    def test_throttled_before_slot(self):
+        running = []
+
+        def throttle_namenode():
+            running.append(self.scheduler.running(DATA) + self.scheduler.running(METADATA))
+        self.scheduler.throttle_namenode = throttle_namenode
+        self.client.read_file_into('/d/f', bytearray(1000))
+        list(self.client.stream_file_into('/d/f', bytearray(len(CONTENT))))
+        list(self.client.stream_file('/d/f', chunk_size=len(CONTENT)))
+        list(self.client.stream_dir('/d'))
+        self.client.get_file_dir_status('/d/f')
+        self.assertEqual(running, [0, 0, 0, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+"""
+Tests of the decoding of Parquet and ORC footers into column chunk ranges
+"""
+import io
+import os
+import struct
+import sys
+import unittest
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import webhdfs_columnar  # noqa: E402
+
+try:
+    import pyarrow
+    import pyarrow.orc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+def varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def zigzag(value):
+    return varint(value << 1 if value >= 0 else (-value << 1) - 1)
+
+
+def thrift_struct(*fields):
+    """
+    Encode (field id, Thrift type, encoded value) fields as a compact
+    protocol struct
+    """
+    out, last = bytearray(), 0
+    for field, type, value in fields:
+        out.append((field - last) << 4 | type)
+        out += value
+        last = field
+    return bytes(out + b'\0')
+
+
+def thrift_list(type, items):
+    return bytes([len(items) << 4 | type]) + b''.join(items)
+
+
+def parquet_file(row_groups):
+    """
+    Return a Parquet file whose row groups have columns of (dictionary page
+    offset or 0, data page offset, compressed size)
+    """
+    I32, I64, BINARY, LIST, STRUCT = 5, 6, 8, 9, 12
+    groups = []
+    for columns in row_groups:
+        chunks = []
+        for dictionary, data, size in columns:
+            fields = [(1, I32, zigzag(2)),
+                      (3, LIST, thrift_list(BINARY, [varint(1) + b'a'])),
+                      (7, I64, zigzag(size)),
+                      (9, I64, zigzag(data))]
+            if dictionary:
+                fields.append((11, I64, zigzag(dictionary)))
+            chunks.append(thrift_struct((2, I64, zigzag(0)),
+                                        (3, STRUCT, thrift_struct(*fields))))
+        groups.append(thrift_struct((1, LIST, thrift_list(STRUCT, chunks)),
+                                    (3, I64, zigzag(1000))))
+    meta = thrift_struct((1, I32, zigzag(1)),
+                         (3, I64, zigzag(1000)),
+                         (4, LIST, thrift_list(STRUCT, groups)))
+    end = max(data + size for columns in row_groups for dictionary, data, size in columns)
+    body = b'PAR1' + bytes(end - 4)
+    return body + meta + struct.pack('<I', len(meta)) + b'PAR1'
+
+
+def orc_file(stripes, compression=0):
+    """
+    Return an ORC file with stripes of (offset, index, data, footer)
+    lengths, and a footer compressed with zlib if compression is 1
+    """
+    def field(number, value):
+        if isinstance(value, int):
+            return varint(number << 3) + varint(value)
+        return varint(number << 3 | 2) + varint(len(value)) + value
+    footer = field(1, 3) + field(2, 1000) + b''.join(
+        field(3, field(1, offset) + field(2, index) + field(3, data) + field(4, stripe_footer))
+        for offset, index, data, stripe_footer in stripes)
+    if compression == 1:
+        deflate = zlib.compressobj(wbits=-15)
+        compressed = deflate.compress(footer) + deflate.flush()
+        footer = struct.pack('<I', len(compressed) << 1)[:3] + compressed
+    postscript = field(1, len(footer)) + field(2, compression) + field(8000, b'ORC')
+    end = max(offset + index + data + stripe_footer
+              for offset, index, data, stripe_footer in stripes)
+    return b'ORC' + bytes(end - 3) + footer + postscript + bytes([len(postscript)])
+
+
+class ParquetTest(unittest.TestCase):
+
+    def test_handmade_footer(self):
+        data = parquet_file([[(4, 100, 200), (0, 204, 50)],
+                             [(0, 254, 1000), (1254, 1300, 20)]])
+        self.assertEqual(webhdfs_columnar.footer_length(data[-256:]),
+                         len(data) - 1320)
+        self.assertEqual(webhdfs_columnar.column_ranges(data[1320:]),
+                         [(4, 204), (204, 254), (254, 1254), (1254, 1274)])
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_pyarrow_file(self):
+        table = pyarrow.table({'id': list(range(50000)),
+                               'name': [str(i) for i in range(50000)]})
+        out = io.BytesIO()
+        pyarrow.parquet.write_table(table, out, row_group_size=20000)
+        data = out.getvalue()
+        metadata = pyarrow.parquet.ParquetFile(io.BytesIO(data)).metadata
+        expected = []
+        for i in range(metadata.num_row_groups):
+            for j in range(metadata.num_columns):
+                column = metadata.row_group(i).column(j)
+                start = column.dictionary_page_offset or column.data_page_offset
+                expected.append((start, start + column.total_compressed_size))
+        needed = webhdfs_columnar.footer_length(data[-100:])
+        self.assertEqual(needed, 8 + metadata.serialized_size)
+        self.assertEqual(webhdfs_columnar.column_ranges(data[-needed:]), sorted(expected))
+
+    def test_truncated_footer(self):
+        data = parquet_file([[(4, 100, 200)]])
+        self.assertEqual(webhdfs_columnar.column_ranges(data[-20:]), [])
+
+
+class OrcTest(unittest.TestCase):
+
+    def test_handmade_footer(self):
+        for compression in (0, 1):
+            data = orc_file([(3, 10, 1000, 20), (1033, 5, 500, 10)], compression)
+            needed = webhdfs_columnar.footer_length(data[-256:])
+            self.assertEqual(needed, len(data) - 1548)
+            self.assertEqual(webhdfs_columnar.column_ranges(data[-needed:]),
+                             [(3, 1033), (1033, 1548)])
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_pyarrow_file(self):
+        table = pyarrow.table({'id': list(range(100000)),
+                               'name': [str(i) for i in range(100000)]})
+        for compression in ('uncompressed', 'zlib'):
+            out = io.BytesIO()
+            pyarrow.orc.write_table(table, out, stripe_size=64 * 1024, compression=compression)
+            data = out.getvalue()
+            needed = webhdfs_columnar.footer_length(data[-256:])
+            ranges = webhdfs_columnar.column_ranges(data[-needed:])
+            self.assertEqual(len(ranges), pyarrow.orc.ORCFile(io.BytesIO(data)).nstripes)
+            self.assertGreater(len(ranges), 1)
+            # the stripes follow the magic and each other, up to the file footer
+            self.assertEqual(ranges[0][0], 3)
+            for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+                self.assertEqual(end, next_start)
+            self.assertLessEqual(ranges[-1][1], len(data) - needed)
+
+    def test_other_compression(self):
+        # snappy
+        data = orc_file([(3, 10, 1000, 20)], compression=2)
+        needed = webhdfs_columnar.footer_length(data[-256:])
+        self.assertEqual(webhdfs_columnar.column_ranges(data[-needed:]), [])
+
+
+class FooterLengthTest(unittest.TestCase):
+
+    def test_other_files(self):
+        self.assertIsNone(webhdfs_columnar.footer_length(b''))
+        self.assertIsNone(webhdfs_columnar.footer_length(b'just some text\n'))
+        self.assertIsNone(webhdfs_columnar.footer_length(bytes(300)))
+
+
+class CoalesceTest(unittest.TestCase):
+
+    def test_coalesce(self):
+        ranges = [(0, 100), (100, 200), (10000, 20000), (20100, 20200), (30000, 2000000)]
+        self.assertEqual(webhdfs_columnar.coalesce(ranges, max_gap=1000, max_size=15000),
+                         [(0, 200), (10000, 20200), (30000, 2000000)])
+        self.assertEqual(webhdfs_columnar.coalesce(ranges, max_gap=1000, max_size=5000),
+                         [(0, 200), (10000, 20000), (20100, 20200), (30000, 2000000)])
+        self.assertEqual(webhdfs_columnar.coalesce(ranges, max_gap=0, max_size=10 ** 7),
+                         [(0, 200), (10000, 20000), (20100, 20200), (30000, 2000000)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Tests of the cache daemon, served over a Unix socket to DaemonClient, in
+front of the fake WebHDFS server of the benchmarks
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.join(BASE_DIR, 'benchmarks'))
+
+import webhdfs_daemon  # noqa: E402
+from fake_webhdfs import FakeWebHdfs  # noqa: E402
+from pywebhdfs import errors  # noqa: E402
+from pywebhdfs.webhdfs import PyWebHdfsClient  # noqa: E402
+
+BLOCK_SIZE = 1024
+DATA = bytes(range(256)) * 10
+
+
+class DaemonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeWebHdfs().start()
+        self.addCleanup(self.server.stop)
+        directory = tempfile.mkdtemp(prefix='webhdfs-daemon-')
+        self.addCleanup(shutil.rmtree, directory)
+        address = os.path.join(directory, 'daemon.sock')
+        self.cache = webhdfs_daemon.CachingClient(
+            PyWebHdfsClient(base_uri_pattern=self.server.base_uri), block_size=BLOCK_SIZE)
+        daemon = webhdfs_daemon.CacheDaemon(self.cache, address, b'key')
+        thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(daemon.close)
+        self.client = webhdfs_daemon.DaemonClient(address, b'key')
+        self.server.add_file('/d/f', DATA)
+
+    def read(self, path, size, offset):
+        buf = bytearray(size)
+        return bytes(buf[:self.client.read_file_into(path, buf, offset=offset)])
+
+    def test_read_partial_block_at_end(self):
+        self.assertEqual(self.read('/d/f', 1000, 2000), DATA[2000:])
+        self.assertEqual(self.server.requests['datanode OPEN'], 1)
+        # served from the blocks cached, the last one short
+        self.assertEqual(self.read('/d/f', 600, 2100), DATA[2100:])
+        self.assertEqual(self.read('/d/f', 10, len(DATA)), b'')
+        self.assertEqual(self.server.requests['datanode OPEN'], 1)
+
+    def test_read_around_cached_blocks(self):
+        self.assertEqual(self.read('/d/f', 10, 1500), DATA[1500:1510])
+        self.assertEqual(self.read('/d/f', len(DATA), 0), DATA)
+        self.assertEqual(self.server.requests['datanode OPEN'], 2)
+
+    def test_read_missing_file(self):
+        with self.assertRaises(errors.FileNotFound):
+            self.read('/d/missing', 10, 0)
+
+    def test_stream_file_into(self):
+        chunks = [bytes(chunk) for chunk in self.client.stream_file_into('/d/f', bytearray(1000))]
+        self.assertEqual(b''.join(chunks), DATA)
+        with self.assertRaises(errors.FileNotFound):
+            list(self.client.stream_file_into('/d/missing', bytearray(1000)))
+        # the connection is still in step
+        self.assertTrue(self.client.exists_file_dir('/d/f'))
+
+    def test_streamed_upload(self):
+        self.client.create_file('/d/g', iter([b'a' * 1000, b'b' * 1000]))
+        self.assertEqual(self.read('/d/g', 3000, 0), b'a' * 1000 + b'b' * 1000)
+
+    def test_streamed_upload_refused(self):
+        with self.assertRaises(errors.PyWebHdfsException):
+            self.client.create_file('/d/f', iter([b'a' * 1000, b'b' * 1000]))
+        # the rest of the body was skipped, the connection is still in step
+        self.assertEqual(self.read('/d/f', len(DATA), 0), DATA)
+
+    def test_streamed_upload_failed_by_client(self):
+        def chunks():
+            yield b'a' * 1000
+            raise IOError("local file unreadable")
+        with self.assertRaises(IOError):
+            self.client.create_file('/d/g', chunks())
+        # on a new connection
+        self.assertEqual(self.read('/d/f', 10, 0), DATA[:10])
+
+    def test_status_invalidated_by_create(self):
+        self.assertFalse(self.client.exists_file_dir('/d/g'))
+        self.client.create_file('/d/g', b'data')
+        self.assertTrue(self.client.exists_file_dir('/d/g'))
+
+    def test_listing_after_rename(self):
+        self.server.mkdirs('/e')
+        self.assertEqual(self.names('/d'), ['f'])
+        self.assertEqual(self.names('/e'), [])
+        self.assertEqual(self.read('/d/f', 10, 0), DATA[:10])
+        self.client.rename_file_dir('/d/f', '/e/g')
+        self.assertEqual(self.names('/d'), [])
+        self.assertEqual(self.names('/e'), ['g'])
+        self.assertFalse(self.client.exists_file_dir('/d/f'))
+        with self.assertRaises(errors.FileNotFound):
+            self.read('/d/f', 10, 0)
+        self.assertEqual(self.read('/e/g', 10, 0), DATA[:10])
+
+    def test_directory_rename_invalidates_below(self):
+        self.assertTrue(self.client.exists_file_dir('/d/f'))
+        self.client.rename_file_dir('/d', '/e')
+        self.assertFalse(self.client.exists_file_dir('/d/f'))
+        self.assertEqual(self.names('/e'), ['f'])
+
+    def test_method_not_allowed(self):
+        with self.assertRaises(errors.MethodNotAllowed):
+            self.client.concat_files('/d/f', ['/d/g'])
+
+    def names(self, path):
+        return [status['pathSuffix'] for status in self.client.stream_dir(path)]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+Tests of the mapping of HDFS owners and groups to local ids
+"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import webhdfs_ids  # noqa: E402
+
+
+class Lookup(object):
+    """
+    A user database of ids, counting the lookups
+    """
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.calls = []
+
+    def __call__(self, name):
+        self.calls.append(name)
+        return self.ids[name]
+
+
+class IdMapTest(unittest.TestCase):
+
+    def test_static_names_are_not_looked_up(self):
+        lookup = Lookup({'hdfs': 1001})
+        ids = webhdfs_ids.IdMap(lookup, 65534, static={'hive': 1005})
+        self.assertEqual(ids('hive'), 1005)
+        self.assertEqual(ids('hdfs'), 1001)
+        self.assertEqual(lookup.calls, ['hdfs'])
+
+    def test_found_names_are_cached(self):
+        lookup = Lookup({'hdfs': 1001})
+        ids = webhdfs_ids.IdMap(lookup, 65534, negative_seconds=0)
+        for i in range(3):
+            self.assertEqual(ids('hdfs'), 1001)
+        self.assertEqual(lookup.calls, ['hdfs'])
+
+    def test_negative_expiry(self):
+        lookup = Lookup({})
+        ids = webhdfs_ids.IdMap(lookup, 65534, negative_seconds=600)
+        with mock.patch('time.time', return_value=1000.0):
+            self.assertEqual(ids('etl'), 65534)
+            self.assertEqual(ids('etl'), 65534)
+        self.assertEqual(lookup.calls, ['etl'])
+        lookup.ids['etl'] = 1006
+        with mock.patch('time.time', return_value=1599.0):
+            self.assertEqual(ids('etl'), 65534)
+        self.assertEqual(lookup.calls, ['etl'])
+        with mock.patch('time.time', return_value=1601.0):
+            self.assertEqual(ids('etl'), 1006)
+        self.assertEqual(lookup.calls, ['etl', 'etl'])
+        # found, it no longer expires
+        with mock.patch('time.time', return_value=10 ** 9):
+            self.assertEqual(ids('etl'), 1006)
+        self.assertEqual(lookup.calls, ['etl', 'etl'])
+
+    def test_static_only(self):
+        ids = webhdfs_ids.IdMap(None, 65534, static={'hive': 1005})
+        self.assertEqual(ids('hive'), 1005)
+        self.assertEqual(ids('hdfs'), 65534)
+
+    def test_least_recently_used_evicted(self):
+        lookup = Lookup(dict(('user{}'.format(i), i) for i in range(4)))
+        ids = webhdfs_ids.IdMap(lookup, 65534, size=2)
+        ids('user0')
+        ids('user1')
+        ids('user0')
+        ids('user2')
+        self.assertEqual(len(ids), 2)
+        del lookup.calls[:]
+        ids('user0')
+        ids('user1')
+        self.assertEqual(lookup.calls, ['user1'])
+
+    def test_preload(self):
+        lookup = Lookup({})
+        ids = webhdfs_ids.IdMap(lookup, 65534)
+        self.assertEqual(ids.preload([('hdfs', 1001), ('hive', 1005)]), 2)
+        self.assertEqual(ids('hive'), 1005)
+        self.assertEqual(lookup.calls, [])
+
+
+class FirstIdTest(unittest.TestCase):
+
+    def test_first_id(self):
+        lookup = Lookup({'nogroup': 65534})
+        self.assertEqual(webhdfs_ids.first_id(lookup, ['1000', 'nogroup']), 1000)
+        self.assertEqual(webhdfs_ids.first_id(lookup, [None, 'missing', 'nogroup']), 65534)
+        self.assertEqual(webhdfs_ids.first_id(lookup, ['missing'], default=7), 7)
+
+
+class LoadMapFileTest(unittest.TestCase):
+
+    def write(self, text):
+        f = tempfile.NamedTemporaryFile('w', suffix='.ids', delete=False)
+        self.addCleanup(os.unlink, f.name)
+        with f:
+            f.write(text)
+        return f.name
+
+    def test_load(self):
+        path = self.write("# kind  HDFS name   local id\n"
+                          "user    hive        1005\n"
+                          "\n"
+                          "user    spark/etl   1006  # the ETL jobs\n"
+                          "group   hadoop      1000\n")
+        self.assertEqual(webhdfs_ids.load_map_file(path),
+                         ({'hive': 1005, 'spark/etl': 1006}, {'hadoop': 1000}))
+
+    def test_invalid_lines(self):
+        for line in ("user hive\n", "owner hive 1005\n", "user hive -1\n",
+                     "group hadoop 1000 extra\n"):
+            path = self.write("user hdfs 1001\n" + line)
+            with self.assertRaises(ValueError) as cm:
+                webhdfs_ids.load_map_file(path)
+            self.assertIn('{}:2:'.format(path), str(cm.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
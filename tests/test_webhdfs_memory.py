@@ -0,0 +1,105 @@
+"""
+Tests of the memory budget shared by the caches and buffers of a mount
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import webhdfs_memory  # noqa: E402
+import webhdfs_stats  # noqa: E402
+
+
+class Consumer(object):
+    """
+    A consumer holding used bytes, of which it can give back up to spare
+    """
+
+    def __init__(self, used, spare=0):
+        self.used = used
+        self.spare = spare
+        self.asked = []
+
+    def usage(self):
+        return self.used
+
+    def reclaim(self, nbytes):
+        self.asked.append(nbytes)
+        freed = min(nbytes, self.spare)
+        self.used -= freed
+        self.spare -= freed
+        return freed
+
+
+class MemoryGovernorTest(unittest.TestCase):
+
+    def governor(self, budget, **consumers):
+        memory = webhdfs_memory.MemoryGovernor(budget, webhdfs_stats.Stats())
+        for name in ('metadata', 'read', 'write'):
+            if name in consumers:
+                memory.register(name, consumers[name].usage, consumers[name].reclaim)
+        return memory
+
+    def test_no_budget(self):
+        read = Consumer(10 ** 9, spare=10 ** 9)
+        memory = self.governor(0, read=read)
+        self.assertTrue(memory.fits(10 ** 12))
+        self.assertTrue(memory.reserve(10 ** 12))
+        self.assertEqual(read.asked, [])
+
+    def test_usage(self):
+        memory = self.governor(1000, metadata=Consumer(100), read=Consumer(200))
+        self.assertEqual(memory.usage(), {'metadata': 100, 'read': 200})
+        self.assertEqual(memory.used(), 300)
+        self.assertTrue(memory.fits(700))
+        self.assertFalse(memory.fits(701))
+
+    def test_reserve_within_budget(self):
+        metadata = Consumer(100, spare=100)
+        memory = self.governor(1000, metadata=metadata)
+        self.assertTrue(memory.reserve(900, 'read'))
+        self.assertEqual(metadata.asked, [])
+
+    def test_reclaims_in_registration_order(self):
+        metadata, read = Consumer(300, spare=100), Consumer(500, spare=500)
+        memory = self.governor(1000, metadata=metadata, read=read)
+        self.assertTrue(memory.reserve(400, 'write'))
+        self.assertEqual(metadata.asked, [200])
+        self.assertEqual(read.asked, [100])
+        self.assertEqual(memory.used(), 600)
+
+    def test_requester_not_reclaimed(self):
+        metadata, read = Consumer(100, spare=100), Consumer(800, spare=800)
+        memory = self.governor(1000, metadata=metadata, read=read)
+        self.assertFalse(memory.reserve(500, 'read'))
+        self.assertEqual(metadata.asked, [400])
+        self.assertEqual(read.asked, [])
+
+    def test_reserve_without_consumer_reclaims_from_all(self):
+        metadata, read = Consumer(700, spare=300), Consumer(500, spare=0)
+        memory = self.governor(1000, metadata=metadata, read=read)
+        self.assertTrue(memory.reserve(0))
+        self.assertEqual(metadata.used, 500)
+        self.assertEqual(read.asked, [])
+
+    def test_consumer_without_reclaim(self):
+        memory = webhdfs_memory.MemoryGovernor(1000)
+        memory.register('fixed', lambda: 900)
+        self.assertFalse(memory.reserve(200, 'read'))
+        self.assertTrue(memory.reserve(100, 'read'))
+
+    def test_metrics(self):
+        metadata, read = Consumer(300, spare=100), Consumer(500, spare=0)
+        memory = self.governor(1000, metadata=metadata, read=read)
+        self.assertFalse(memory.reserve(400, 'write'))
+        metrics = memory.stats.render()
+        self.assertIn('webhdfs_memory_budget_bytes 1000\n', metrics)
+        self.assertIn('webhdfs_memory_bytes{consumer="metadata"} 200\n', metrics)
+        self.assertIn('webhdfs_memory_bytes{consumer="read"} 500\n', metrics)
+        self.assertIn('webhdfs_memory_reclaimed_bytes_total{consumer="metadata"} 100\n', metrics)
+        self.assertIn('webhdfs_memory_refused_total{consumer="write"} 1\n', metrics)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+Tests of the profiling toggled by a signal
+"""
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import tracemalloc
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import webhdfs_profile  # noqa: E402
+
+
+class ProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='webhdfs-profile-')
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_report_written_off_the_handler(self):
+        profiler = webhdfs_profile.Profiler(self.directory, lambda: 'webhdfs_up 1\n')
+        previous = signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+        self.addCleanup(signal.signal, signal.SIGUSR1, previous)
+        profiler.install()
+        os.kill(os.getpid(), signal.SIGUSR1)
+        sum(range(100000))
+        os.kill(os.getpid(), signal.SIGUSR1)
+        # the handler only started the thread writing the report
+        writer = profiler._writer
+        writer.join(30)
+        self.assertFalse(writer.is_alive())
+        reports = os.listdir(self.directory)
+        self.assertEqual(len(reports), 1)
+        with open(os.path.join(self.directory, reports[0])) as f:
+            report = f.read()
+        self.assertIn('## CPU time by function', report)
+        self.assertIn('webhdfs_up 1', report)
+
+    def test_report_not_written_through_symlink(self):
+        target = os.path.join(self.directory, 'target')
+        with open(target, 'w') as f:
+            f.write('kept')
+        profiler = webhdfs_profile.Profiler(self.directory)
+        profiler.start()
+        profiler._profile.disable()
+        with mock.patch.object(webhdfs_profile.time, 'strftime', return_value='20260101-000000'):
+            os.symlink(target, os.path.join(self.directory, 'webhdfs-profile-{}-20260101-000000.txt'
+                                            .format(os.getpid())))
+            with self.assertLogs('Webhdfs', 'ERROR'):
+                self.assertIsNone(profiler.write_report(profiler._profile, 1.0))
+            with open(target) as f:
+                self.assertEqual(f.read(), 'kept')
+            os.unlink(os.path.join(self.directory, 'webhdfs-profile-{}-20260101-000000.txt'
+                                   .format(os.getpid())))
+            tracemalloc.start()
+            path = profiler.write_report(profiler._profile, 1.0)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+
+    def test_not_restarted_while_writing(self):
+        profiler = webhdfs_profile.Profiler(self.directory)
+        self.addCleanup(tracemalloc.stop)
+        release = threading.Event()
+        profiler.write_report = lambda profile, seconds: release.wait(30)
+        profiler.toggle()
+        writer = profiler.stop()
+        profiler.toggle()
+        self.assertIsNone(profiler._profile)
+        release.set()
+        writer.join(30)
+        profiler.toggle()
+        self.assertIsNotNone(profiler._profile)
+        profiler.stop().join(30)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Tests of the get, put and cp transfers of webhdfs.py against the fake
+WebHDFS server of the benchmarks
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.join(BASE_DIR, 'benchmarks'))
+
+import webhdfs_transfer  # noqa: E402
+from fake_webhdfs import FakeWebHdfs  # noqa: E402
+from pywebhdfs.webhdfs import PyWebHdfsClient  # noqa: E402
+
+
+class TransferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeWebHdfs().start()
+        self.addCleanup(self.server.stop)
+        self.client = PyWebHdfsClient(base_uri_pattern=self.server.base_uri)
+        self.local = tempfile.mkdtemp(prefix='webhdfs-transfer-')
+        self.addCleanup(shutil.rmtree, self.local)
+        patcher = mock.patch.object(webhdfs_transfer.Progress, 'report')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_local(self, rel, data):
+        path = os.path.join(self.local, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_put_tree(self):
+        self.write_local('src/a', b'a' * 100)
+        self.write_local('src/sub/b', b'b' * 5000)
+        self.assertEqual(webhdfs_transfer.put(self.client, os.path.join(self.local, 'src'), '/dst',
+                                              workers=2), 0)
+        self.assertEqual(self.client.read_file('/dst/a'), b'a' * 100)
+        self.assertEqual(self.client.read_file('/dst/sub/b'), b'b' * 5000)
+
+    def test_put_large_file_in_parts(self):
+        path = self.write_local('big', bytes(range(256)) * 64)
+        with mock.patch.object(webhdfs_transfer, 'MULTIPART_THRESHOLD', 4096):
+            self.assertEqual(webhdfs_transfer.put(self.client, path, '/big'), 0)
+            # replaced on the next transfer
+            self.write_local('big', b'new' * 2000)
+            self.assertEqual(webhdfs_transfer.put(self.client, path, '/big'), 0)
+        self.assertEqual(self.client.read_file('/big'), b'new' * 2000)
+
+    def test_put_skip_unchanged(self):
+        path = self.write_local('f', b'data')
+        webhdfs_transfer.put(self.client, path, '/f')
+        self.server.requests.clear()
+        self.assertEqual(webhdfs_transfer.put(self.client, path, '/f', skip_unchanged=True), 0)
+        self.assertEqual(self.server.requests['CREATE'], 0)
+
+    def test_get_tree(self):
+        self.server.add_file('/src/a', b'a' * 100)
+        self.server.add_file('/src/sub/b', b'')
+        local = os.path.join(self.local, 'dst')
+        self.assertEqual(webhdfs_transfer.get(self.client, '/src', local), 0)
+        with open(os.path.join(local, 'a'), 'rb') as f:
+            self.assertEqual(f.read(), b'a' * 100)
+        self.assertEqual(os.path.getsize(os.path.join(local, 'sub', 'b')), 0)
+
+    def test_copy_into_directory(self):
+        self.server.add_file('/src/a', b'a' * 100)
+        self.server.mkdirs('/dst')
+        self.assertEqual(webhdfs_transfer.copy(self.client, '/src/a', '/dst'), 0)
+        self.assertEqual(self.client.read_file('/dst/a'), b'a' * 100)
+
+    def test_copy_tree_counts_failures(self):
+        self.server.add_file('/src/a', b'a' * 100)
+        self.server.add_file('/src/b', b'b' * 100)
+        copy_file = self.client.copy_file
+
+        def fail_b(path, destination_path, **kwargs):
+            if path.endswith('/b'):
+                raise webhdfs_transfer.pywebhdfs.errors.PyWebHdfsException(msg='DataNode down')
+            return copy_file(path, destination_path, **kwargs)
+        with mock.patch.object(self.client, 'copy_file', side_effect=fail_b):
+            self.assertEqual(webhdfs_transfer.copy(self.client, '/src', '/dst'), 1)
+        self.assertEqual(self.client.read_file('/dst/a'), b'a' * 100)
+        self.assertFalse(self.client.exists_file_dir('/dst/b'))
+
+
+if __name__ == '__main__':
+    unittest.main()
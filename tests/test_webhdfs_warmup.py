@@ -0,0 +1,95 @@
+"""
+Tests of the recording of mount accesses and of their replay
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import webhdfs_warmup  # noqa: E402
+from webhdfs_warmup import LISTDIR, READ, STAT  # noqa: E402
+
+
+class AccessTraceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='webhdfs-warmup-')
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'trace.jsonl')
+
+    def test_records_once(self):
+        trace = webhdfs_warmup.AccessTrace(self.path)
+        trace.listdir('/d')
+        trace.stat('/d/f')
+        trace.stat('/d/f')
+        trace.listdir('/d')
+        trace.close()
+        self.assertEqual(webhdfs_warmup.load(self.path), [[LISTDIR, '/d'], [STAT, '/d/f']])
+
+    def test_consecutive_reads_merged(self):
+        trace = webhdfs_warmup.AccessTrace(self.path)
+        for offset in range(0, 4096, 1024):
+            trace.read('/f', offset, 1024)
+        trace.read('/f', 100000, 10)
+        trace.release('/f')
+        trace.read('/g', 0, 10)
+        trace.close()
+        self.assertEqual(webhdfs_warmup.load(self.path),
+                         [[READ, '/f', 0, 4096], [READ, '/f', 100000, 10], [READ, '/g', 0, 10]])
+
+    def test_previous_trace_kept_until_closed(self):
+        with open(self.path, 'w') as f:
+            f.write('["S", "/old"]\n')
+        trace = webhdfs_warmup.AccessTrace(self.path)
+        trace.stat('/new')
+        self.assertEqual(webhdfs_warmup.load(self.path), [[STAT, '/old']])
+        trace.close()
+        self.assertEqual(webhdfs_warmup.load(self.path), [[STAT, '/new']])
+        # nothing recorded: the trace is left alone
+        webhdfs_warmup.AccessTrace(self.path).close()
+        self.assertEqual(webhdfs_warmup.load(self.path), [[STAT, '/new']])
+
+    def test_max_seen(self):
+        trace = webhdfs_warmup.AccessTrace(self.path, max_seen=2)
+        for path in ('/a', '/b', '/a', '/c', '/a', '/b'):
+            trace.stat(path)
+        self.assertEqual(trace.memory(), 2 * webhdfs_warmup.SEEN_ENTRY_BYTES)
+        trace.close()
+        # /b, the least recent, was forgotten once /c was recorded
+        self.assertEqual([path for op, path in webhdfs_warmup.load(self.path)],
+                         ['/a', '/b', '/c', '/b'])
+
+    def test_reclaim(self):
+        trace = webhdfs_warmup.AccessTrace(self.path)
+        for i in range(10):
+            trace.stat('/f{}'.format(i))
+        self.assertEqual(trace.reclaim(3 * webhdfs_warmup.SEEN_ENTRY_BYTES),
+                         3 * webhdfs_warmup.SEEN_ENTRY_BYTES)
+        self.assertEqual(trace.memory(), 7 * webhdfs_warmup.SEEN_ENTRY_BYTES)
+        trace.stat('/f0')
+        trace.stat('/f9')
+        trace.close()
+        self.assertEqual([path for op, path in webhdfs_warmup.load(self.path)][10:], ['/f0'])
+
+
+class ReplayTest(unittest.TestCase):
+
+    def test_replay_local(self):
+        root = tempfile.mkdtemp(prefix='webhdfs-warmup-')
+        self.addCleanup(shutil.rmtree, root)
+        os.mkdir(os.path.join(root, 'd'))
+        with open(os.path.join(root, 'd', 'f'), 'wb') as f:
+            f.write(bytes(3 * webhdfs_warmup.CHUNK_SIZE))
+        records = [[LISTDIR, '/d'], [STAT, '/d/f'], [READ, '/d/f', 10, 2 * webhdfs_warmup.CHUNK_SIZE],
+                   [READ, '/d/f', 0, 10 * webhdfs_warmup.CHUNK_SIZE], [STAT, '/d/gone']]
+        self.assertEqual(webhdfs_warmup.replay(records, root=root, workers=2), 1)
+
+    def test_load_missing(self):
+        self.assertEqual(webhdfs_warmup.load('/nonexistent/trace.jsonl'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,23 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import getpass
+import logging
 import pwd
 import grp
+from multiprocessing.connection import AuthenticationError
 from netrc import netrc, NetrcParseError
+from pywebhdfs.auth import AUTH_COOKIES, SessionCookieAuth
+from pywebhdfs.errors import PyWebHdfsException
+from pywebhdfs.scheduling import DATA, METADATA, RequestScheduler
 from pywebhdfs.webhdfs import PyWebHdfsClient
+from pywebhdfs.tracing import JsonLinesSampler
 from stat import S_IFDIR, S_IFLNK, S_IFREG
 from time import time
 import datetime
 import configparser
+import webhdfs_ids
 
 cfg = configparser.ConfigParser()
 def write_default_config():
@@ -57,35 +65,90 @@ def get_auth():
             password = getpass.getpass(prompt="HDFS Password: ")
     return (username.lower(), password)
 
-uid_cache = dict()
-def owner_to_uid(owner):
-    if owner in uid_cache:
-        return uid_cache[owner]
-    try:
-        uid_cache[owner] = pwd.getpwnam(owner)[2]
-        return pwd.getpwnam(owner)[2]
-    except KeyError:
-        res = pwd.getpwnam('nobody')[2] or 0
-        uid_cache[owner] = res
-        return res
-
-gid_cache = dict()
-def group_to_gid(group):
-    if group in gid_cache:
-        return gid_cache[group]
-    for g in [group, 'nogroup', 'nobody']:
+def _getpwnam(name):
+    return pwd.getpwnam(name).pw_uid
+
+def _getgrnam(name):
+    return grp.getgrnam(name).gr_gid
+
+# HDFS owners and groups are mapped to local ids by an optional static table,
+# then by the user and group databases (unless id_nss_lookup is off), and
+# else to default_uid and default_gid
+if cfg['DEFAULT'].get('ID_MAP_FILE'):
+    _static_uids, _static_gids = webhdfs_ids.load_map_file(
+        os.path.expanduser(cfg['DEFAULT']['ID_MAP_FILE']))
+else:
+    _static_uids, _static_gids = {}, {}
+_nss_lookup = cfg['DEFAULT'].getboolean('ID_NSS_LOOKUP', True)
+owner_to_uid = webhdfs_ids.IdMap(
+    _getpwnam if _nss_lookup else None,
+    webhdfs_ids.first_id(_getpwnam, [cfg['DEFAULT'].get('DEFAULT_UID', 'nobody')]),
+    static=_static_uids,
+    size=cfg['DEFAULT'].getint('ID_CACHE_SIZE', 65536),
+    negative_seconds=cfg['DEFAULT'].getfloat('ID_NEGATIVE_SECONDS', 600))
+group_to_gid = webhdfs_ids.IdMap(
+    _getgrnam if _nss_lookup else None,
+    webhdfs_ids.first_id(_getgrnam, [cfg['DEFAULT'].get('DEFAULT_GID'), 'nogroup', 'nobody']),
+    static=_static_gids,
+    size=cfg['DEFAULT'].getint('ID_CACHE_SIZE', 65536),
+    negative_seconds=cfg['DEFAULT'].getfloat('ID_NEGATIVE_SECONDS', 600))
+
+def preload_ids():
+    """
+    Cache the ids of all the users and groups the system databases enumerate
+    """
+    if not _nss_lookup:
+        return
+    start = time()
+    users = owner_to_uid.preload((p.pw_name, p.pw_uid) for p in pwd.getpwall())
+    groups = group_to_gid.preload((g.gr_name, g.gr_gid) for g in grp.getgrall())
+    logging.getLogger('Webhdfs').info("Preloaded %d users and %d groups in %.1f s",
+                                      users, groups, time() - start)
+
+def webhdfs_connect(pool_size=None, use_daemon=True):
+    """
+    Return a PyWebHdfsClient for the configured cluster, keeping up to
+    pool_size connections open for concurrent use, or a client of the cache
+    daemon (webhdfs_daemon.py) when cache_daemon_socket is set and it runs
+    """
+    socket_path = cfg['DEFAULT'].get('CACHE_DAEMON_SOCKET')
+    if use_daemon and socket_path:
+        import webhdfs_daemon
         try:
-            gid_cache[group] = grp.getgrnam(g)[2]
-            return grp.getgrnam(g)[2]
-        except KeyError:
-            pass
-    gid_cache[group] = 0
-    return 0
-
-def webhdfs_connect():
+            return webhdfs_daemon.DaemonClient(os.path.expanduser(socket_path))
+        except (OSError, EOFError, AuthenticationError, PyWebHdfsException) as e:
+            logging.getLogger('Webhdfs').warning("Cache daemon not available (%s), connecting directly", e)
+    username, password = get_auth()
+    # while one of these session cookies is sent, the credentials are not
+    cookies = [c.strip() for c in cfg['DEFAULT'].get('AUTH_COOKIES', ','.join(AUTH_COOKIES)).split(',')
+               if c.strip()]
+    auth = SessionCookieAuth(username, password, cookies) if cookies else (username, password)
+    # requests running at once, shared by metadata and data requests according to
+    # metadata_request_weight, at most data_request_slots of them data requests,
+    # and requests sent to the NameNode per second (0: no limit)
+    slots = cfg['DEFAULT'].getint('REQUEST_SLOTS', 0)
+    data_slots = cfg['DEFAULT'].getint('DATA_REQUEST_SLOTS', 0)
+    namenode_qps = cfg['DEFAULT'].getfloat('NAMENODE_QPS', 0)
+    scheduler = None
+    if slots or data_slots or namenode_qps:
+        scheduler = RequestScheduler(slots=slots, limits={DATA: data_slots},
+                                     weights={METADATA: cfg['DEFAULT'].getfloat('METADATA_REQUEST_WEIGHT', 4)},
+                                     namenode_qps=namenode_qps)
+    # connections are only timed for the traces written to request_trace_file
     webhdfs = PyWebHdfsClient(base_uri_pattern=cfg['DEFAULT']['HDFS_BASEURL'],
                               request_extra_opts={'verify': cfg['DEFAULT'].get('HDFS_CERT', None),
-                                                  'auth': get_auth()})
+                                                  'auth': auth},
+                              scheduler=scheduler,
+                              time_connections=bool(cfg['DEFAULT'].get('REQUEST_TRACE_FILE')))
+    if pool_size:
+        webhdfs.mount_adapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    if cfg['DEFAULT'].get('REQUEST_TRACE_FILE'):
+        webhdfs.request_hooks.append(
+            JsonLinesSampler(os.path.expanduser(cfg['DEFAULT']['REQUEST_TRACE_FILE']),
+                             rate=cfg['DEFAULT'].getfloat('REQUEST_TRACE_RATE', 1.0),
+                             slow=cfg['DEFAULT'].getfloat('REQUEST_TRACE_SLOW_SECONDS', None)))
+    if cfg['DEFAULT'].getboolean('DELEGATION_TOKEN', False):
+        webhdfs.use_delegation_token(renewer=cfg['DEFAULT'].get('DELEGATION_TOKEN_RENEWER'))
     return webhdfs
 
 def webhdfs_entry_to_dict(s):
@@ -111,13 +174,83 @@ def webhdfs_entry_to_dict(s):
               st_blksize=blksize)
     return sd
 
+def main(argv=None):
+    import argparse
+    import webhdfs_transfer
+
+    parser = argparse.ArgumentParser(description="WebHDFS command line client")
+    sub = parser.add_subparsers(dest='command')
+    ls = sub.add_parser('ls', help="list an HDFS directory")
+    ls.add_argument('path', nargs='?', default='/')
+    for name, src, dst, help in (('get', 'remote', 'local', "download files from HDFS"),
+                                 ('put', 'local', 'remote', "upload files to HDFS"),
+                                 ('sync', 'local', 'remote', "upload (or with --download, download) "
+                                                             "only the files that changed"),
+                                 ('cp', 'remote', 'destination', "copy files within HDFS")):
+        cmd = sub.add_parser(name, help=help)
+        cmd.add_argument(src)
+        cmd.add_argument(dst)
+        cmd.add_argument('-j', '--workers', type=int, default=8,
+                         help="number of files transferred concurrently (def: 8)")
+        if name == 'sync':
+            cmd.add_argument('--download', action='store_true',
+                             help="copy from HDFS to the local directory instead")
+        else:
+            cmd.add_argument('--skip-unchanged', action='store_true',
+                             help="skip files with the same size and a newer copy at the destination")
+    warmup = sub.add_parser('warmup', help="replay the accesses recorded by a mount to warm up caches")
+    warmup.add_argument('trace', nargs='?', default=cfg['DEFAULT'].get('ACCESS_TRACE_FILE'),
+                        help="access trace file (def: access_trace_file)")
+    warmup.add_argument('--mountpoint',
+                        help="replay through this mount point instead of the cache daemon")
+    warmup.add_argument('-j', '--workers', type=int, default=8,
+                        help="number of accesses replayed concurrently (def: 8)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command in (None, 'ls'):
+        webhdfs = webhdfs_connect()
+        for s in webhdfs.stream_dir(getattr(args, 'path', '/')):
+            sd = webhdfs_entry_to_dict(s)
+            print("{:16}\t{:6}\t{:16}\t{:16}\t{}\t{:9}\t{}"
+                  .format(sd['st_mode'], sd['st_nlink'], sd['st_uid'],
+                          sd['st_gid'], sd['st_blocks'],
+                          datetime.datetime.fromtimestamp(sd['st_mtime']).strftime('%Y-%m-%d %H:%M'),
+                          sd['name']))
+        return 0
+
+    if args.command == 'warmup':
+        import webhdfs_daemon
+        import webhdfs_warmup
+
+        if not args.trace:
+            parser.error("no access trace file given, and access_trace_file is not set")
+        records = webhdfs_warmup.load(os.path.expanduser(args.trace))
+        # paths looked up but missing are recorded too, so failed accesses are expected
+        if args.mountpoint:
+            webhdfs_warmup.replay(records, root=args.mountpoint, workers=args.workers)
+            return 0
+        webhdfs = webhdfs_connect(pool_size=args.workers)
+        if not isinstance(webhdfs, webhdfs_daemon.DaemonClient):
+            logging.error("Without --mountpoint, the trace is replayed into the cache daemon, "
+                          "which is not running")
+            return 1
+        webhdfs_warmup.replay(records, client=webhdfs, workers=args.workers)
+        return 0
+
+    webhdfs = webhdfs_connect(pool_size=args.workers)
+    if args.command == 'get':
+        failed = webhdfs_transfer.get(webhdfs, args.remote, args.local, args.workers, args.skip_unchanged)
+    elif args.command == 'put':
+        failed = webhdfs_transfer.put(webhdfs, args.local, args.remote, args.workers, args.skip_unchanged)
+    elif args.command == 'cp':
+        failed = webhdfs_transfer.copy(webhdfs, args.remote, args.destination, args.workers,
+                                       args.skip_unchanged)
+    elif args.download:
+        failed = webhdfs_transfer.get(webhdfs, args.remote, args.local, args.workers, skip_unchanged=True)
+    else:
+        failed = webhdfs_transfer.put(webhdfs, args.local, args.remote, args.workers, skip_unchanged=True)
+    return 1 if failed else 0
+
 if __name__ == '__main__':
-    webhdfs = webhdfs_connect()
-    now = time()
-    for s in webhdfs.list_dir('/')["FileStatuses"]["FileStatus"]:
-        sd = webhdfs_entry_to_dict(s)
-        print("{:16}\t{:6}\t{:16}\t{:16}\t{}\t{:9}\t{}"
-              .format(sd['st_mode'], sd['st_nlink'], sd['st_uid'],
-                      sd['st_gid'], sd['st_blocks'],
-                      datetime.datetime.fromtimestamp(sd['st_mtime'] / 1000).strftime('%Y-%m-%d %H:%M'),
-                      sd['name']))
+    sys.exit(main())
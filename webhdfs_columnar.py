@@ -0,0 +1,217 @@
+"""
+Byte ranges of the column data of Parquet and ORC files, read from their
+footers
+
+Parquet and ORC readers start with the footer at the end of the file, then
+read the column chunks (Parquet) or stripes (ORC) it points to. Knowing these
+ranges, the mount fetches a whole chunk, or a run of small neighbouring ones,
+with the first read that falls into it, instead of one request per read.
+
+The footers are decoded with minimal Thrift compact protocol (Parquet) and
+protobuf (ORC) readers, without the format libraries. ORC footers compressed
+with anything else than zlib are not decoded.
+"""
+import struct
+import zlib
+
+PARQUET_MAGIC = b'PAR1'
+ORC_MAGIC = b'ORC'
+
+# Thrift compact protocol types
+_BOOL_TRUE, _BOOL_FALSE, _BYTE, _I16, _I32, _I64, _DOUBLE, _BINARY, \
+    _LIST, _SET, _MAP, _STRUCT = range(1, 13)
+_ORC_NONE, _ORC_ZLIB = 0, 1
+
+
+def footer_length(tail):
+    """
+    Return the number of bytes at the end of a Parquet or ORC file whose last
+    bytes are tail that are needed to decode its footer, or None if it is
+    neither
+    """
+    # the Parquet footer length and the ORC postscript are in the last 256 bytes
+    tail = bytes(memoryview(tail)[-256:])
+    if tail.endswith(PARQUET_MAGIC) and len(tail) >= 8:
+        return 8 + struct.unpack('<I', tail[-8:-4])[0]
+    if len(tail) >= 1 and len(tail) >= 1 + tail[-1]:
+        try:
+            postscript = _protobuf(tail[-1 - tail[-1]:-1])
+        except (ValueError, IndexError):
+            return None
+        if postscript.get(8000, [b''])[0] == ORC_MAGIC:
+            return 1 + tail[-1] + postscript.get(1, [0])[0]
+    return None
+
+
+def column_ranges(tail):
+    """
+    Return the sorted (start, end) byte ranges of the column chunks or
+    stripes of a file ending with tail, which holds at least footer_length
+    bytes; an empty list if they cannot be decoded
+    """
+    tail = bytes(tail)
+    try:
+        if tail.endswith(PARQUET_MAGIC):
+            return _parquet_ranges(tail)
+        return _orc_ranges(tail)
+    except (ValueError, IndexError, KeyError, TypeError, struct.error, zlib.error):
+        return []
+
+
+def coalesce(ranges, max_gap=8 * 1024, max_size=1024 * 1024):
+    """
+    Merge ranges separated by at most max_gap bytes, as long as the merged
+    range stays below max_size; larger ranges are left alone
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start - merged[-1][1] <= max_gap and \
+                max(end, merged[-1][1]) - merged[-1][0] <= max_size:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _parquet_ranges(tail):
+    length = struct.unpack('<I', tail[-8:-4])[0]
+    meta, _ = _thrift_struct(tail, len(tail) - 8 - length)
+    ranges = []
+    # FileMetaData.row_groups, RowGroup.columns, ColumnChunk.meta_data
+    for row_group in meta.get(4, ()):
+        for chunk in row_group.get(1, ()):
+            column = chunk.get(3)
+            if column is None:
+                continue
+            # data, index and dictionary page offsets, total_compressed_size
+            start = min(column[i] for i in (9, 10, 11) if column.get(i, 0) > 0)
+            ranges.append((start, start + column[7]))
+    return sorted(ranges)
+
+
+def _orc_ranges(tail):
+    ps_length = tail[-1]
+    postscript = _protobuf(tail[-1 - ps_length:-1])
+    end = len(tail) - 1 - ps_length
+    footer = tail[end - postscript[1][0]:end]
+    compression = postscript.get(2, [_ORC_NONE])[0]
+    if compression == _ORC_ZLIB:
+        footer = _orc_inflate(footer)
+    elif compression != _ORC_NONE:
+        return []
+    ranges = []
+    # Footer.stripes: offset, indexLength, dataLength, footerLength
+    for stripe in _protobuf(footer).get(3, ()):
+        fields = _protobuf(stripe)
+        start = fields[1][0]
+        ranges.append((start, start + sum(fields.get(i, [0])[0] for i in (2, 3, 4))))
+    return sorted(ranges)
+
+
+def _orc_inflate(data):
+    chunks, pos = [], 0
+    while pos < len(data):
+        header = data[pos] | data[pos + 1] << 8 | data[pos + 2] << 16
+        chunk = data[pos + 3:pos + 3 + (header >> 1)]
+        chunks.append(chunk if header & 1 else zlib.decompress(chunk, -15))
+        pos += 3 + (header >> 1)
+    return b''.join(chunks)
+
+
+def _varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _zigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def _protobuf(data):
+    """
+    Decode a protobuf message as {field number: [values]}, leaving
+    length-delimited values as bytes
+    """
+    fields, pos = {}, 0
+    while pos < len(data):
+        key, pos = _varint(data, pos)
+        wire_type = key & 7
+        if wire_type == 0:
+            value, pos = _varint(data, pos)
+        elif wire_type == 1:
+            value, pos = data[pos:pos + 8], pos + 8
+        elif wire_type == 2:
+            length, pos = _varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        elif wire_type == 5:
+            value, pos = data[pos:pos + 4], pos + 4
+        else:
+            raise ValueError("Unsupported protobuf wire type {}".format(wire_type))
+        fields.setdefault(key >> 3, []).append(value)
+    return fields
+
+
+def _thrift_struct(data, pos):
+    """
+    Decode a Thrift compact protocol struct as {field id: value}
+    """
+    fields, last = {}, 0
+    while True:
+        header = data[pos]
+        pos += 1
+        if header == 0:
+            return fields, pos
+        if header >> 4:
+            last += header >> 4
+        else:
+            value, pos = _varint(data, pos)
+            last = _zigzag(value)
+        fields[last], pos = _thrift_value(data, pos, header & 0x0f)
+
+
+def _thrift_value(data, pos, type):
+    if type in (_BOOL_TRUE, _BOOL_FALSE):
+        return type == _BOOL_TRUE, pos
+    if type == _BYTE:
+        return data[pos], pos + 1
+    if type in (_I16, _I32, _I64):
+        value, pos = _varint(data, pos)
+        return _zigzag(value), pos
+    if type == _DOUBLE:
+        return struct.unpack('<d', data[pos:pos + 8])[0], pos + 8
+    if type == _BINARY:
+        length, pos = _varint(data, pos)
+        return data[pos:pos + length], pos + length
+    if type in (_LIST, _SET):
+        header = data[pos]
+        pos += 1
+        size, item_type = header >> 4, header & 0x0f
+        if size == 15:
+            size, pos = _varint(data, pos)
+        items = []
+        for _ in range(size):
+            if item_type in (_BOOL_TRUE, _BOOL_FALSE):
+                item, pos = data[pos] == _BOOL_TRUE, pos + 1
+            else:
+                item, pos = _thrift_value(data, pos, item_type)
+            items.append(item)
+        return items, pos
+    if type == _MAP:
+        size, pos = _varint(data, pos)
+        items = {}
+        if size:
+            types = data[pos]
+            pos += 1
+            for _ in range(size):
+                key, pos = _thrift_value(data, pos, types >> 4)
+                items[key], pos = _thrift_value(data, pos, types & 0x0f)
+        return items, pos
+    if type == _STRUCT:
+        return _thrift_struct(data, pos)
+    raise ValueError("Unsupported Thrift type {}".format(type))
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Local cache daemon shared by the mounts and command line clients of a user
+
+    python3 webhdfs_daemon.py
+
+The daemon owns the connections to WebHDFS, a metadata cache (file statuses
+and directory listings) and a block cache of file contents. When
+cache_daemon_socket is set in webhdfs.ini and the daemon is running, mounts
+and webhdfs.py send their requests to it instead of connecting themselves:
+what one of them fetched is served from memory to the others, and the
+changes made through any of them invalidate the cache for all of them.
+
+Requests are pickled over a Unix socket (multiprocessing.connection) only
+accessible to the user, and every connection is authenticated with the key
+stored next to the socket.
+"""
+import argparse
+import logging
+import os
+import posixpath
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from multiprocessing.connection import Client, Listener, AuthenticationError
+
+from pywebhdfs import errors
+
+logger = logging.getLogger('Webhdfs')
+
+BLOCK_SIZE = 1024 * 1024
+# file_data sent as byte messages following the request, ended by b''
+_STREAM = '<stream>'
+
+# PyWebHdfsClient methods that change nothing in HDFS
+_READ_ONLY = frozenset((
+    'get_file_dir_status', 'list_dir', 'read_file', 'read_file_into',
+    'stream_file_into', 'exists_file_dir', 'get_content_summary',
+    'get_file_checksum', 'get_xattr', 'list_xattrs'))
+# and those that do, invalidating the cache of their paths
+_MUTATING = frozenset((
+    'create_file', 'append_file', 'copy_file', 'make_dir', 'rename_file_dir',
+    'delete_file_dir', 'set_permission', 'set_owner', 'set_xattr',
+    'delete_xattr'))
+
+
+class CachingClient(object):
+    """
+    PyWebHdfsClient wrapper keeping statuses, listings and file blocks for
+    cache_seconds, and dropping them when they are changed through it
+
+    :param client: the PyWebHdfsClient sending the requests
+    :param cache_seconds: how long cached entries are used
+    :param cache_bytes: size of the block cache
+    :param block_size: size of the cached file blocks
+    :param stats: optional webhdfs_stats.Stats counting hits and misses
+    """
+
+    def __init__(self, client, cache_seconds=30, cache_bytes=256 * 1024 * 1024,
+                 block_size=BLOCK_SIZE, stats=None):
+        self.client = client
+        self.cache_seconds = cache_seconds
+        self.cache_bytes = cache_bytes
+        self.block_size = block_size
+        self.stats = stats
+        self._lock = threading.Lock()
+        # path -> (time, FileStatus response or FileNotFound)
+        self._statuses = {}
+        # path -> (time, LISTSTATUS response)
+        self._listings = {}
+        # (path, index) -> (time, bytes), in LRU order
+        self._blocks = OrderedDict()
+        self._block_bytes = 0
+
+    def get_file_dir_status(self, path):
+        path = _normpath(path)
+        entry = self._fresh(self._statuses, path, 'status')
+        if entry is None:
+            try:
+                entry = self.client.get_file_dir_status(path)
+            except errors.FileNotFound as e:
+                entry = e
+            with self._lock:
+                self._statuses[path] = (time.time(), entry)
+        if isinstance(entry, errors.FileNotFound):
+            raise entry
+        return entry
+
+    def list_dir(self, path):
+        path = _normpath(path)
+        listing = self._fresh(self._listings, path, 'listdir')
+        if listing is None:
+            listing = self.client.list_dir(path)
+            now = time.time()
+            with self._lock:
+                self._listings[path] = (now, listing)
+                for s in listing["FileStatuses"]["FileStatus"]:
+                    self._statuses[posixpath.join(path, s['pathSuffix'])] = (
+                        now, {"FileStatus": dict(s, pathSuffix='')})
+        return listing
+
+    def exists_file_dir(self, path):
+        try:
+            self.get_file_dir_status(path)
+            return True
+        except errors.FileNotFound:
+            return False
+
+    def read(self, path, offset, length):
+        """
+        Return length bytes of a file from offset, less at its end, from the
+        cached blocks and a single request for the missing ones
+        """
+        path = _normpath(path)
+        if length <= 0:
+            return b''
+        first = offset // self.block_size
+        last = (offset + length - 1) // self.block_size
+        blocks = [self._fresh(self._blocks, (path, i), 'block')
+                  for i in range(first, last + 1)]
+        missing = [i for i, block in enumerate(blocks) if block is None]
+        if missing:
+            start, end = missing[0], missing[-1] + 1
+            data = bytearray((end - start) * self.block_size)
+            n = self.client.read_file_into(path, data, offset=(first + start) * self.block_size)
+            now = time.time()
+            with self._lock:
+                for j in range(start, end):
+                    block = bytes(data[(j - start) * self.block_size:
+                                       min((j - start + 1) * self.block_size, n)])
+                    if blocks[j] is None:
+                        self._store_block((path, first + j), now, block)
+                    blocks[j] = block
+        data = b''.join(_until_short(blocks, self.block_size))
+        skip = offset - first * self.block_size
+        return data[skip:skip + length]
+
+    def read_file(self, path, offset=None, length=None, **kwargs):
+        if offset is None or length is None or kwargs:
+            kwargs.update((k, v) for k, v in (('offset', offset), ('length', length))
+                          if v is not None)
+            return self.client.read_file(path, **kwargs)
+        return self.read(path, int(offset), int(length))
+
+    def invalidate(self, path, recursive=False):
+        """
+        Forget everything cached about path, below it with recursive, and the
+        listing of its directory
+        """
+        path = _normpath(path)
+        prefix = path.rstrip('/') + '/'
+        with self._lock:
+            for cache in (self._statuses, self._listings):
+                cache.pop(path, None)
+                if recursive:
+                    for key in [k for k in cache if k.startswith(prefix)]:
+                        del cache[key]
+            self._listings.pop(posixpath.dirname(path), None)
+            for key in [k for k in self._blocks
+                        if k[0] == path or recursive and k[0].startswith(prefix)]:
+                self._block_bytes -= len(self._blocks.pop(key)[1])
+
+    def call(self, name, *args, **kwargs):
+        """
+        Call a PyWebHdfsClient method, through the cache when it has one
+        """
+        if hasattr(type(self), name):
+            return getattr(self, name)(*args, **kwargs)
+        try:
+            return getattr(self.client, name)(*args, **kwargs)
+        finally:
+            if name in _MUTATING:
+                recursive = name in ('rename_file_dir', 'delete_file_dir')
+                self.invalidate(args[0], recursive)
+                if name in ('rename_file_dir', 'copy_file'):
+                    self.invalidate(args[1], recursive)
+
+    def entries(self):
+        return len(self._statuses) + len(self._listings)
+
+    def _fresh(self, cache, key, name):
+        with self._lock:
+            entry = cache.get(key)
+            if entry is not None and time.time() - entry[0] < self.cache_seconds:
+                if cache is self._blocks:
+                    cache.move_to_end(key)
+                hit = True
+            else:
+                entry, hit = None, False
+        if self.stats is not None:
+            self.stats.inc('webhdfs_cache_hits_total' if hit else 'webhdfs_cache_misses_total',
+                           cache=name)
+        return entry[1] if hit else None
+
+    def _store_block(self, key, now, block):
+        old = self._blocks.pop(key, None)
+        if old is not None:
+            self._block_bytes -= len(old[1])
+        self._blocks[key] = (now, block)
+        self._block_bytes += len(block)
+        while self._block_bytes > self.cache_bytes and self._blocks:
+            self._block_bytes -= len(self._blocks.popitem(last=False)[1][1])
+
+
+class CacheDaemon(object):
+    """
+    Serves a CachingClient to DaemonClient connections, one thread each
+    """
+
+    def __init__(self, cache, address, authkey):
+        self.cache = cache
+        self.listener = Listener(address, family='AF_UNIX', authkey=authkey)
+        self._authkey = authkey
+        self._closed = False
+
+    def serve_forever(self):
+        logger.info("Cache daemon listening on %s", self.listener.address)
+        while True:
+            try:
+                conn = self.listener.accept()
+            except (AuthenticationError, EOFError, OSError) as e:
+                logger.warning("Refused a connection: %s", e)
+                continue
+            if self._closed:
+                conn.close()
+                break
+            threading.Thread(target=self._serve, args=(conn,),
+                             name='webhdfs-daemon-conn', daemon=True).start()
+        self.listener.close()
+
+    def close(self):
+        """
+        Make serve_forever stop listening, waking it up with a connection
+        """
+        self._closed = True
+        Client(self.listener.address, family='AF_UNIX', authkey=self._authkey).close()
+
+    def _serve(self, conn):
+        try:
+            while True:
+                name, args, kwargs = conn.recv()
+                self._handle(conn, name, args, kwargs)
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def _handle(self, conn, name, args, kwargs):
+        if name not in _READ_ONLY and name not in _MUTATING:
+            conn.send(('error', errors.MethodNotAllowed(
+                msg="{} is not available through the cache daemon".format(name))))
+        elif name == 'read_file_into':
+            path, length = args
+            try:
+                data = self.cache.read(path, kwargs.get('offset', 0), length)
+            except Exception as e:
+                conn.send(('error', _portable(e)))
+            else:
+                conn.send(('ok', len(data)))
+                conn.send_bytes(data)
+        elif name == 'stream_file_into':
+            path, size = args
+            try:
+                for chunk in self.cache.client.stream_file_into(path, bytearray(size), **kwargs):
+                    conn.send_bytes(chunk)
+                result = ('ok', None)
+            except errors.PyWebHdfsException as e:
+                result = ('error', _portable(e))
+            conn.send_bytes(b'')
+            conn.send(result)
+        else:
+            chunks = None
+            if len(args) > 1 and args[1] == _STREAM:
+                chunks = iter(conn.recv_bytes, b'')
+                args = (args[0], chunks) + tuple(args[2:])
+            try:
+                result = ('ok', self.cache.call(name, *args, **kwargs))
+            except Exception as e:
+                result = ('error', _portable(e))
+            if chunks is not None:
+                # the rest of a body whose upload failed
+                for _ in chunks:
+                    pass
+            conn.send(result)
+
+
+class DaemonClient(object):
+    """
+    Stand-in for PyWebHdfsClient forwarding its calls to the cache daemon
+
+    Every thread has its own connection to the daemon.
+    """
+
+    def __init__(self, address, authkey=None):
+        self.address = address
+        self.authkey = authkey if authkey is not None else read_key(address)
+        # requests are sent, traced and scheduled by the daemon
+        self.request_hooks = []
+        self.delegation_token = None
+        self.scheduler = None
+        self._local = threading.local()
+        self._connection()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return partial(self._call, name)
+
+    def read_file_into(self, path, buffer, offset=0):
+        view = memoryview(buffer).cast('B')
+        conn = self._send('read_file_into', (path, len(view)), dict(offset=offset))
+        self._result(conn)
+        return self._receive(conn.recv_bytes_into, view)
+
+    def stream_file_into(self, path, buffer, **kwargs):
+        view = memoryview(buffer).cast('B')
+        conn = self._send('stream_file_into', (path, len(view)), kwargs)
+        done = False
+        try:
+            while True:
+                nbytes = self._receive(conn.recv_bytes_into, view)
+                if not nbytes:
+                    break
+                yield view[:nbytes]
+            done = True
+            self._result(conn)
+        finally:
+            if not done:
+                # the rest of the stream is still on its way
+                self._close()
+
+    def stream_file(self, path, chunk_size=1024, **kwargs):
+        for chunk in self.stream_file_into(path, bytearray(chunk_size), **kwargs):
+            yield bytes(chunk)
+
+    def stream_dir(self, path, chunk_size=None):
+        for status in self.list_dir(path)["FileStatuses"]["FileStatus"]:
+            yield status
+
+    def create_file(self, path, file_data, **kwargs):
+        return self._upload('create_file', path, file_data, kwargs)
+
+    def append_file(self, path, file_data, **kwargs):
+        return self._upload('append_file', path, file_data, kwargs)
+
+    def create_file_multipart(self, path, file_data, part_size=None, workers=None, **kwargs):
+        """
+        Upload through the daemon in a single stream, as a file object cannot
+        be passed to it
+        """
+        if hasattr(file_data, 'read'):
+            file_data = iter(partial(file_data.read, BLOCK_SIZE), b'')
+        return self._upload('create_file', path, file_data, kwargs)
+
+    def _upload(self, name, path, file_data, kwargs):
+        if file_data is None or isinstance(file_data, (bytes, bytearray, str)):
+            return self._call(name, path, file_data, **kwargs)
+        conn = self._send(name, (path, _STREAM), kwargs)
+        try:
+            for chunk in file_data:
+                self._receive(conn.send_bytes, chunk)
+        except BaseException:
+            # the daemon aborts the upload when the connection is closed
+            self._close()
+            raise
+        self._receive(conn.send_bytes, b'')
+        return self._result(conn)
+
+    def _call(self, name, *args, **kwargs):
+        return self._result(self._send(name, args, kwargs))
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = Client(self.address, family='AF_UNIX',
+                                             authkey=self.authkey)
+        return conn
+
+    def _close(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            conn.close()
+
+    def _send(self, name, args, kwargs):
+        conn = self._connection()
+        self._receive(conn.send, (name, args, kwargs))
+        return conn
+
+    def _result(self, conn):
+        status, value = self._receive(conn.recv)
+        if status == 'error':
+            raise value
+        return value
+
+    def _receive(self, func, *args):
+        """
+        Call a method of the connection, which is dropped when it fails
+        """
+        try:
+            return func(*args)
+        except (EOFError, OSError) as e:
+            self._close()
+            raise errors.PyWebHdfsException(msg="Cache daemon connection lost: {}".format(e))
+
+
+def read_key(address):
+    with open(address + '.key', 'rb') as f:
+        return f.read()
+
+
+def _portable(e):
+    """
+    Return an exception that can be pickled and raised by the client
+    """
+    if isinstance(e, errors.PyWebHdfsException):
+        return e
+    return errors.PyWebHdfsException(msg="{}: {}".format(type(e).__name__, e))
+
+
+def _normpath(path):
+    return '/' + path.strip('/')
+
+
+def _until_short(blocks, block_size):
+    for block in blocks:
+        yield block
+        if len(block) < block_size:
+            break
+
+
+def main(argv=None):
+    import webhdfs
+    import webhdfs_stats
+
+    cfg = webhdfs.cfg['DEFAULT']
+    parser = argparse.ArgumentParser(description="WebHDFS cache daemon")
+    parser.add_argument('--socket', default=cfg.get('CACHE_DAEMON_SOCKET', '~/.cache/webhdfs/daemon.sock'),
+                        help="Unix socket to listen on (def: cache_daemon_socket of webhdfs.ini)")
+    parser.add_argument('--pool-size', type=int, default=16,
+                        help="connections kept open to WebHDFS (def: 16)")
+    parser.add_argument('--stats-port', type=int, default=cfg.getint('CACHE_DAEMON_STATS_PORT', 0),
+                        help="serve the metrics over HTTP on this local port")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    address = os.path.expanduser(args.socket)
+    os.makedirs(os.path.dirname(address), mode=0o700, exist_ok=True)
+    if os.path.exists(address):
+        try:
+            DaemonClient(address)
+            logger.error("A cache daemon is already listening on %s", address)
+            return 1
+        except (OSError, EOFError, AuthenticationError, errors.PyWebHdfsException):
+            os.unlink(address)
+    authkey = os.urandom(32)
+    old_umask = os.umask(0o077)
+    try:
+        with open(os.open(address + '.key', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+            f.write(authkey)
+        stats = webhdfs_stats.Stats()
+        cache = CachingClient(webhdfs.webhdfs_connect(pool_size=args.pool_size, use_daemon=False),
+                              cache_seconds=cfg.getfloat('CACHE_MAX_SECONDS', 30),
+                              cache_bytes=cfg.getint('CACHE_DAEMON_BLOCK_CACHE_BYTES', 256 * 1024 * 1024),
+                              stats=stats)
+        daemon = CacheDaemon(cache, address, authkey)
+    finally:
+        os.umask(old_umask)
+    cache.client.request_hooks.append(stats.request_hook)
+    if cache.client.scheduler is not None:
+        stats.scheduler_gauges(cache.client.scheduler)
+    stats.gauge('webhdfs_daemon_metadata_entries', cache.entries)
+    stats.gauge('webhdfs_daemon_block_cache_bytes', lambda: cache._block_bytes)
+    if args.stats_port:
+        stats.serve(args.stats_port)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.unlink(address)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Mapping of HDFS owners and groups to local uids and gids
+
+Names are mapped by a static table first and then, unless disabled, looked
+up in the user and group databases, whose NSS backends (LDAP, SSSD) may need
+a network round trip. Every answer is cached, names that were not found too,
+so a name costs at most one lookup per negative_seconds.
+
+The static table is read from a file with one mapping per line:
+
+    # kind  HDFS name   local id
+    user    hive        1005
+    user    spark/etl   1006
+    group   hadoop      1000
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('Webhdfs')
+
+
+class IdMap(object):
+    """
+    Thread-safe mapping of names to ids, with a bounded LRU cache
+
+    :param lookup: function returning the id of a name and raising KeyError
+      for unknown names, or None to map names by the static table only
+    :param default: id of the names that are not found
+    :param static: dict of names mapped without any lookup
+    :param size: number of names cached
+    :param negative_seconds: names that were not found are looked up again
+      after this many seconds
+
+    >>> owner_to_uid = IdMap(lambda name: pwd.getpwnam(name).pw_uid, 65534)
+    >>> owner_to_uid('hdfs')
+    """
+
+    def __init__(self, lookup, default, static=None, size=65536,
+                 negative_seconds=600):
+        self.lookup = lookup
+        self.default = default
+        self.static = dict(static or {})
+        self.size = size
+        self.negative_seconds = negative_seconds
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, name):
+        if name in self.static:
+            return self.static[name]
+        with self._lock:
+            entry = self._cache.get(name)
+            if entry is not None and (entry[1] is None or entry[1] > time.time()):
+                self._cache.move_to_end(name)
+                return entry[0]
+        # looked up without the lock, a slow lookup does not block the others
+        id, expires = self.default, time.time() + self.negative_seconds
+        if self.lookup is not None:
+            try:
+                id, expires = self.lookup(name), None
+            except KeyError:
+                logger.debug("No local id for %s, using %d", name, self.default)
+        self._store(name, id, expires)
+        return id
+
+    def __len__(self):
+        return len(self._cache)
+
+    def preload(self, entries):
+        """
+        Cache the ids of (name, id) pairs, e.g. of all the entries of pwd.getpwall()
+        """
+        count = 0
+        for name, id in entries:
+            self._store(name, id, None)
+            count += 1
+        return count
+
+    def _store(self, name, id, expires):
+        with self._lock:
+            self._cache[name] = (id, expires)
+            self._cache.move_to_end(name)
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+
+
+def first_id(lookup, names, default=0):
+    """
+    Return the id of the first of names that is a number or can be looked up
+    """
+    for name in names:
+        if name is None:
+            continue
+        if str(name).isdigit():
+            return int(name)
+        try:
+            return lookup(name)
+        except KeyError:
+            pass
+    return default
+
+
+def load_map_file(path):
+    """
+    Return the {name: uid} and {name: gid} mappings of a mapping file
+    """
+    users, groups = {}, {}
+    with open(path) as f:
+        for lineno, line in enumerate(f, 1):
+            fields = line.split('#', 1)[0].split()
+            if not fields:
+                continue
+            if (len(fields) != 3 or fields[0] not in ('user', 'group') or
+                    not fields[2].isdigit()):
+                raise ValueError("{}:{}: expected 'user|group NAME ID', got {!r}"
+                                 .format(path, lineno, line.strip()))
+            mapping = users if fields[0] == 'user' else groups
+            mapping[fields[1]] = int(fields[2])
+    return users, groups
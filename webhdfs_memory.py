@@ -0,0 +1,87 @@
+"""
+Memory budget shared by the caches and buffers of a mount
+
+Every consumer registers a function measuring the memory it holds and,
+optionally, one giving some of it back. Before allocating, a consumer
+reserves the bytes it needs: when they do not fit in the budget, the other
+consumers are asked to free memory in the order they registered, and the
+reservation fails if that was not enough, leaving the caller to make do
+with less.
+"""
+import logging
+import threading
+
+logger = logging.getLogger('Webhdfs')
+
+
+class MemoryGovernor(object):
+    """
+    Accounting of the memory of named consumers against a budget
+
+    :param budget: bytes the consumers may hold together, 0 for no limit
+    :param stats: optional webhdfs_stats.Stats exposing the usage of every
+      consumer and counting what was reclaimed
+
+    >>> memory = MemoryGovernor(512 * 1024 * 1024)
+    >>> memory.register('read', lambda: buffered_bytes, drop_buffers)
+    >>> if not memory.reserve(window, consumer='read'):
+    >>>     window = smaller_window
+    """
+
+    def __init__(self, budget, stats=None):
+        self.budget = budget
+        self.stats = stats
+        self._consumers = []
+        self._lock = threading.RLock()
+        if stats is not None:
+            stats.gauge('webhdfs_memory_budget_bytes', lambda: self.budget)
+
+    def register(self, name, usage, reclaim=None):
+        """
+        Add a consumer: usage() returns the bytes it holds, and reclaim(nbytes)
+        frees about nbytes if it can and returns the number of bytes freed
+        """
+        self._consumers.append((name, usage, reclaim))
+        if self.stats is not None:
+            self.stats.gauge('webhdfs_memory_bytes', usage, consumer=name)
+
+    def usage(self):
+        """
+        Return the {consumer: bytes} usage of every consumer
+        """
+        return dict((name, usage()) for name, usage, reclaim in self._consumers)
+
+    def used(self):
+        return sum(usage() for name, usage, reclaim in self._consumers)
+
+    def fits(self, nbytes):
+        """
+        Whether nbytes more fit in the budget without reclaiming anything
+        """
+        return not self.budget or self.used() + nbytes <= self.budget
+
+    def reserve(self, nbytes, consumer=None):
+        """
+        Make room for nbytes more for consumer, reclaiming memory from the
+        others if needed (from all of them without consumer); return whether
+        they fit
+        """
+        if not self.budget:
+            return True
+        with self._lock:
+            excess = self.used() + nbytes - self.budget
+            for name, usage, reclaim in self._consumers:
+                if excess <= 0:
+                    break
+                if reclaim is None or name == consumer:
+                    continue
+                freed = reclaim(excess)
+                if not freed:
+                    continue
+                excess -= freed
+                logger.debug("Reclaimed %d bytes from %s", freed, name)
+                if self.stats is not None:
+                    self.stats.inc('webhdfs_memory_reclaimed_bytes_total', freed, consumer=name)
+            if excess > 0 and self.stats is not None:
+                self.stats.inc('webhdfs_memory_refused_total', consumer=consumer or 'other')
+            return excess <= 0
@@ -0,0 +1,119 @@
+"""
+Profiling of a running process, started and stopped by a signal
+
+The first SIGUSR1 starts cProfile, in the thread handling the signal (the
+FUSE thread of a mount), and tracemalloc; the next one stops cProfile, and
+a separate thread stops tracemalloc and writes to a file the functions
+taking the most CPU time, the lines that allocated the memory still held,
+and the current metrics, which include the cache sizes:
+
+  kill -USR1 <pid>; sleep 60; kill -USR1 <pid>
+
+Python runs signal handlers between two operations of the thread, so an
+idle mount starts and stops profiling with its next operation.
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import signal
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger('Webhdfs')
+
+# functions and allocation sites listed in a report
+TOP = 40
+
+
+class Profiler(object):
+    """
+    cProfile and tracemalloc toggled by SIGUSR1, with reports written to
+    directory
+
+    :param directory: where webhdfs-profile-<pid>-<time>.txt reports go
+    :param metrics: optional function returning text appended to reports,
+      e.g. Stats.render
+    """
+
+    def __init__(self, directory, metrics=None):
+        self.directory = directory
+        self.metrics = metrics
+        self._profile = None
+        self._start = None
+        # the thread writing the last report
+        self._writer = None
+
+    def install(self, signum=signal.SIGUSR1):
+        """
+        Toggle profiling on signum, from now on (in the main thread only)
+        """
+        signal.signal(signum, self.toggle)
+
+    def toggle(self, signum=None, frame=None):
+        if self._profile is None:
+            self.start()
+        else:
+            self.stop()
+
+    def start(self):
+        if self._writer is not None and self._writer.is_alive():
+            logger.warning("Profiling not started, the last report is still being written")
+            return
+        self._start = time.time()
+        tracemalloc.start()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        logger.info("Profiling started")
+
+    def stop(self):
+        """
+        Stop profiling, and return the thread writing the report: the
+        memory snapshot and the report take too long for a signal handler
+        """
+        self._profile.disable()
+        profile, self._profile = self._profile, None
+        self._writer = threading.Thread(target=self.write_report, name='webhdfs-profile',
+                                        args=(profile, time.time() - self._start), daemon=True)
+        self._writer.start()
+        return self._writer
+
+    def write_report(self, profile, seconds):
+        """
+        Stop tracemalloc, and return the path of the report written, or None
+        if it could not be created
+        """
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        path = os.path.join(self.directory, 'webhdfs-profile-{}-{}.txt'.format(
+            os.getpid(), time.strftime('%Y%m%d-%H%M%S')))
+        try:
+            # a new file only readable by us: the directory, by default the
+            # temporary one, may be shared with other users
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o600)
+        except OSError as e:
+            logger.error("Profiling stopped, but the report could not be created: %s", e)
+            return None
+        with os.fdopen(fd, 'w') as f:
+            f.write(self.report(profile, snapshot, seconds))
+        logger.info("Profiling stopped, report written to %s", path)
+        return path
+
+    def report(self, profile, snapshot, seconds):
+        out = io.StringIO()
+        out.write("# pid {}, profiled for {:.1f} s\n\n".format(os.getpid(), seconds))
+        out.write("## CPU time by function, own time first\n")
+        stats = pstats.Stats(profile, stream=out)
+        stats.sort_stats('tottime').print_stats(TOP)
+        out.write("## CPU time by function, including callees\n")
+        stats.sort_stats('cumulative').print_stats(TOP)
+        out.write("## Memory allocated while profiling and still held, by line\n\n")
+        snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+        for stat in snapshot.statistics('lineno')[:TOP]:
+            out.write("{}\n".format(stat))
+        if self.metrics is not None:
+            out.write("\n## Metrics\n\n")
+            out.write(self.metrics())
+        return out.getvalue()
@@ -0,0 +1,175 @@
+"""
+Counters and latency histograms of a WebHDFS mount, rendered in the
+Prometheus text exposition format
+"""
+import bisect
+import logging
+import threading
+from collections import defaultdict
+from functools import partial
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+logger = logging.getLogger('Webhdfs')
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'webhdfs_fuse_ops_total': 'FUSE operations handled',
+    'webhdfs_fuse_errors_total': 'FUSE operations that failed',
+    'webhdfs_fuse_op_seconds': 'Latency of FUSE operations',
+    'webhdfs_requests_total': 'WebHDFS HTTP requests sent',
+    'webhdfs_request_seconds': 'Latency of WebHDFS HTTP requests',
+    'webhdfs_cache_hits_total': 'Lookups answered from a cache',
+    'webhdfs_cache_misses_total': 'Lookups not answered from a cache',
+    'webhdfs_read_bytes_total': 'Bytes returned by FUSE read',
+    'webhdfs_written_bytes_total': 'Bytes accepted by FUSE write',
+    'webhdfs_requests_running': 'WebHDFS requests running, by kind',
+    'webhdfs_requests_waiting': 'WebHDFS requests waiting for a slot, by kind',
+    'webhdfs_memory_bytes': 'Estimated memory held by caches and buffers',
+    'webhdfs_memory_budget_bytes': 'Memory budget of caches and buffers, 0 for none',
+    'webhdfs_memory_reclaimed_bytes_total': 'Bytes freed to stay within the memory budget',
+    'webhdfs_memory_refused_total': 'Allocations reduced for lack of memory budget',
+}
+
+
+class _Histogram(object):
+    __slots__ = ('buckets', 'sum', 'count')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Stats(object):
+    """
+    Thread-safe registry of counters, histograms and gauges
+
+    Metrics are identified by a name and keyword labels:
+
+    >>> stats = Stats()
+    >>> stats.inc('webhdfs_cache_hits_total', cache='stat')
+    >>> stats.observe('webhdfs_fuse_op_seconds', 0.002, op='getattr')
+    >>> stats.gauge('webhdfs_stat_cache_entries', lambda: len(cache))
+    >>> print(stats.render())
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._histograms = defaultdict(_Histogram)
+        self._gauges = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _key(labels))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _key(labels))
+        with self._lock:
+            self._histograms[key].observe(seconds)
+
+    def gauge(self, name, func, **labels):
+        """
+        Register a gauge whose value is computed by func() at render time
+        """
+        self._gauges[(name, _key(labels))] = func
+
+    def request_hook(self, trace):
+        """
+        PyWebHdfsClient request hook counting WebHDFS operations
+        """
+        self.inc('webhdfs_requests_total', op=trace['operation'],
+                 phase=trace['phase'], status=trace['status'])
+        self.observe('webhdfs_request_seconds', trace['elapsed'],
+                     op=trace['operation'], phase=trace['phase'])
+
+    def scheduler_gauges(self, scheduler):
+        """
+        Register gauges of the requests a RequestScheduler runs and holds back
+        """
+        for kind in sorted(scheduler.weights):
+            self.gauge('webhdfs_requests_running', partial(scheduler.running, kind), kind=kind)
+            self.gauge('webhdfs_requests_waiting', partial(scheduler.waiting, kind), kind=kind)
+
+    def render(self):
+        """
+        Return all metrics in the Prometheus text format
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, (list(h.buckets), h.sum, h.count))
+                for key, h in self._histograms.items())
+        lines = []
+        seen = set()
+
+        def header(name, type):
+            if name not in seen:
+                seen.add(name)
+                if name in HELP:
+                    lines.append('# HELP {} {}'.format(name, HELP[name]))
+                lines.append('# TYPE {} {}'.format(name, type))
+
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append('{}{} {}'.format(name, _labels(labels), value))
+        for (name, labels), (buckets, total, count) in histograms:
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS + ('+Inf',), buckets):
+                cumulative += n
+                lines.append('{}_bucket{} {}'.format(
+                    name, _labels(labels + (('le', bound),)), cumulative))
+            lines.append('{}_sum{} {:.6f}'.format(name, _labels(labels), total))
+            lines.append('{}_count{} {}'.format(name, _labels(labels), count))
+        for (name, labels), func in sorted(self._gauges.items(), key=lambda item: item[0]):
+            header(name, 'gauge')
+            try:
+                lines.append('{}{} {}'.format(name, _labels(labels), func()))
+            except Exception:
+                logger.exception("Gauge %s failed", name)
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host='127.0.0.1'):
+        """
+        Export the metrics over HTTP from a daemon thread
+        """
+        stats = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = stats.render().encode('utf8')
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        httpd = HTTPServer((host, port), Handler)
+        thread = threading.Thread(target=httpd.serve_forever,
+                                  name='webhdfs-stats', daemon=True)
+        thread.start()
+        logger.info("Serving metrics at http://%s:%d/metrics", host, port)
+        return httpd
+
+
+def _key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, v) for k, v in labels) + '}'
@@ -0,0 +1,283 @@
+"""
+Concurrent bulk transfers between the local file system and HDFS, or within
+HDFS, used by the get, put, sync and cp commands of webhdfs.py
+
+Every file is streamed on its own (stream_file_into for downloads, create_file
+with an iterator body for uploads, or create_file_multipart for large ones,
+copy_file within HDFS), and files are spread over a pool of worker threads
+sharing the connection pool of one PyWebHdfsClient.
+"""
+import logging
+import os
+import posixpath
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pywebhdfs.errors
+
+logger = logging.getLogger('Webhdfs')
+
+CHUNK_SIZE = 1024 * 1024
+# files at least this large are uploaded in parts, concurrently
+MULTIPART_THRESHOLD = 1024 * 1024 * 1024
+
+
+class Progress(object):
+    """
+    Thread-safe transfer counters, reported on stderr at most once per
+    `interval` seconds
+    """
+
+    def __init__(self, files, size, interval=1.0, out=sys.stderr):
+        self.files = files
+        self.size = size
+        self.interval = interval
+        self.out = out
+        self.done_files = self.skipped_files = self.failed_files = 0
+        self.done_bytes = 0
+        self.start = self._last_report = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, nbytes):
+        with self._lock:
+            self.done_bytes += nbytes
+
+    def file_done(self, skipped=False, failed=False):
+        with self._lock:
+            self.done_files += 1
+            self.skipped_files += skipped
+            self.failed_files += failed
+
+    def report(self, final=False):
+        now = time.time()
+        if not final and now - self._last_report < self.interval:
+            return
+        self._last_report = now
+        elapsed = max(now - self.start, 1e-6)
+        self.out.write("\r{}/{} files ({} skipped, {} failed), {}/{}, {}/s   {}".format(
+            self.done_files, self.files, self.skipped_files, self.failed_files,
+            _human(self.done_bytes), _human(self.size),
+            _human(self.done_bytes / elapsed), '\n' if final else ''))
+        self.out.flush()
+
+
+def walk_remote(client, path):
+    """
+    Yield (relative path, FileStatus) of path and everything below it
+    """
+    status = client.get_file_dir_status(path)["FileStatus"]
+    yield '', status
+    if status['type'] != 'DIRECTORY':
+        return
+    stack = ['']
+    while stack:
+        rel = stack.pop()
+        for s in client.stream_dir(posixpath.join(path, rel)):
+            child = posixpath.join(rel, s['pathSuffix'])
+            yield child, s
+            if s['type'] == 'DIRECTORY':
+                stack.append(child)
+
+
+def walk_local(path):
+    """
+    Yield (relative path, os.stat_result) of path and everything below it
+    """
+    yield '', os.stat(path)
+    if not os.path.isdir(path):
+        return
+    for root, dirs, files in os.walk(path):
+        rel_root = os.path.relpath(root, path)
+        for name in dirs + files:
+            rel = os.path.normpath(os.path.join(rel_root, name))
+            yield rel, os.stat(os.path.join(root, name))
+
+
+def remote_statuses(client, path):
+    """
+    Return {relative path: FileStatus} below path, empty if it is missing
+    """
+    try:
+        return dict(walk_remote(client, path))
+    except pywebhdfs.errors.FileNotFound:
+        return {}
+
+
+def download_file(client, remote_path, local_path, status, progress):
+    with open(local_path, 'wb') as f:
+        if status['length']:
+            for chunk in client.stream_file_into(remote_path, bytearray(CHUNK_SIZE)):
+                f.write(chunk)
+                progress.add(len(chunk))
+    mtime = status['modificationTime'] / 1000
+    os.utime(local_path, (mtime, mtime))
+
+
+def upload_file(client, local_path, remote_path, st, progress):
+    if st.st_size >= MULTIPART_THRESHOLD:
+        with open(local_path, 'rb') as f:
+            client.create_file_multipart(remote_path, f, overwrite=True,
+                                         permission=oct(st.st_mode & 0o777)[2:])
+        progress.add(st.st_size)
+        return
+
+    def chunks():
+        with open(local_path, 'rb') as f:
+            while True:
+                data = f.read(CHUNK_SIZE)
+                if not data:
+                    break
+                progress.add(len(data))
+                yield data
+
+    client.create_file(remote_path, chunks(), overwrite=True,
+                       permission=oct(st.st_mode & 0o777)[2:])
+
+
+def get(client, remote, local, workers=8, skip_unchanged=False):
+    """
+    Download the file or directory tree remote to local
+
+    With skip_unchanged, files whose local copy has the same size and is not
+    older than the HDFS file are not downloaded again.
+    Return the number of failed files.
+    """
+    statuses = sorted(walk_remote(client, remote), key=lambda e: e[0])
+    if statuses[0][1]['type'] != 'DIRECTORY' and os.path.isdir(local):
+        local = os.path.join(local, posixpath.basename(remote.rstrip('/')))
+    jobs = []
+    for rel, status in statuses:
+        local_path = os.path.join(local, rel) if rel else local
+        if status['type'] == 'DIRECTORY':
+            os.makedirs(local_path, exist_ok=True)
+            continue
+        if skip_unchanged and _unchanged_local(local_path, status):
+            jobs.append((None, local_path, status))
+        else:
+            jobs.append((posixpath.join(remote, rel) if rel else remote, local_path, status))
+    progress = Progress(len(jobs), sum(s['length'] for r, l, s in jobs if r))
+    return _run(workers, progress,
+                [(download_file, (client, r, l, s, progress)) if r else None
+                 for r, l, s in jobs])
+
+
+def put(client, local, remote, workers=8, skip_unchanged=False):
+    """
+    Upload the local file or directory tree to remote
+
+    With skip_unchanged, files whose HDFS copy has the same size and is not
+    older than the local file are not uploaded again.
+    Return the number of failed files.
+    """
+    entries = sorted(walk_local(local), key=lambda e: e[0])
+    existing = remote_statuses(client, remote)
+    if not os.path.isdir(local) and existing.get('', {}).get('type') == 'DIRECTORY':
+        remote = posixpath.join(remote, os.path.basename(local))
+        existing = remote_statuses(client, remote)
+    jobs = []
+    for rel, st in entries:
+        rel = rel.replace(os.sep, '/') if rel != '.' else ''
+        remote_path = posixpath.join(remote, rel) if rel else remote
+        if os.path.isdir(os.path.join(local, rel) if rel else local):
+            if rel not in existing:
+                client.make_dir(remote_path)
+            continue
+        local_path = os.path.join(local, rel) if rel else local
+        if skip_unchanged and _unchanged_remote(existing.get(rel), st):
+            jobs.append((local_path, None, st))
+        else:
+            jobs.append((local_path, remote_path, st))
+    progress = Progress(len(jobs), sum(st.st_size for l, r, st in jobs if r))
+    return _run(workers, progress,
+                [(upload_file, (client, l, r, st, progress)) if r else None
+                 for l, r, st in jobs])
+
+
+def copy_file(client, src_path, dst_path, status, progress):
+    client.copy_file(src_path, dst_path, chunk_size=CHUNK_SIZE, overwrite=True,
+                     permission=status['permission'])
+    progress.add(status['length'])
+
+
+def copy(client, src, dst, workers=8, skip_unchanged=False):
+    """
+    Copy the HDFS file or directory tree src to dst, streaming every file
+    through this process without storing it
+
+    With skip_unchanged, files whose copy has the same size and is not older
+    than the source are not copied again.
+    Return the number of failed files.
+    """
+    statuses = sorted(walk_remote(client, src), key=lambda e: e[0])
+    existing = remote_statuses(client, dst)
+    if statuses[0][1]['type'] != 'DIRECTORY' and existing.get('', {}).get('type') == 'DIRECTORY':
+        dst = posixpath.join(dst, posixpath.basename(src.rstrip('/')))
+        existing = remote_statuses(client, dst)
+    jobs = []
+    for rel, status in statuses:
+        dst_path = posixpath.join(dst, rel) if rel else dst
+        if status['type'] == 'DIRECTORY':
+            if rel not in existing:
+                client.make_dir(dst_path, permission=status['permission'])
+            continue
+        copied = existing.get(rel)
+        if skip_unchanged and copied is not None and copied['type'] == 'FILE' and \
+                copied['length'] == status['length'] and \
+                copied['modificationTime'] >= status['modificationTime']:
+            jobs.append((None, dst_path, status))
+        else:
+            jobs.append((posixpath.join(src, rel) if rel else src, dst_path, status))
+    progress = Progress(len(jobs), sum(s['length'] for r, d, s in jobs if r))
+    return _run(workers, progress,
+                [(copy_file, (client, r, d, s, progress)) if r else None
+                 for r, d, s in jobs])
+
+
+def _run(workers, progress, jobs):
+    """
+    Run the (function, args) jobs on a pool of workers, None jobs are
+    counted as skipped
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        for job in jobs:
+            if job is None:
+                progress.file_done(skipped=True)
+            else:
+                pending[pool.submit(job[0], *job[1])] = job[1]
+        while pending:
+            done, _ = wait(list(pending), timeout=progress.interval,
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                args = pending.pop(future)
+                error = future.exception()
+                if error is not None:
+                    logger.error("Transfer of %s failed: %s", args[1], error)
+                progress.file_done(failed=error is not None)
+            progress.report()
+    progress.report(final=True)
+    return progress.failed_files
+
+
+def _unchanged_local(local_path, status):
+    try:
+        st = os.stat(local_path)
+    except OSError:
+        return False
+    return (st.st_size == status['length'] and
+            st.st_mtime >= status['modificationTime'] / 1000)
+
+
+def _unchanged_remote(status, st):
+    return (status is not None and status['type'] == 'FILE' and
+            status['length'] == st.st_size and
+            status['modificationTime'] / 1000 >= st.st_mtime)
+
+
+def _human(nbytes):
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if abs(nbytes) < 1024 or unit == 'TB':
+            return "{:.1f} {}".format(nbytes, unit)
+        nbytes /= 1024.0
@@ -0,0 +1,184 @@
+"""
+Recording of the accesses of a mount, and their replay to warm up caches
+
+A mount with access_trace_file set records the directories it lists, the
+paths it looks up and the ranges it reads, each at most once, as JSON lines:
+
+  ["L", "/data/day=1"]
+  ["S", "/data/day=1/part-0.parquet"]
+  ["R", "/data/day=1/part-0.parquet", 0, 4194304]
+
+Consecutive reads of a file are recorded as one range; the accesses already
+recorded are remembered up to a number of them, beyond which the oldest ones
+may be recorded again. Replaying the trace,
+with several threads, before a job making the same accesses again lists,
+looks up and reads the same paths: through the mount point, this fills the
+caches of the mount and the page cache of the kernel; through the cache
+daemon, its metadata and block caches.
+"""
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pywebhdfs.errors
+
+logger = logging.getLogger('Webhdfs')
+
+LISTDIR, STAT, READ = 'L', 'S', 'R'
+CHUNK_SIZE = 1024 * 1024
+# estimated memory held by an access remembered as recorded
+SEEN_ENTRY_BYTES = 200
+
+
+class AccessTrace(object):
+    """
+    Recorder of the accesses of a mount, written to path once closed
+
+    The trace is written to path + '.tmp' and only replaces path when closed
+    with something recorded, so that the trace of the previous mount can be
+    replayed meanwhile and survives a mount that did nothing.
+
+    :param path: trace file
+    :param max_seen: accesses remembered as recorded, the least recent ones
+      being forgotten first
+    """
+
+    def __init__(self, path, max_seen=100000):
+        self.path = path
+        self.max_seen = max_seen
+        self._file = None
+        # (op, path) of the accesses recorded, the least recent first
+        self._seen = OrderedDict()
+        # path: [start, end] of the reads of an open file, as long as they follow each other
+        self._extents = {}
+
+    def listdir(self, path):
+        self._record_once(LISTDIR, path)
+
+    def stat(self, path):
+        self._record_once(STAT, path)
+
+    def read(self, path, offset, length):
+        extent = self._extents.get(path)
+        if extent is not None and extent[0] <= offset <= extent[1]:
+            extent[1] = max(extent[1], offset + length)
+            return
+        if extent is not None:
+            self._record(READ, path, extent[0], extent[1] - extent[0])
+        self._extents[path] = [offset, offset + length]
+
+    def release(self, path):
+        extent = self._extents.pop(path, None)
+        if extent is not None:
+            self._record(READ, path, extent[0], extent[1] - extent[0])
+
+    def close(self):
+        for path in list(self._extents):
+            self.release(path)
+        if self._file is not None:
+            self._file.close()
+            os.replace(self.path + '.tmp', self.path)
+            self._file = None
+
+    def memory(self):
+        return len(self._seen) * SEEN_ENTRY_BYTES
+
+    def reclaim(self, nbytes):
+        """
+        Forget the least recent accesses recorded, about nbytes of them
+        """
+        freed = 0
+        while self._seen and freed < nbytes:
+            self._seen.popitem(last=False)
+            freed += SEEN_ENTRY_BYTES
+        return freed
+
+    def _record_once(self, op, path):
+        key = (op, path)
+        if key in self._seen:
+            self._seen.move_to_end(key)
+            return
+        self._seen[key] = None
+        while len(self._seen) > self.max_seen:
+            self._seen.popitem(last=False)
+        self._record(op, path)
+
+    def _record(self, *record):
+        if self._file is None:
+            self._file = open(self.path + '.tmp', 'w')
+        self._file.write(json.dumps(record) + '\n')
+
+
+def load(path):
+    """
+    Return the records of a trace file, or an empty list if there is none
+    """
+    try:
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def replay(records, root=None, client=None, workers=8):
+    """
+    Make the accesses of records again, with workers threads, through the
+    mount point root or the client (e.g. a DaemonClient); return the number
+    of accesses that failed, e.g. because the path is gone
+    """
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        if root is not None:
+            results = list(pool.map(lambda record: _replay_local(root, *record), records))
+        else:
+            results = list(pool.map(lambda record: _replay_client(client, *record), records))
+    failed = results.count(False)
+    logger.info("Warmed up %d accesses (%d failed) in %.1f s",
+                len(records), failed, time.time() - start)
+    return failed
+
+
+def _replay_local(root, op, path, offset=0, length=0):
+    local = os.path.join(root, path.lstrip('/'))
+    try:
+        if op == LISTDIR:
+            os.listdir(local)
+        elif op == STAT:
+            os.stat(local)
+        else:
+            fd = os.open(local, os.O_RDONLY)
+            try:
+                end = offset + length
+                while offset < end:
+                    chunk = os.pread(fd, min(CHUNK_SIZE, end - offset), offset)
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+            finally:
+                os.close(fd)
+        return True
+    except OSError:
+        return False
+
+
+def _replay_client(client, op, path, offset=0, length=0):
+    try:
+        if op == LISTDIR:
+            client.list_dir(path)
+        elif op == STAT:
+            client.get_file_dir_status(path)
+        else:
+            buf = bytearray(CHUNK_SIZE)
+            end = offset + length
+            while offset < end:
+                view = memoryview(buf)[:min(CHUNK_SIZE, end - offset)]
+                nbytes = client.read_file_into(path, view, offset=offset)
+                if not nbytes:
+                    break
+                offset += nbytes
+        return True
+    except pywebhdfs.errors.PyWebHdfsException:
+        return False